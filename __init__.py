@@ -15,9 +15,15 @@ import bpy.utils.previews
 from . import ui
 from . import operators
 from . import gobos
+from . import preferences
+from . import hdri_proxy
+from . import live_update
 
 modules = [
+    preferences,
     gobos,
+    hdri_proxy,
+    live_update,
     operators,
     ui,
 ]
@@ -37,11 +43,15 @@ def register():
     preview_collections["main"] = pcoll_main
     preview_collections["hdri"] = pcoll_hdri
     preview_collections["reflector"] = pcoll_reflector
+    # Lighting balls, loaded on demand by the HDRI panel
+    preview_collections["irradiance"] = bpy.utils.previews.new()
     
-    # Load icons
-    gobos.load_gobo_icons(pcoll_main)
-    gobos.load_hdri_icons(pcoll_hdri)
-    gobos.load_reflector_icons(pcoll_reflector)
+    # Load icons in time-sliced batches so registration returns immediately
+    gobos.load_previews_deferred([
+        ("main", gobos.iter_gobo_icons(pcoll_main)),
+        ("hdri", gobos.iter_hdri_icons(pcoll_hdri)),
+        ("reflector", gobos.iter_reflector_icons(pcoll_reflector)),
+    ])
     
     print("BLS: Addon registered successfully")
 
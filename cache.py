@@ -0,0 +1,133 @@
+import bpy
+import os
+import json
+import hashlib
+import numpy as np
+
+from . import hdr_reader
+
+def get_cache_dir(*parts):
+    """Get (and create) a LightForge cache directory"""
+    try:
+        # Blender 4.2+ extensions get a writable per-user folder
+        root = bpy.utils.extension_path_user(__package__, path="cache", create=True)
+    except (AttributeError, ValueError):
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def file_signature(filepath):
+    """Return (abspath, size, mtime) identifying the current state of a file"""
+    filepath = os.path.abspath(filepath)
+    st = os.stat(filepath)
+    return filepath, st.st_size, st.st_mtime
+
+def cache_key(filepath, size, mtime, *extra):
+    """Stable short key for a file state (path + size + mtime)"""
+    raw = "|".join(str(v) for v in (filepath, size, mtime) + extra)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+def load_index(path):
+    """Load a JSON cache index, returning an empty dict if missing or corrupt"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def save_index(path, data):
+    """Atomically write a JSON cache index"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+def run_steps(steps):
+    """Run an iter_* generator to completion and return its result"""
+    while True:
+        try:
+            next(steps)
+        except StopIteration as result:
+            return result.value
+
+def read_image(filepath, max_size=None):
+    """Read an image file into a (height, width, 4) float32 array
+
+    .hdr and scanline .exr files are memory-mapped and decoded directly (and
+    box-filtered while streaming when max_size is given); anything else goes
+    through a temporary bpy image. Rows are bottom-up, matching Blender's pixel
+    order. If max_size is given the image is scaled down so its longest side
+    fits. Returns (pixels, is_float).
+    """
+    return run_steps(iter_read_image(filepath, max_size))
+
+def iter_read_image(filepath, max_size=None):
+    """read_image as a generator for time-sliced jobs (use with 'yield from')
+
+    Yields after each band of rows of a memory-mapped decode; the bpy fallback
+    decodes in one step.
+    """
+    try:
+        with hdr_reader.open_image(filepath) as image:
+            if max_size:
+                pixels = yield from image.iter_downsampled(max_size)
+                return pixels, True
+            pixels = yield from image.iter_rows()
+            return pixels, True
+    except hdr_reader.UnsupportedFormat:
+        pass
+
+    img = bpy.data.images.load(filepath, check_existing=False)
+    try:
+        width, height = img.size
+        if width == 0 or height == 0:
+            raise RuntimeError(f"Could not decode '{filepath}'")
+
+        if max_size and max(width, height) > max_size:
+            scale = max_size / max(width, height)
+            width = max(1, round(width * scale))
+            height = max(1, round(height * scale))
+            img.scale(width, height)
+
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        img.pixels.foreach_get(pixels)
+        is_float = img.is_float
+    finally:
+        bpy.data.images.remove(img)
+
+    return pixels.reshape(height, width, 4), is_float
+
+def area_matrix(src, dst):
+    """(dst, src) box-filter weights resampling an axis from src to dst samples"""
+    edges = np.linspace(0.0, src, dst + 1)
+    weights = np.zeros((dst, src), dtype=np.float32)
+    for i in range(dst):
+        lo, hi = edges[i], edges[i + 1]
+        first, last = int(np.floor(lo)), int(np.ceil(hi))
+        for j in range(first, min(last, src)):
+            weights[i, j] = min(hi, j + 1) - max(lo, j)
+        weights[i] /= weights[i].sum()
+    return weights
+
+def resample(pixels, height, width):
+    """Box-filter a (h, w, c) array to (height, width, c)"""
+    rows = area_matrix(pixels.shape[0], height)
+    cols = area_matrix(pixels.shape[1], width)
+    return np.einsum("ij,jkc,lk->ilc", rows, pixels, cols, optimize=True).astype(np.float32)
+
+def write_image(filepath, pixels, file_format='PNG', float_buffer=False):
+    """Write a (height, width, 4) array to disk through a temporary bpy image"""
+    height, width = pixels.shape[:2]
+    img = bpy.data.images.new("BLS_CacheWrite", width=width, height=height,
+                              alpha=True, float_buffer=float_buffer)
+    try:
+        img.pixels.foreach_set(np.ascontiguousarray(pixels, dtype=np.float32).ravel())
+        img.filepath_raw = filepath
+        img.file_format = file_format
+        img.save()
+    finally:
+        bpy.data.images.remove(img)
+    return filepath
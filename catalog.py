@@ -0,0 +1,405 @@
+import os
+import re
+import struct
+import sqlite3
+import hashlib
+from collections import namedtuple
+
+from . import cache
+from . import thumbnails
+
+# Asset kinds stored in the catalog
+KINDS = ('GOBO', 'HDRI', 'REFLECTOR')
+
+# Bytes read from the start, middle and end of a file for its content hash
+HASH_SAMPLE_SIZE = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    root TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    format TEXT,
+    hash TEXT,
+    thumbnail TEXT,
+    phash INTEGER,
+    UNIQUE (kind, path)
+);
+CREATE INDEX IF NOT EXISTS assets_kind_name ON assets (kind, name);
+CREATE INDEX IF NOT EXISTS assets_kind_root ON assets (kind, root);
+CREATE TABLE IF NOT EXISTS tags (
+    asset_id INTEGER NOT NULL REFERENCES assets (id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (asset_id, tag)
+);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+"""
+
+COLUMNS = "id, kind, name, path, root, size, mtime, width, height, format, hash, thumbnail"
+
+Asset = namedtuple("Asset", COLUMNS.replace(",", ""))
+
+# A library folder to index: kind, folder, and an optional folder of ready-made icons
+LibraryRoot = namedtuple("LibraryRoot", "kind path icons_dir")
+
+_connection = None
+
+# Root -> {directory: mtime} from the last index pass, used for cheap change polling
+_dir_mtimes = {}
+
+def get_connection():
+    """Open (once) the catalog database in the LightForge cache directory"""
+    global _connection
+    if _connection is None:
+        path = os.path.join(cache.get_cache_dir(), "catalog.sqlite")
+        _connection = sqlite3.connect(path)
+        _connection.execute("PRAGMA foreign_keys = ON")
+        _connection.execute("PRAGMA journal_mode = WAL")
+        _connection.executescript(SCHEMA)
+        _migrate(_connection)
+    return _connection
+
+def _migrate(conn):
+    """Add columns introduced after a catalog was first created"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(assets)")}
+    if "phash" not in columns:
+        conn.execute("ALTER TABLE assets ADD COLUMN phash INTEGER")
+        conn.commit()
+
+def close():
+    """Close the catalog database"""
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+    _dir_mtimes.clear()
+
+def read_image_size(filepath):
+    """Read (width, height) from an image header without decoding it, or None"""
+    try:
+        with open(filepath, "rb") as f:
+            head = f.read(32)
+            if head.startswith(b"\x89PNG\r\n\x1a\n"):
+                return struct.unpack(">II", head[16:24])
+            if head.startswith(b"BM"):
+                width, height = struct.unpack("<ii", head[18:26])
+                return width, abs(height)
+            if head.startswith(b"#?"):
+                return _read_hdr_size(f)
+            if head.startswith(b"\x76\x2f\x31\x01"):
+                return _read_exr_size(f)
+            if head.startswith(b"\xff\xd8"):
+                return _read_jpeg_size(f)
+            if filepath.lower().endswith(".tga") and len(head) >= 16:
+                return struct.unpack("<HH", head[12:16])
+    except (OSError, struct.error, ValueError):
+        pass
+    return None
+
+def _read_hdr_size(f):
+    f.seek(0)
+    for _ in range(64):
+        line = f.readline()
+        if not line:
+            break
+        # Resolution line follows the blank line ending the header, e.g. "-Y 512 +X 1024"
+        match = re.match(rb"([-+][XY]) (\d+) ([-+][XY]) (\d+)", line)
+        if match:
+            first, second = int(match.group(2)), int(match.group(4))
+            if match.group(1)[1:] == b"Y":
+                return second, first
+            return first, second
+    return None
+
+def _read_exr_size(f):
+    f.seek(8)
+    while True:
+        name = _read_cstring(f)
+        if not name:
+            return None
+        attr_type = _read_cstring(f)
+        (size,) = struct.unpack("<i", f.read(4))
+        value = f.read(size)
+        if name == b"dataWindow" and attr_type == b"box2i":
+            xmin, ymin, xmax, ymax = struct.unpack("<iiii", value)
+            return xmax - xmin + 1, ymax - ymin + 1
+
+def _read_cstring(f):
+    chars = bytearray()
+    while len(chars) < 256:
+        c = f.read(1)
+        if not c or c == b"\x00":
+            break
+        chars += c
+    return bytes(chars)
+
+def _read_jpeg_size(f):
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue
+        (length,) = struct.unpack(">H", f.read(2))
+        # Start-of-frame markers carry the dimensions
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+def file_hash(filepath, size):
+    """Sampled content hash: file size plus the first, middle and last 64 KB
+
+    Cheap enough for thousands of large HDRIs on a network share while still
+    telling apart files that share a name.
+    """
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(filepath, "rb") as f:
+        offsets = (0, max(0, size // 2 - HASH_SAMPLE_SIZE // 2), max(0, size - HASH_SAMPLE_SIZE))
+        for offset in sorted(set(offsets)):
+            f.seek(offset)
+            digest.update(f.read(HASH_SAMPLE_SIZE))
+    return digest.hexdigest()
+
+def derive_tags(root, filepath):
+    """Tags from the folders below the root and the words in the file name"""
+    rel_dir = os.path.relpath(os.path.dirname(filepath), root) if root else ""
+    parts = [] if rel_dir in ("", ".") else rel_dir.replace("\\", "/").split("/")
+    words = re.split(r"[\s_\-.]+", os.path.splitext(os.path.basename(filepath))[0])
+
+    tags = set()
+    for word in parts + words:
+        word = word.strip().lower()
+        # Pure numbers ("01") make poor tags, resolutions ("4k") are useful
+        if word and not word.isdigit():
+            tags.add(word)
+    return tags
+
+def _index_file(conn, kind, root, filepath, size, mtime, icons=None, extra_tags=(), thumb_index=None):
+    """Insert or refresh one catalog row
+
+    thumb_index is a thumbnail index shared across a scan (see thumbnails.get_thumbnail).
+    """
+    return cache.run_steps(_iter_index_file(conn, kind, root, filepath, size, mtime, icons,
+                                            extra_tags, thumb_index))
+
+def _iter_index_file(conn, kind, root, filepath, size, mtime, icons=None, extra_tags=(), thumb_index=None):
+    """_index_file as a generator that yields while the thumbnail source is decoded"""
+    name, ext = os.path.splitext(os.path.basename(filepath))
+    dimensions = read_image_size(filepath) or (None, None)
+
+    try:
+        content_hash = file_hash(filepath, size)
+    except OSError:
+        content_hash = None
+
+    if icons and name in icons:
+        thumbnail = icons[name]
+    elif kind == 'REFLECTOR':
+        thumbnail = filepath
+    else:
+        try:
+            thumbnail = yield from thumbnails.iter_get_thumbnail(filepath, index=thumb_index)
+        except Exception as e:
+            print(f"BLS: Thumbnail failed for '{os.path.basename(filepath)}': {e}")
+            thumbnail = filepath
+
+    conn.execute(
+        "INSERT INTO assets (kind, name, path, root, size, mtime, width, height, format, hash, thumbnail) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (kind, path) DO UPDATE SET name = excluded.name, root = excluded.root, "
+        "size = excluded.size, mtime = excluded.mtime, width = excluded.width, "
+        "height = excluded.height, format = excluded.format, hash = excluded.hash, "
+        "thumbnail = excluded.thumbnail, phash = NULL",
+        (kind, name, filepath, root, size, mtime, dimensions[0], dimensions[1],
+         ext.lstrip(".").upper(), content_hash, thumbnail))
+
+    (asset_id,) = conn.execute("SELECT id FROM assets WHERE kind = ? AND path = ?",
+                               (kind, filepath)).fetchone()
+    conn.execute("DELETE FROM tags WHERE asset_id = ?", (asset_id,))
+    conn.executemany("INSERT INTO tags (asset_id, tag) VALUES (?, ?)",
+                     [(asset_id, tag) for tag in derive_tags(root, filepath) | set(extra_tags)])
+    return asset_id
+
+def _scan_icons(icons_dir):
+    """Map icon name -> path for a folder of ready-made icons"""
+    icons = {}
+    if icons_dir and os.path.isdir(icons_dir):
+        for filename in sorted(os.listdir(icons_dir)):
+            icons.setdefault(os.path.splitext(filename)[0], os.path.join(icons_dir, filename))
+    return icons
+
+def iter_index_root(root, extensions):
+    """Index one library root, only touching new, changed and deleted files
+
+    Yields (done, total): (0, 0) after each directory walked, then once per
+    file that had to be (re)indexed.
+    """
+    conn = get_connection()
+    kind = root.kind
+    root_path = os.path.abspath(root.path)
+
+    known = {path: (size, mtime) for path, size, mtime in conn.execute(
+        "SELECT path, size, mtime FROM assets WHERE kind = ? AND root = ?", (kind, root_path))}
+
+    found = {}
+    dir_mtimes = {}
+    for dirpath, dirnames, filenames in os.walk(root_path):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        try:
+            dir_mtimes[dirpath] = os.stat(dirpath).st_mtime
+        except OSError:
+            continue
+
+        for filename in filenames:
+            if not filename.lower().endswith(extensions):
+                continue
+            filepath = os.path.join(dirpath, filename)
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                continue
+            found[filepath] = (st.st_size, st.st_mtime)
+        yield 0, 0
+
+    _dir_mtimes[(kind, root_path)] = dir_mtimes
+
+    removed = [path for path in known if path not in found]
+    if removed:
+        conn.executemany("DELETE FROM assets WHERE kind = ? AND path = ?",
+                         [(kind, path) for path in removed])
+        conn.commit()
+
+    to_index = sorted(path for path, sig in found.items() if known.get(path) != sig)
+    icons = _scan_icons(root.icons_dir)
+    # Thumbnail index entries are written with each database commit, not per file
+    thumb_index = thumbnails.load_thumbnail_index() if to_index else None
+    for i, filepath in enumerate(to_index):
+        size, mtime = found[filepath]
+        try:
+            # A large source is decoded band by band, keeping 'Loading N/M' responsive
+            for _ in _iter_index_file(conn, kind, root_path, filepath, size, mtime, icons,
+                                      thumb_index=thumb_index):
+                yield i, len(to_index)
+        except Exception as e:
+            print(f"BLS: Failed to index '{filepath}': {e}")
+        if i % 50 == 49:
+            conn.commit()
+            thumbnails.save_thumbnail_index(thumb_index)
+        yield i + 1, len(to_index)
+
+    conn.commit()
+    if to_index:
+        thumbnails.save_thumbnail_index(thumb_index)
+
+    if to_index or removed:
+        print(f"BLS: Catalog {kind} '{root_path}': {len(to_index)} indexed, {len(removed)} removed")
+
+def iter_index_roots(roots, extensions):
+    """Index several roots of one kind and drop rows from roots no longer configured"""
+    conn = get_connection()
+    kinds = {root.kind for root in roots}
+    for kind in kinds:
+        active = [os.path.abspath(root.path) for root in roots if root.kind == kind]
+        placeholders = ", ".join("?" for _ in active)
+        # Rows without a root are custom imports and are kept
+        conn.execute(f"DELETE FROM assets WHERE kind = ? AND root != '' AND root NOT IN ({placeholders})",
+                     [kind] + active)
+        for key in [k for k in _dir_mtimes if k[0] == kind and k[1] not in active]:
+            del _dir_mtimes[key]
+    conn.commit()
+
+    for root in roots:
+        if os.path.isdir(root.path):
+            yield from iter_index_root(root, extensions)
+
+def roots_changed(roots):
+    """Cheap poll: True if any directory under the roots changed since the last index
+
+    Only directory mtimes are compared, so files being added, removed or renamed
+    are picked up without stat-ing every asset. Files edited in place are left
+    to an explicit reload.
+    """
+    for root in roots:
+        root_path = os.path.abspath(root.path)
+        dir_mtimes = _dir_mtimes.get((root.kind, root_path))
+        if dir_mtimes is None:
+            if os.path.isdir(root_path):
+                return True
+            continue
+        for dirpath, mtime in dir_mtimes.items():
+            try:
+                if os.stat(dirpath).st_mtime != mtime:
+                    return True
+            except OSError:
+                return True
+    return False
+
+def add_file(kind, filepath, tags=()):
+    """Index a single file outside the configured roots (e.g. a custom import)"""
+    conn = get_connection()
+    filepath = os.path.abspath(filepath)
+    st = os.stat(filepath)
+    asset_id = _index_file(conn, kind, "", filepath, st.st_size, st.st_mtime, extra_tags=tags)
+    conn.commit()
+    return get_asset(asset_id)
+
+def _search_clause(kind, text, ids=None):
+    """SQL WHERE clause for a kind and a free-text search
+
+    Each word must match the name or a tag; 'tag:word' matches a tag exactly.
+    ids optionally restricts the result to a set of asset IDs.
+    """
+    clauses = ["kind = ?"]
+    params = [kind]
+    if ids is not None:
+        clauses.append(f"id IN ({', '.join(str(int(i)) for i in ids)})")
+    for word in (text or "").lower().split():
+        if word.startswith("tag:") and len(word) > 4:
+            clauses.append("id IN (SELECT asset_id FROM tags WHERE tag = ?)")
+            params.append(word[4:])
+        else:
+            like = "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            clauses.append("(name LIKE ? ESCAPE '\\' OR id IN "
+                           "(SELECT asset_id FROM tags WHERE tag LIKE ? ESCAPE '\\'))")
+            params += [like, like]
+    return " AND ".join(clauses), params
+
+def query_assets(kind, text="", limit=-1, offset=0, ids=None):
+    """Return assets of a kind matching a search, ordered by name
+
+    With ids the order of ids is kept instead (e.g. closest match first).
+    """
+    where, params = _search_clause(kind, text, ids)
+    order = "name COLLATE NOCASE, id"
+    if ids:
+        ranks = " ".join(f"WHEN {int(i)} THEN {rank}" for rank, i in enumerate(ids))
+        order = f"CASE id {ranks} END"
+    rows = get_connection().execute(
+        f"SELECT {COLUMNS} FROM assets WHERE {where} "
+        f"ORDER BY {order} LIMIT ? OFFSET ?", params + [limit, offset])
+    return [Asset(*row) for row in rows]
+
+def count_assets(kind, text="", ids=None):
+    """Number of assets of a kind matching a search"""
+    where, params = _search_clause(kind, text, ids)
+    (count,) = get_connection().execute(f"SELECT COUNT(*) FROM assets WHERE {where}", params).fetchone()
+    return count
+
+def get_asset(asset_id):
+    """Look up one asset by ID, or None"""
+    row = get_connection().execute(f"SELECT {COLUMNS} FROM assets WHERE id = ?", (asset_id,)).fetchone()
+    return Asset(*row) if row else None
+
+def get_tags(asset_id):
+    """Sorted tags of an asset"""
+    rows = get_connection().execute("SELECT tag FROM tags WHERE asset_id = ? ORDER BY tag", (asset_id,))
+    return [tag for (tag,) in rows]
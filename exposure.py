@@ -0,0 +1,119 @@
+import os
+import numpy as np
+
+from . import cache
+from . import hdr_reader
+
+# Rows of the panorama processed at a time (one step of a time-sliced job)
+CHUNK_ROWS = 64
+
+# Log2-luminance histogram range and resolution (1/8 stop bins)
+HISTOGRAM_RANGE = (-16.0, 20.0)
+HISTOGRAM_BINS = 288
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+# Normalized HDRIs average this radiance over the sphere, like a uniform white world at strength 1
+EXPOSURE_TARGET = 1.0
+
+LUMINANCE = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+def get_exposure_dir():
+    """Get the exposure statistics cache directory"""
+    return cache.get_cache_dir("exposure")
+
+def _index_path():
+    return os.path.join(get_exposure_dir(), "index.json")
+
+def iter_row_chunks(filepath, chunk_rows=CHUNK_ROWS):
+    """Yield (first_row, rows, height) chunks of an equirect map, rows bottom-up
+
+    .hdr/.exr maps are decoded chunk by chunk from a memory map; other formats
+    fall back to one bpy decode.
+    """
+    try:
+        with hdr_reader.open_image(filepath) as image:
+            for start, rows in image.iter_chunks(chunk_rows):
+                yield start, rows, image.height
+            return
+    except hdr_reader.UnsupportedFormat:
+        pass
+
+    pixels, _is_float = cache.read_image(filepath)
+    height = pixels.shape[0]
+    for start in range(0, height, chunk_rows):
+        yield start, pixels[start:start + chunk_rows], height
+
+def compute_stats(chunks):
+    """Solid-angle weighted luminance statistics from row chunks
+
+    Only a running sum and a fixed log-luminance histogram are kept, so memory
+    does not grow with the map size.
+    """
+    return cache.run_steps(iter_compute_stats(chunks))
+
+def iter_compute_stats(chunks):
+    """compute_stats as a generator that yields after each chunk (use with 'yield from')"""
+    edges = np.linspace(*HISTOGRAM_RANGE, HISTOGRAM_BINS + 1)
+    histogram = np.zeros(HISTOGRAM_BINS, dtype=np.float64)
+    total_weight = weighted_sum = weighted_log = 0.0
+    peak = 0.0
+
+    for start, rows, height in chunks:
+        width = rows.shape[1]
+        elevation = ((np.arange(start, start + rows.shape[0]) + 0.5) / height - 0.5) * np.pi
+        weights = np.broadcast_to((np.cos(elevation) * (2.0 * np.pi / width) * (np.pi / height))[:, None],
+                                  rows.shape[:2])
+
+        lum = np.maximum(rows[..., :3] @ LUMINANCE, 0.0)
+        log_lum = np.log2(np.maximum(lum, 2.0 ** HISTOGRAM_RANGE[0]))
+
+        total_weight += float(weights.sum())
+        weighted_sum += float((lum * weights).sum())
+        weighted_log += float((log_lum * weights).sum())
+        peak = max(peak, float(lum.max()))
+        histogram += np.histogram(np.clip(log_lum, *HISTOGRAM_RANGE), bins=edges, weights=weights)[0]
+        yield
+
+    if total_weight == 0.0:
+        raise ValueError("Empty image")
+
+    cumulative = np.cumsum(histogram) / histogram.sum()
+    percentiles = {}
+    for p in PERCENTILES:
+        index = min(int(np.searchsorted(cumulative, p / 100.0)), HISTOGRAM_BINS - 1)
+        percentiles[str(p)] = float(2.0 ** ((edges[index] + edges[index + 1]) / 2.0))
+
+    return {
+        "mean": weighted_sum / total_weight,
+        "log_average": float(2.0 ** (weighted_log / total_weight)),
+        "max": peak,
+        "percentiles": percentiles,
+    }
+
+def get_stats(filepath):
+    """Cached exposure statistics of an HDRI, computed on first use"""
+    return cache.run_steps(iter_get_stats(filepath))
+
+def iter_get_stats(filepath):
+    """get_stats as a generator that yields while the HDRI is decoded"""
+    abspath, file_size, mtime = cache.file_signature(filepath)
+    key = cache.cache_key(abspath, file_size, mtime, HISTOGRAM_BINS)
+
+    index_path = _index_path()
+    index = cache.load_index(index_path)
+    entry = index.get(abspath)
+    if entry and entry.get("key") == key:
+        return entry["stats"]
+
+    stats = yield from iter_compute_stats(iter_row_chunks(abspath))
+
+    index = cache.load_index(index_path)
+    index[abspath] = {"key": key, "stats": stats}
+    cache.save_index(index_path, index)
+    return stats
+
+def get_normalization(filepath):
+    """Strength multiplier bringing an HDRI's average radiance to the target"""
+    stats = get_stats(filepath)
+    return EXPOSURE_TARGET / stats["mean"] if stats["mean"] > 0.0 else 1.0
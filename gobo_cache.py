@@ -0,0 +1,389 @@
+import os
+import math
+import zlib
+import struct
+import bpy
+import numpy as np
+
+from . import cache
+from . import image_manager
+from . import live_update
+from . import procedural
+
+# Longest side of cached gobos; light textures rarely need more than the projected footprint
+GOBO_RESOLUTIONS = [
+    ('256', "256", "256 pixel gobos"),
+    ('512', "512", "512 pixel gobos"),
+    ('1024', "1K", "1K gobos"),
+    ('2048', "2K", "2K gobos"),
+    ('4096', "4K", "4K gobos"),
+]
+
+# Gobos whose colour spread (99th percentile of max - min channel) stays below this are stored gray
+GRAY_TOLERANCE = 0.08
+
+# Softness pyramid: level k is stored at 1/2^(k-1) resolution and blurred by BLUR_SIGMA
+# of its width, so each level doubles the blur of the previous one
+SOFTNESS_LEVELS = 4
+BLUR_SIGMA = 0.006
+MIN_LEVEL_SIZE = 32
+
+# Image properties holding the library file a cached gobo was made from and its softness level
+SOURCE_PROP = "bls_gobo_source"
+LEVEL_PROP = "bls_gobo_level"
+
+# Image property naming the procedural network a baked gobo was evaluated from, and
+# mapping node properties of live networks (base scale, whether the seed applies)
+BAKED_PROP = "bls_gobo_baked"
+PROCEDURAL_MAPPING_PROP = "bls_procedural_scale"
+PROCEDURAL_SEEDED_PROP = "bls_procedural_seeded"
+
+# Shared gobo node groups carry the network kind ('IMAGE', 'GRADIENT', 'NOISE');
+# each light references one through a group node holding its own scale and rotation.
+# Image gobos get one group per source file and softness level, so a light's softness
+# is chosen by which group it points at; edits inside a group reach all its lights
+GROUP_PROP = "bls_gobo_group"
+GROUP_NODE_NAME = "BLS_Gobo"
+
+def get_gobo_cache_dir():
+    """Get the preprocessed gobo cache directory"""
+    return cache.get_cache_dir("gobos")
+
+def _index_path():
+    return os.path.join(get_gobo_cache_dir(), "index.json")
+
+def power_of_two(size, max_size):
+    """Largest power of two not above size, capped at max_size
+
+    Rounding down never upscales a gobo, so its texture memory can only shrink.
+    """
+    return min(max_size, 1 << int(math.log2(max(size, 1))))
+
+def softness_level(softness):
+    """Pyramid level (0 = sharp) for a 0..1 softness"""
+    return max(0, min(SOFTNESS_LEVELS, round(softness * SOFTNESS_LEVELS)))
+
+def _gaussian_blur_axis(pixels, sigma, axis):
+    """Gaussian blur along one axis by FFT convolution, extending the edges"""
+    radius = max(1, int(math.ceil(3.0 * sigma)))
+    taps = np.arange(-radius, radius + 1, dtype=np.float64)
+    kernel = np.exp(-0.5 * (taps / sigma) ** 2)
+    kernel /= kernel.sum()
+
+    pad = [(0, 0)] * pixels.ndim
+    pad[axis] = (radius, radius)
+    padded = np.pad(pixels, pad, mode='edge')
+    length = padded.shape[axis] + 2 * radius
+    shape = [1] * pixels.ndim
+    shape[axis] = -1
+
+    spectrum = np.fft.rfft(padded, n=length, axis=axis) * np.fft.rfft(kernel, n=length).reshape(shape)
+    full = np.fft.irfft(spectrum, n=length, axis=axis)
+    return np.take(full, np.arange(2 * radius, 2 * radius + pixels.shape[axis]), axis=axis).astype(np.float32)
+
+def gaussian_blur(pixels, sigma):
+    """Separable Gaussian blur of a (height, width, ...) array, sigma in pixels"""
+    if sigma <= 0.0:
+        return pixels
+    return _gaussian_blur_axis(_gaussian_blur_axis(pixels, sigma, 0), sigma, 1)
+
+def write_png(filepath, pixels, bit_depth=8):
+    """Write (height, width) gray or (height, width, 3) RGB rows (bottom-up, 0..1) as an 8 or 16-bit PNG"""
+    peak = (1 << bit_depth) - 1
+    data = np.clip(np.round(pixels[::-1] * peak), 0, peak).astype(np.uint8 if bit_depth == 8 else ">u2")
+    height, width = data.shape[:2]
+    color_type = 0 if data.ndim == 2 else 2
+    rows = np.ascontiguousarray(data).view(np.uint8).reshape(height, -1)
+
+    # 'Up' filter on every row: smooth gobos compress far better as row differences
+    filtered = np.empty((height, rows.shape[1] + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[:, 1:] = rows
+    filtered[1:, 1:] -= rows[:-1]
+
+    def chunk(tag, payload):
+        return (struct.pack(">I", len(payload)) + tag + payload
+                + struct.pack(">I", zlib.crc32(tag + payload) & 0xFFFFFFFF))
+
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(filtered.tobytes(), 6)))
+        f.write(chunk(b"IEND", b""))
+    os.replace(tmp_path, filepath)
+    return filepath
+
+def preprocess_gobo(filepath, path, max_size, level=0):
+    """Write a power-of-two, resolution-capped and (when gray) single-channel copy of a gobo
+
+    Levels above 0 are pre-blurred softness versions; since blurred images hold
+    less detail they are also stored smaller.
+    """
+    pixels, _is_float = cache.read_image(filepath)
+
+    # Light textures only use the Color output, which Cycles premultiplies by alpha
+    rgb = pixels[..., :3] * pixels[..., 3:4]
+    height = power_of_two(rgb.shape[0], max_size)
+    width = power_of_two(rgb.shape[1], max_size)
+    if level > 0:
+        scale = 1 << (level - 1)
+        height = max(MIN_LEVEL_SIZE, height // scale)
+        width = max(MIN_LEVEL_SIZE, width // scale)
+    if (height, width) != rgb.shape[:2]:
+        rgb = cache.resample(rgb, height, width)
+    if level > 0:
+        rgb = np.clip(gaussian_blur(rgb, BLUR_SIGMA * scale * width), 0.0, 1.0)
+
+    spread = rgb.max(axis=-1) - rgb.min(axis=-1)
+    if np.percentile(spread, 99) < GRAY_TOLERANCE:
+        rgb = rgb.mean(axis=-1)
+    return write_png(path, rgb)
+
+def get_gobo_path(filepath, max_size, level=0):
+    """Path of the cached copy of a gobo for a resolution cap and softness level, building it if needed"""
+    abspath, file_size, mtime = cache.file_signature(filepath)
+    # "floor": copies sized before power_of_two rounded down are rebuilt
+    key = cache.cache_key(abspath, file_size, mtime, max_size, level, BLUR_SIGMA, "floor")
+
+    index_path = _index_path()
+    index = cache.load_index(index_path)
+    entries = index.get(abspath, {})
+    entry = entries.get(f"{max_size}/{level}")
+    if entry and entry.get("key") == key and os.path.exists(entry["path"]):
+        return entry["path"]
+
+    if entry and os.path.exists(entry["path"]):
+        try:
+            os.remove(entry["path"])
+        except OSError:
+            pass
+
+    stem = os.path.splitext(os.path.basename(abspath))[0]
+    path = preprocess_gobo(abspath, os.path.join(get_gobo_cache_dir(), f"{stem}_{key}.png"), max_size, level)
+
+    index = cache.load_index(index_path)
+    index.setdefault(abspath, {})[f"{max_size}/{level}"] = {"key": key, "path": path}
+    cache.save_index(index_path, index)
+    return path
+
+def load_gobo(scene, filepath, level=None):
+    """Load the cached gobo for the scene's resolution cap (the original if preprocessing fails)
+
+    level defaults to the scene's softness.
+    """
+    props = scene.bls_props
+    if level is None:
+        level = softness_level(props.gobo_softness)
+    try:
+        path = get_gobo_path(filepath, int(props.gobo_max_resolution), level)
+    except Exception as e:
+        print(f"BLS: Gobo preprocessing failed for '{os.path.basename(filepath)}': {e}")
+        return image_manager.load_image(filepath)
+
+    img = image_manager.load_image(path)
+    if SOURCE_PROP not in img:
+        # Show the library name rather than the cache file's
+        name = os.path.basename(filepath)
+        img.name = f"{name} Soft {level}" if level else name
+        img[SOURCE_PROP] = os.path.abspath(filepath)
+        img[LEVEL_PROP] = level
+    return img
+
+def get_baked_path(kind, size, scale, seed):
+    """Path of a baked procedural gobo, evaluating the network if it is not cached"""
+    # The gradient has no seed, so every seed shares one bake
+    if kind == 'GRADIENT':
+        seed = 0
+    key = cache.cache_key(kind, size, round(scale, 4), seed)
+    path = os.path.join(get_gobo_cache_dir(), f"{kind.lower()}_{key}.png")
+    if not os.path.exists(path):
+        # 16 bits: the values are linear, where 8 bits would band in the darks
+        write_png(path, procedural.bake_network(kind, size, scale, seed), bit_depth=16)
+        print(f"BLS: Baked {kind.lower()} gobo at {size}px")
+    return path
+
+def load_baked_gobo(scene, kind):
+    """Load the baked image of a procedural network with the scene's scale and seed"""
+    props = scene.bls_props
+    size = int(props.gobo_max_resolution)
+    img = image_manager.load_image(get_baked_path(kind, size, props.procedural_scale, props.procedural_seed))
+    if BAKED_PROP not in img:
+        img.name = f"BLS_Baked_{kind.title()}"
+        img[BAKED_PROP] = kind
+        # Ramp outputs are linear emission values, like the live network's
+        img.colorspace_settings.name = 'Non-Color'
+
+    return img
+
+def get_group_node(obj):
+    """The group node linking a light to its shared gobo network, or None"""
+    if obj is None or obj.type != 'LIGHT' or not obj.data.use_nodes or not obj.data.node_tree:
+        return None
+    node = obj.data.node_tree.nodes.get(GROUP_NODE_NAME)
+    if node and node.type == 'GROUP' and node.node_tree:
+        return node
+    return None
+
+def find_group(kind, img=None):
+    """Existing shared gobo group for a network kind (and, for images, the image)"""
+    for group in bpy.data.node_groups:
+        if group.get(GROUP_PROP) != kind:
+            continue
+        if img is None or any(getattr(node, "image", None) == img for node in group.nodes):
+            return group
+    return None
+
+def remove_unused_groups():
+    """Drop shared gobo groups no light references any more"""
+    for group in list(bpy.data.node_groups):
+        if GROUP_PROP in group and group.users == 0:
+            bpy.data.node_groups.remove(group)
+
+def get_level_group(scene, group, level):
+    """The image gobo group like group but at another softness level, copied if needed"""
+    for node in group.nodes:
+        if node.type == 'TEX_IMAGE' and node.image and SOURCE_PROP in node.image:
+            break
+    else:
+        return group
+    if node.image.get(LEVEL_PROP, 0) == level:
+        return group
+
+    img = load_gobo(scene, node.image[SOURCE_PROP], level)
+    existing = find_group('IMAGE', img)
+    if existing:
+        return existing
+
+    copy = group.copy()
+    copy.name = f"BLS_Gobo_{img.name}"
+    for copy_node in copy.nodes:
+        if copy_node.type == 'TEX_IMAGE' and copy_node.image == node.image:
+            copy_node.image = img
+    return copy
+
+def iter_gobo_nodes(objects):
+    """Nodes of the lights' trees and of the shared gobo groups they use, each tree once"""
+    seen = set()
+    for obj in objects:
+        if obj.type != 'LIGHT' or not obj.data.use_nodes or not obj.data.node_tree:
+            continue
+        trees = [obj.data.node_tree]
+        group_node = get_group_node(obj)
+        if group_node:
+            trees.append(group_node.node_tree)
+        for tree in trees:
+            if tree.as_pointer() in seen:
+                continue
+            seen.add(tree.as_pointer())
+            yield from tree.nodes
+
+def update_procedural_mapping(node, props):
+    """Apply the scene's procedural scale (and seed, if the network uses it) to a mapping node"""
+    scale = node[PROCEDURAL_MAPPING_PROP] * props.procedural_scale
+    node.inputs['Scale'].default_value = (scale, scale, scale)
+    if node.get(PROCEDURAL_SEEDED_PROP):
+        node.inputs['Location'].default_value[2] = props.procedural_seed * procedural.SEED_OFFSET
+
+def refresh_gobo_lights(scene, objects, level=None):
+    """Reload the cached gobos of lights, at a new softness level or keeping their own"""
+    for node in list(iter_gobo_nodes(objects)):
+        if node.type != 'TEX_IMAGE' or not node.image:
+            continue
+        if SOURCE_PROP in node.image:
+            node_level = node.image.get(LEVEL_PROP, 0) if level is None else level
+            img = load_gobo(scene, node.image[SOURCE_PROP], node_level)
+        elif BAKED_PROP in node.image and level is None:
+            img = load_baked_gobo(scene, node.image[BAKED_PROP])
+        else:
+            continue
+        if node.image != img:
+            node.image = img
+    image_manager.release_unused()
+
+def update_gobo_resolution(self, context):
+    """Re-point the scene's gobo lights (and their shared groups) at copies for the new resolution cap"""
+    refresh_gobo_lights(context.scene, context.scene.objects)
+
+def apply_gobo_softness(scene, view_layer):
+    """Point the selected gobo lights at the pre-blurred level for the scene's softness
+
+    Lights using a shared group move to the group of the new level, so
+    unselected lights sharing the gobo keep their own softness.
+    """
+    if view_layer is None:
+        return
+    objects = set(view_layer.objects.selected)
+    if view_layer.objects.active:
+        objects.add(view_layer.objects.active)
+
+    level = softness_level(scene.bls_props.gobo_softness)
+    unshared = []
+    for obj in objects:
+        group_node = get_group_node(obj)
+        if group_node is None:
+            unshared.append(obj)
+        elif group_node.node_tree.get(GROUP_PROP) == 'IMAGE':
+            group = get_level_group(scene, group_node.node_tree, level)
+            if group_node.node_tree != group:
+                group_node.node_tree = group
+
+    # Lights textured before gobos were shared hold the image in their own tree
+    refresh_gobo_lights(scene, unshared, level)
+    remove_unused_groups()
+
+def update_gobo_softness(self, context):
+    live_update.schedule(context, apply_gobo_softness)
+
+def _selected_objects(view_layer):
+    objects = set(view_layer.objects.selected)
+    if view_layer.objects.active:
+        objects.add(view_layer.objects.active)
+    return objects
+
+def apply_procedural_settings(scene, view_layer):
+    """Re-map the live networks of the selected procedural gobo lights
+
+    The network lives in a shared group, so every light using the same
+    procedural gobo follows, selected or not.
+    """
+    if view_layer is None:
+        return
+    for node in list(iter_gobo_nodes(_selected_objects(view_layer))):
+        if node.type == 'MAPPING' and PROCEDURAL_MAPPING_PROP in node:
+            update_procedural_mapping(node, scene.bls_props)
+
+def apply_procedural_bakes(scene, view_layer):
+    """Re-bake the selected baked procedural gobo lights, dropping superseded bakes"""
+    if view_layer is None:
+        return
+    replaced = set()
+    for node in list(iter_gobo_nodes(_selected_objects(view_layer))):
+        if node.type == 'TEX_IMAGE' and node.image and BAKED_PROP in node.image:
+            img = load_baked_gobo(scene, node.image[BAKED_PROP])
+            if node.image != img:
+                replaced.add(bpy.path.abspath(node.image.filepath))
+                node.image = img
+    image_manager.release_unused()
+    remove_unused_bakes(replaced)
+
+def remove_unused_bakes(paths):
+    """Delete baked gobo files no loaded image references any more
+
+    Bakes are deterministic, so a file removed here is simply baked again when
+    a light asks for it.
+    """
+    cache_dir = os.path.normpath(get_gobo_cache_dir())
+    used = {os.path.normpath(bpy.path.abspath(img.filepath)) for img in bpy.data.images if img.filepath}
+    for path in paths:
+        path = os.path.normpath(path)
+        if os.path.dirname(path) == cache_dir and path not in used and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def update_procedural_settings(self, context):
+    # Live networks follow the drag; bakes wait until it is released
+    live_update.schedule(context, apply_procedural_settings)
+    live_update.schedule(context, apply_procedural_bakes, settle=True)
@@ -1,15 +1,61 @@
 import bpy
 import os
+import math
+import time
 import bpy.utils.previews
+from bpy.app.handlers import persistent
+
+from . import catalog
+from . import exposure
+from . import gobo_cache
+from . import hdri_analysis
+from . import hdri_proxy
+from . import image_manager
+from . import irradiance
+from . import live_update
+from . import preferences
+from . import procedural
+from . import similarity
+from . import world_setup
 
 # Global debug info
 debug_msg = "Not initialized"
 
+# Deferred preview loading: seconds of work per timer tick, and tick spacing
+PREVIEW_TIME_SLICE = 0.02
+PREVIEW_TIMER_INTERVAL = 0.01
+
+# Pending (collection key, loader generator) jobs, processed in order
+_preview_jobs = []
+
+# Collection key -> placeholder enum items shown while that collection loads
+preview_progress = {}
+
+# HDRI identifier -> (icon_id, SH data) or None, so panel redraws skip the catalog and disk
+_lighting_previews = {}
+
+# Seconds between folder polls while watch mode is enabled
+LIBRARY_WATCH_INTERVAL = 2.0
+
+# Supported file formats per library
+GOBO_TEXTURE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.exr', '.bmp', '.tga')
+HDRI_EXTENSIONS = ('.hdr', '.exr', '.jpg', '.jpeg', '.png', '.webp')
+REFLECTOR_ICON_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tga')
+
+LIBRARY_EXTENSIONS = {
+    'GOBO': GOBO_TEXTURE_EXTENSIONS,
+    'HDRI': HDRI_EXTENSIONS,
+    'REFLECTOR': REFLECTOR_ICON_EXTENSIONS,
+}
+
+# Catalog kind per preview collection key
+COLLECTION_KINDS = {"main": 'GOBO', "hdri": 'HDRI', "reflector": 'REFLECTOR'}
+
 def get_addon_dir():
     """Get the addon directory"""
     return os.path.dirname(os.path.abspath(__file__))
 
-def create_default_textures():
+def create_default_textures(resolution=1024, icon_size=128):
     """Create default textures if they don't exist"""
     addon_dir = get_addon_dir()
     textures_dir = os.path.join(addon_dir, "textures")
@@ -22,162 +68,231 @@ def create_default_textures():
     os.makedirs(icons_dir, exist_ok=True)
     os.makedirs(hdri_dir, exist_ok=True)
     
-    # Default gobo textures
-    defaults = [
-        ("softbox", (1.0, 1.0, 1.0, 1.0)),
-        ("grid", (0.7, 0.7, 0.7, 1.0)),
-        ("circle", (0.9, 0.8, 0.6, 1.0)),
-        ("dots", (0.8, 0.9, 1.0, 1.0)),
-        ("stripes", (1.0, 0.9, 0.8, 1.0)),
-    ]
+    # Every registered procedural pattern becomes a default gobo
+    for name in procedural.GOBO_PATTERNS:
+        # Small icon and full-resolution texture are generated separately
+        for size, folder in ((icon_size, icons_dir), (resolution, gobos_dir)):
+            img = procedural.create_pattern_image(name, size, image_name=f"BLS_{name}")
+            
+            img.filepath_raw = os.path.join(folder, f"{name}.png")
+            img.file_format = 'PNG'
+            img.save()
+            
+            bpy.data.images.remove(img)
     
-    for name, color in defaults:
-        # Create a simple 128x128 image
-        img = bpy.data.images.new(name, width=128, height=128)
-        
-        # Fill with pattern
-        pixels = []
-        for y in range(128):
-            for x in range(128):
-                if name == "softbox":
-                    dx = (x - 64) / 64.0
-                    dy = (y - 64) / 64.0
-                    dist = (dx*dx + dy*dy) ** 0.5
-                    intensity = max(0, 1 - dist)
-                    px_color = (color[0] * intensity, color[1] * intensity, color[2] * intensity, 1.0)
-                elif name == "grid":
-                    if (x % 16 < 2) or (y % 16 < 2):
-                        px_color = color
-                    else:
-                        px_color = (color[0]*0.3, color[1]*0.3, color[2]*0.3, 1.0)
-                elif name == "circle":
-                    dx = (x - 64) / 64.0
-                    dy = (y - 64) / 64.0
-                    dist = (dx*dx + dy*dy) ** 0.5
-                    if dist < 0.4:
-                        px_color = color
-                    else:
-                        px_color = (color[0]*0.4, color[1]*0.4, color[2]*0.4, 1.0)
-                elif name == "dots":
-                    if (x % 32 < 8) and (y % 32 < 8):
-                        px_color = color
-                    else:
-                        px_color = (color[0]*0.5, color[1]*0.5, color[2]*0.5, 1.0)
-                else:  # stripes
-                    if (x // 16) % 2 == 0:
-                        px_color = color
-                    else:
-                        px_color = (color[0]*0.6, color[1]*0.6, color[2]*0.6, 1.0)
-                
-                pixels.extend(px_color)
-        
-        img.pixels = pixels
-        
-        # Save PNG
-        icon_path = os.path.join(icons_dir, f"{name}.png")
-        tex_path = os.path.join(gobos_dir, f"{name}.png")
-        
-        img.filepath_raw = icon_path
-        img.file_format = 'PNG'
-        img.save()
-        
-        img.filepath_raw = tex_path
-        img.save()
-        
-        bpy.data.images.remove(img)
-    
-    return len(defaults)
-
-def load_gobo_icons(pcoll):
-    """Load gobo icons into preview collection"""
+    return len(procedural.GOBO_PATTERNS)
+
+def get_library_roots(kind):
+    """Built-in folder plus the enabled user folders of one kind, as catalog roots"""
+    textures_dir = os.path.join(get_addon_dir(), "textures")
+    builtin = {
+        'GOBO': catalog.LibraryRoot('GOBO', os.path.join(textures_dir, "gobos"),
+                                    os.path.join(textures_dir, "icons", "gobos")),
+        'HDRI': catalog.LibraryRoot('HDRI', os.path.join(textures_dir, "hdri"), None),
+        'REFLECTOR': catalog.LibraryRoot('REFLECTOR', os.path.join(textures_dir, "icons", "reflectors"), None),
+    }
+    
+    roots = [builtin[kind]]
+    seen = {os.path.normcase(os.path.abspath(roots[0].path))}
+    
+    prefs = preferences.get_preferences()
+    if prefs:
+        for root in prefs.library_roots:
+            if not (root.enabled and root.kind == kind and root.path):
+                continue
+            path = os.path.abspath(bpy.path.abspath(root.path))
+            if os.path.normcase(path) not in seen:
+                seen.add(os.path.normcase(path))
+                roots.append(catalog.LibraryRoot(kind, path, None))
+    return roots
+
+def _get_scene_prop(attr, default):
+    """Current value of a scene LightForge property, if available"""
+    props = getattr(getattr(bpy.context, "scene", None), "bls_props", None)
+    return getattr(props, attr, default) if props else default
+
+def _get_selected_asset_id(attr):
+    """Catalog ID stored in a scene's preview enum, read without resolving its items"""
+    props = getattr(getattr(bpy.context, "scene", None), "bls_props", None)
+    return props.get(attr) if props else None
+
+def get_page_size():
+    """Number of previews per browser page"""
+    prefs = preferences.get_preferences()
+    return prefs.page_size if prefs else preferences.DEFAULT_PAGE_SIZE
+
+def diff_manifests(old, new):
+    """Return (added, removed, changed) keys between two manifests"""
+    added = [k for k in new if k not in old]
+    removed = [k for k in old if k not in new]
+    changed = [k for k in new if k in old and tuple(old[k]) != tuple(new[k])]
+    return added, removed, changed
+
+def iter_sync_previews(pcoll, assets):
+    """Bring a preview collection in line with a list of catalog assets
+
+    Previews are keyed by asset ID. The previous state is kept as pcoll.manifest
+    ({key: (thumbnail, size, mtime)}), so only new assets are loaded, dropped ones
+    released and modified ones force-reloaded. Yields (done, total) per load.
+    """
+    new_manifest = {str(asset.id): (asset.thumbnail or asset.path, asset.size, asset.mtime)
+                    for asset in assets}
+    old_manifest = getattr(pcoll, "manifest", {})
+    added, removed, changed = diff_manifests(old_manifest, new_manifest)
+    changed_keys = set(changed)
+    
+    for key in removed + changed:
+        if key in pcoll:
+            del pcoll[key]
+    
+    to_load = added + changed
+    for i, key in enumerate(to_load):
+        # A previously interrupted sync may have loaded this one already
+        if key in pcoll:
+            del pcoll[key]
+        
+        try:
+            pcoll.load(key, new_manifest[key][0], 'IMAGE', force_reload=key in changed_keys)
+        except Exception as e:
+            print(f"BLS: Failed to load preview '{new_manifest[key][0]}': {e}")
+        
+        yield i + 1, len(to_load)
+    
+    pcoll.manifest = new_manifest
+
+def iter_library_previews(pcoll, kind, search="", page=0, reindex=True, ids=None, keep=None):
+    """Optionally re-index a library kind, then load previews for one page of matches
+
+    Only the requested page is kept in the preview collection; previews from
+    other pages are released by the sync. page=None loads every match. Stores
+    pcoll.total / pcoll.page / pcoll.page_count and returns the page's assets
+    (use with 'yield from'). ids optionally restricts the matches to those assets.
+    keep is an asset ID (the current selection) listed after the page when it
+    is not on it, so the enum selection stays valid across pages.
+    """
+    if reindex:
+        yield from catalog.iter_index_roots(get_library_roots(kind), LIBRARY_EXTENSIONS[kind])
+    
+    total = catalog.count_assets(kind, search, ids)
+    if page is None:
+        page, page_count = 0, 1
+        assets = catalog.query_assets(kind, search, ids=ids)
+    else:
+        page_size = get_page_size()
+        page_count = max(1, -(-total // page_size))
+        page = max(0, min(page, page_count - 1))
+        assets = catalog.query_assets(kind, search, limit=page_size, offset=page * page_size, ids=ids)
+    
+    if keep is not None and all(asset.id != keep for asset in assets):
+        selected = catalog.get_asset(keep)
+        if selected and selected.kind == kind:
+            assets = list(assets) + [selected]
+    
+    pcoll.total = total
+    pcoll.page = page
+    pcoll.page_count = page_count
+    
+    yield from iter_sync_previews(pcoll, assets)
+    return assets
+
+def iter_gobo_icons(pcoll, reindex=True):
+    """Load gobo icons into preview collection, yielding (done, total) per file"""
     global debug_msg
     
     print("BLS: Loading gobo icons...")
     
-    addon_dir = get_addon_dir()
-    icons_dir = os.path.join(addon_dir, "textures", "icons", "gobos")
+    icons_dir = os.path.join(get_addon_dir(), "textures", "icons", "gobos")
     
     # Create directories and default textures if needed
     if not os.path.exists(icons_dir):
         print("BLS: Creating default textures...")
         create_default_textures()
     
-    # Clear existing previews
-    pcoll.clear()
+    if reindex:
+        yield from catalog.iter_index_roots(get_library_roots('GOBO'), LIBRARY_EXTENSIONS['GOBO'])
+        similarity.invalidate()
+        yield from similarity.iter_update_hashes('GOBO')
+    
+    search, ids = parse_similarity_search(_get_scene_prop("gobo_search", ""))
+    assets = yield from iter_library_previews(pcoll, 'GOBO', search, _get_scene_prop("gobo_page", 0),
+                                           reindex=False, ids=ids,
+                                           keep=_get_selected_asset_id("active_gobo_texture"))
     
     items = []
+    for asset in assets:
+        key = str(asset.id)
+        if key in pcoll:
+            items.append((key, asset.name, asset.path, pcoll[key].icon_id, asset.id))
     
-    if os.path.exists(icons_dir):
-        # Supported formats
-        supported_ext = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tga')
-        
-        # Get all image files
-        image_files = [f for f in os.listdir(icons_dir) 
-                      if f.lower().endswith(supported_ext)]
-        
-        print(f"BLS: Found {len(image_files)} gobo icon files")
-        
-        for i, filename in enumerate(sorted(image_files)):
-            name = os.path.splitext(filename)[0]
-            filepath = os.path.join(icons_dir, filename)
-            
-            try:
-                thumb = pcoll.load(name, filepath, 'IMAGE')
-                items.append((name, name, filename, thumb.icon_id, i))
-            except Exception as e:
-                print(f"BLS: Failed to load '{filename}': {e}")
-        
-        debug_msg = f"Loaded {len(items)} gobo icons"
-    else:
-        debug_msg = "Gobo icons directory not found"
+    debug_msg = f"Loaded {len(items)} gobo icons"
     
     # Store items
     pcoll.gobo_items = items if items else [("NONE", "No Textures", "Add textures", 0, 0)]
     
     print(f"BLS: {debug_msg}")
-    return items
 
-def load_hdri_icons(pcoll):
-    """Load HDRI icons into preview collection"""
+def parse_similarity_search(search):
+    """Split 'similar:<id>' and 'duplicates' out of a gobo search
+
+    Returns the remaining text and the matching asset IDs (None if neither was used).
+    """
+    words = []
+    ids = None
+    for word in search.split():
+        lowered = word.lower()
+        if lowered.startswith("similar:") and lowered[8:].isdigit():
+            ids = similarity.find_similar(int(lowered[8:]))
+        elif lowered == "duplicates":
+            ids = [asset_id for cluster in similarity.find_duplicate_clusters() for asset_id in cluster]
+        else:
+            words.append(word)
+    return " ".join(words), ids
+
+def get_library_asset(identifier, kind):
+    """Resolve an enum identifier (catalog asset ID) to its catalog entry"""
+    try:
+        asset = catalog.get_asset(int(identifier))
+    except (TypeError, ValueError):
+        return None
+    return asset if asset and asset.kind == kind else None
+
+def get_gobo_asset(gobo_id):
+    """Look up a gobo in the asset catalog, or None if it is unknown"""
+    return get_library_asset(gobo_id, 'GOBO')
+
+def register_gobo_asset(filepath):
+    """Add an imported texture to the asset catalog and return its entry"""
+    try:
+        return catalog.add_file('GOBO', filepath, tags=("imported",))
+    except OSError as e:
+        print(f"BLS: Could not catalog '{filepath}': {e}")
+        return None
+
+def load_gobo_icons(pcoll, reindex=True):
+    """Load gobo icons into preview collection"""
+    for _ in iter_gobo_icons(pcoll, reindex):
+        pass
+    return pcoll.gobo_items
+
+def iter_hdri_icons(pcoll, reindex=True):
+    """Load HDRI icons into preview collection, yielding (done, total) per file"""
     print("BLS: Loading HDRI icons...")
     
-    addon_dir = get_addon_dir()
-    hdri_dir = os.path.join(addon_dir, "textures", "hdri")
-    
     # Create directory if it doesn't exist
-    os.makedirs(hdri_dir, exist_ok=True)
+    os.makedirs(os.path.join(get_addon_dir(), "textures", "hdri"), exist_ok=True)
     
-    # Clear existing previews
-    pcoll.clear()
+    assets = yield from iter_library_previews(pcoll, 'HDRI', _get_scene_prop("hdri_search", ""),
+                                           _get_scene_prop("hdri_page", 0), reindex,
+                                           keep=_get_selected_asset_id("active_hdri_texture"))
     
     items = []
-    
-    if os.path.exists(hdri_dir):
-        # Supported HDRI formats
-        supported_ext = ('.hdr', '.exr', '.jpg', '.jpeg', '.png', '.webp')
-        
-        # Get all HDRI files
-        hdri_files = [f for f in os.listdir(hdri_dir) 
-                     if f.lower().endswith(supported_ext)]
-        
-        print(f"BLS: Found {len(hdri_files)} HDRI files")
-        
-        for i, filename in enumerate(sorted(hdri_files)):
-            name = os.path.splitext(filename)[0]
-            filepath = os.path.join(hdri_dir, filename)
-            
-            try:
-                thumb = pcoll.load(name, filepath, 'IMAGE')
-                items.append((filename, name, filename, thumb.icon_id, i))
-            except Exception as e:
-                print(f"BLS: Failed to load HDRI '{filename}': {e}")
-                # Try to load a placeholder if the HDRI itself fails
-                try:
-                    # Create a simple color preview
-                    pcoll_key = f"hdri_{name}"
-                    items.append((filename, name, filename, 'WORLD_DATA', i))
-                except:
-                    pass
+    for asset in assets:
+        key = str(asset.id)
+        if key in pcoll:
+            items.append((key, asset.name, asset.path, pcoll[key].icon_id, asset.id))
+        else:
+            # Placeholder icon if the HDRI preview failed to load
+            items.append((key, asset.name, asset.path, 'WORLD_DATA', asset.id))
     
     # Always add at least one item
     if not items:
@@ -187,12 +302,67 @@ def load_hdri_icons(pcoll):
     pcoll.hdri_items = items
     
     print(f"BLS: Loaded {len(items)} HDRI previews")
-    return items
+    
+    if reindex:
+        # Lighting previews for the whole library follow once the browser is usable
+        load_previews_deferred([("irradiance", iter_hdri_precompute(catalog.query_assets('HDRI')))])
+
+def iter_hdri_precompute(assets):
+    """Cache SH lighting and exposure statistics for HDRI assets, yielding (done, total)"""
+    for i, asset in enumerate(assets):
+        try:
+            # Each step decodes one band of rows, so a large map never blocks a time slice
+            for _ in irradiance.iter_get_sidecar(asset.path):
+                yield i, len(assets)
+            for _ in exposure.iter_get_stats(asset.path):
+                yield i, len(assets)
+        except Exception as e:
+            print(f"BLS: Precompute failed for '{asset.name}': {e}")
+        # A preview cached as missing (or from an older file) is looked up again
+        _lighting_previews.pop(str(asset.id), None)
+        yield i + 1, len(assets)
+
+def load_hdri_icons(pcoll, reindex=True):
+    """Load HDRI icons into preview collection"""
+    for _ in iter_hdri_icons(pcoll, reindex):
+        pass
+    return pcoll.hdri_items
+
+def get_lighting_preview(identifier):
+    """(icon_id, SH data) of an HDRI's precomputed lighting ball, or None if not ready
+
+    Called from panel draws, so results (including misses) are cached until
+    the precompute pass reaches the asset.
+    """
+    if identifier in _lighting_previews:
+        return _lighting_previews[identifier]
+    
+    from . import preview_collections
+    
+    pcoll = preview_collections.get("irradiance")
+    if pcoll is None:
+        return None
+    
+    preview = None
+    asset = get_library_asset(identifier, 'HDRI')
+    data = irradiance.get_sidecar(asset.path, compute=False) if asset else None
+    if data:
+        # Keyed by the ball file so a recomputed sidecar gets a fresh preview
+        key = os.path.basename(data["ball"])
+        if key not in pcoll:
+            pcoll.load(key, data["ball"], 'IMAGE')
+        preview = (pcoll[key].icon_id, data)
+    
+    _lighting_previews[identifier] = preview
+    return preview
 
 def get_gobo_previews(self, context):
     """Callback for gobo previews"""
     from . import preview_collections
     
+    if "main" in preview_progress:
+        return preview_progress["main"]
+    
     if "main" in preview_collections:
         pcoll = preview_collections["main"]
         if hasattr(pcoll, 'gobo_items'):
@@ -204,6 +374,9 @@ def get_hdri_previews(self, context):
     """Callback for HDRI previews"""
     from . import preview_collections
     
+    if "hdri" in preview_progress:
+        return preview_progress["hdri"]
+    
     if "hdri" in preview_collections:
         pcoll = preview_collections["hdri"]
         if hasattr(pcoll, 'hdri_items'):
@@ -211,48 +384,23 @@ def get_hdri_previews(self, context):
     
     return [("NONE", "No HDRIs", "Add HDRIs to textures/hdri", 0, 0)]
 
-def load_reflector_icons(pcoll):
-    """Load reflector icons into preview collection"""
+def iter_reflector_icons(pcoll, reindex=True):
+    """Load reflector icons into preview collection, yielding (done, total) per file"""
     print("BLS: Loading reflector icons...")
     
-    addon_dir = get_addon_dir()
-    icons_dir = os.path.join(addon_dir, "textures", "icons", "reflectors")
-    
     # Create directory if it doesn't exist
-    os.makedirs(icons_dir, exist_ok=True)
+    os.makedirs(os.path.join(get_addon_dir(), "textures", "icons", "reflectors"), exist_ok=True)
     
-    # Clear existing previews
-    pcoll.clear()
+    assets = yield from iter_library_previews(pcoll, 'REFLECTOR', page=None, reindex=reindex)
     
+    # Reflector identifiers are material names, so keep the first of each name
     items = []
-    
-    if os.path.exists(icons_dir):
-        # Supported formats
-        supported_ext = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tga')
-        
-        # Get all image files
-        image_files = [f for f in os.listdir(icons_dir) 
-                      if f.lower().endswith(supported_ext)]
-        
-        print(f"BLS: Found {len(image_files)} reflector icon files")
-        
-        for i, filename in enumerate(sorted(image_files)):
-            name = os.path.splitext(filename)[0]
-            filepath = os.path.join(icons_dir, filename)
-            
-            try:
-                thumb = pcoll.load(name, filepath, 'IMAGE')
-                items.append((name, name, filename, thumb.icon_id, i))
-            except Exception as e:
-                print(f"BLS: Failed to load reflector '{filename}': {e}")
-    
-    # Prioritize Silver
-    silver_item = None
-    for item in items:
-        if item[0].upper() == 'SILVER':
-            silver_item = item
-            break
-    
+    seen = set()
+    for asset in assets:
+        key = str(asset.id)
+        if key in pcoll and asset.name.upper() not in seen:
+            seen.add(asset.name.upper())
+            items.append((asset.name, asset.name, asset.path, pcoll[key].icon_id, asset.id))
     
     # Default items if no icons found
     if not items:
@@ -268,7 +416,12 @@ def load_reflector_icons(pcoll):
     pcoll.reflector_items = items
     
     print(f"BLS: Loaded {len(items)} reflector previews")
-    return items
+
+def load_reflector_icons(pcoll, reindex=True):
+    """Load reflector icons into preview collection"""
+    for _ in iter_reflector_icons(pcoll, reindex):
+        pass
+    return pcoll.reflector_items
 
 def get_reflector_previews(self, context):
     """Callback for reflector previews"""
@@ -286,41 +439,199 @@ def get_reflector_previews(self, context):
         ("BLACK", "Black", "Black flag", 'SHADING_BBOX', 3),
     ]
 
-def update_gpu_device(self, context):
-    """Auto-apply GPU settings when changed"""
-    scene = context.scene
+def _set_preview_progress(key, done, total):
+    """Store the 'Loading N/M' placeholder item for a collection"""
+    label = f"Loading {done}/{total}" if total else "Loading..."
+    # Enum item strings must stay referenced while Blender displays them
+    preview_progress[key] = [("NONE", label, "Loading previews", 'TIME', 0)]
+
+def get_loading_status(key):
+    """Return the 'Loading N/M' text for a collection, or None when loaded"""
+    items = preview_progress.get(key)
+    return items[0][1] if items else None
+
+def _tag_redraw_sidebar():
+    """Redraw 3D viewports so panels pick up new previews"""
+    wm = bpy.context.window_manager
+    if not wm:
+        return
+    for window in wm.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+
+def _process_preview_jobs():
+    """Timer callback: run queued loaders until the time slice is used up"""
+    deadline = time.perf_counter() + PREVIEW_TIME_SLICE
+    
+    while _preview_jobs and time.perf_counter() < deadline:
+        key, job = _preview_jobs[0]
+        try:
+            done, total = next(job)
+            _set_preview_progress(key, done, total)
+        except StopIteration:
+            _preview_jobs.pop(0)
+            preview_progress.pop(key, None)
+        except Exception as e:
+            print(f"BLS: Preview loading for '{key}' failed: {e}")
+            _preview_jobs.pop(0)
+            preview_progress.pop(key, None)
+    
+    _tag_redraw_sidebar()
+    
+    if _preview_jobs:
+        return PREVIEW_TIMER_INTERVAL
+    return None
+
+def load_previews_deferred(jobs):
+    """Queue preview loaders to run time-sliced on bpy.app.timers
+
+    jobs is a list of (collection key, loader generator). Registration returns
+    immediately; the enum callbacks report 'Loading N/M' until each collection
+    is complete.
+    """
+    for key, job in jobs:
+        cancel_preview_jobs(key)
+        _preview_jobs.append((key, job))
+        _set_preview_progress(key, 0, 0)
+    
+    if _preview_jobs and not bpy.app.timers.is_registered(_process_preview_jobs):
+        bpy.app.timers.register(_process_preview_jobs, first_interval=PREVIEW_TIMER_INTERVAL)
+
+def cancel_preview_jobs(key=None):
+    """Drop pending loaders for one collection key, or all of them"""
+    for job_key, job in list(_preview_jobs):
+        if key is None or job_key == key:
+            _preview_jobs.remove((job_key, job))
+            job.close()
+            preview_progress.pop(job_key, None)
+    
+    if not _preview_jobs and bpy.app.timers.is_registered(_process_preview_jobs):
+        bpy.app.timers.unregister(_process_preview_jobs)
+
+def _get_library_loaders():
+    """Collection key -> loader generator function"""
+    return {
+        "main": iter_gobo_icons,
+        "hdri": iter_hdri_icons,
+        "reflector": iter_reflector_icons,
+    }
+
+def _queue_search_refresh(key):
+    """Re-query the catalog for one collection without re-indexing the folders"""
+    from . import preview_collections
+    
+    pcoll = preview_collections.get(key)
+    if pcoll is not None:
+        load_previews_deferred([(key, _get_library_loaders()[key](pcoll, reindex=False))])
+
+def update_gobo_search(self, context):
+    # A new search starts from the first page (which queues the refresh)
+    if self.gobo_page != 0:
+        self.gobo_page = 0
+    else:
+        _queue_search_refresh("main")
+
+def update_hdri_search(self, context):
+    if self.hdri_page != 0:
+        self.hdri_page = 0
+    else:
+        _queue_search_refresh("hdri")
+
+def update_gobo_page(self, context):
+    _queue_search_refresh("main")
+
+def update_hdri_page(self, context):
+    _queue_search_refresh("hdri")
+
+def get_page_status(key):
+    """'Page N/M (total)' text for a paged preview collection, or None"""
+    from . import preview_collections
+    
+    pcoll = preview_collections.get(key)
+    if pcoll is None or not hasattr(pcoll, "page_count"):
+        return None
+    return f"Page {pcoll.page + 1}/{pcoll.page_count} ({pcoll.total})"
+
+def _watch_library_folders():
+    """Timer callback: poll library folders and queue incremental syncs on change"""
+    from . import preview_collections
+    
+    if not _library_watch_wanted():
+        return None
+    
+    jobs = []
+    for key, loader in _get_library_loaders().items():
+        pcoll = preview_collections.get(key)
+        # Skip collections that are still loading or not initialised yet
+        if pcoll is None or key in preview_progress or not hasattr(pcoll, "manifest"):
+            continue
+        
+        if catalog.roots_changed(get_library_roots(COLLECTION_KINDS[key])):
+            jobs.append((key, loader(pcoll)))
+    
+    if jobs:
+        load_previews_deferred(jobs)
+    
+    return LIBRARY_WATCH_INTERVAL
+
+def _library_watch_wanted():
+    """Whether any scene has Watch Library Folders enabled"""
+    return any(getattr(getattr(scene, "bls_props", None), "watch_library", False)
+               for scene in bpy.data.scenes)
+
+def start_library_watch():
+    """Start polling the library folders if any scene asks for it"""
+    if _library_watch_wanted() and not bpy.app.timers.is_registered(_watch_library_folders):
+        bpy.app.timers.register(_watch_library_folders,
+                                first_interval=LIBRARY_WATCH_INTERVAL,
+                                persistent=True)
+
+@persistent
+def _load_post(*args):
+    # The toggle is saved with the scene, the timer is not
+    start_library_watch()
+
+def update_watch_library(self, context):
+    """Start or stop polling the library folders"""
+    if self.watch_library:
+        start_library_watch()
+    elif not _library_watch_wanted() and bpy.app.timers.is_registered(_watch_library_folders):
+        bpy.app.timers.unregister(_watch_library_folders)
+
+def apply_gpu_device(scene, view_layer=None):
+    """Apply the GPU setting, re-enumerating devices only when the device type changes"""
+    gpu_device = scene.bls_props.gpu_device
     scene.render.engine = 'CYCLES'
     
     # Access Cycles preferences
-    cprefs = context.preferences.addons['cycles'].preferences
+    cprefs = bpy.context.preferences.addons['cycles'].preferences
     
-    if self.gpu_device == 'NONE':
+    if gpu_device == 'NONE':
         cprefs.compute_device_type = 'NONE'
         print("BLS: CPU rendering enabled")
         return
         
-    # Set device type
-    cprefs.compute_device_type = self.gpu_device # 'CUDA' or 'OPTIX'
-    
-    # Refresh devices
-    cprefs.get_devices()
+    # Set device type and refresh devices
+    if cprefs.compute_device_type != gpu_device or not len(cprefs.devices):
+        cprefs.compute_device_type = gpu_device # 'CUDA' or 'OPTIX'
+        cprefs.get_devices()
     
     # Enable all GPU devices
     for device in cprefs.devices:
-        if device.type == self.gpu_device:
-            device.use = True
-        else:
-            device.use = False
+        use = device.type == gpu_device
+        if device.use != use:
+            device.use = use
             
     # Configure Denoising
-    if self.gpu_device == 'CUDA':
+    if gpu_device == 'CUDA':
         scene.cycles.use_denoising = True
         scene.cycles.denoiser = 'OPENIMAGEDENOISE'
         if hasattr(scene.cycles, "denoising_use_gpu"):
             scene.cycles.denoising_use_gpu = True
         print("BLS: GPU Ready: CUDA + OIDN")
         
-    elif self.gpu_device == 'OPTIX':
+    elif gpu_device == 'OPTIX':
         scene.cycles.use_denoising = True
         scene.cycles.denoiser = 'OPTIX'
         print("BLS: GPU Ready: OptiX")
@@ -328,124 +639,224 @@ def update_gpu_device(self, context):
     scene.cycles.device = 'GPU'
     
     # Force redraw to show feedback if needed
-    for area in context.screen.areas:
-        area.tag_redraw()
+    _tag_redraw_sidebar()
+
+def update_gpu_device(self, context):
+    """Auto-apply GPU settings when changed"""
+    live_update.schedule(context, apply_gpu_device)
 
 # Operators
+def get_selected_lights(context):
+    """Selected light objects, the active one first"""
+    lights = []
+    for obj in [context.active_object] + list(context.selected_objects):
+        if obj and obj.type == 'LIGHT' and obj not in lights:
+            lights.append(obj)
+    return lights
+
+def _new_group_socket(group, name, in_out, socket_type):
+    """Add a group input or output socket (interface API from Blender 4.0)"""
+    if hasattr(group, "interface"):
+        return group.interface.new_socket(name, in_out=in_out, socket_type=socket_type)
+    sockets = group.inputs if in_out == 'INPUT' else group.outputs
+    return sockets.new(socket_type, name)
+
+def new_gobo_group(name, kind):
+    """Shared gobo network shell: the UV is scaled and rotated about the texture centre
+    by the group node's inputs, returning (group, vector output, color input)"""
+    group = bpy.data.node_groups.new(name, 'ShaderNodeTree')
+    group[gobo_cache.GROUP_PROP] = kind
+
+    _new_group_socket(group, "Vector", 'INPUT', 'NodeSocketVector')
+    socket = _new_group_socket(group, "Scale", 'INPUT', 'NodeSocketFloat')
+    socket.default_value = 1.0
+    socket.min_value = 0.01
+    _new_group_socket(group, "Rotation", 'INPUT', 'NodeSocketFloat')
+    _new_group_socket(group, "Color", 'OUTPUT', 'NodeSocketColor')
+
+    nodes = group.nodes
+    links = group.links
+    center = (0.5, 0.5, 0.0)
+
+    node_input = nodes.new(type='NodeGroupInput')
+    node_input.location = (-1500, 0)
+
+    node_center = nodes.new(type='ShaderNodeVectorMath')
+    node_center.location = (-1300, 100)
+    node_center.operation = 'SUBTRACT'
+    node_center.inputs[1].default_value = center
+
+    # Rotation is entered in degrees so the group node shows a plain number
+    node_radians = nodes.new(type='ShaderNodeMath')
+    node_radians.location = (-1300, -150)
+    node_radians.operation = 'RADIANS'
+
+    node_rotation = nodes.new(type='ShaderNodeCombineXYZ')
+    node_rotation.location = (-1100, -150)
+
+    node_transform = nodes.new(type='ShaderNodeMapping')
+    node_transform.location = (-900, 0)
+    node_transform.inputs['Location'].default_value = center
+
+    node_output = nodes.new(type='NodeGroupOutput')
+    node_output.location = (0, 0)
+
+    links.new(node_input.outputs['Vector'], node_center.inputs[0])
+    links.new(node_center.outputs['Vector'], node_transform.inputs['Vector'])
+    links.new(node_input.outputs['Scale'], node_transform.inputs['Scale'])
+    links.new(node_input.outputs['Rotation'], node_radians.inputs[0])
+    links.new(node_radians.outputs['Value'], node_rotation.inputs['Z'])
+    links.new(node_rotation.outputs['Vector'], node_transform.inputs['Rotation'])
+    return group, node_transform.outputs['Vector'], node_output.inputs['Color']
+
 class BLS_OT_apply_gobo(bpy.types.Operator):
     bl_idname = "bls.apply_gobo"
     bl_label = "Apply Texture"
     bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
-        light = context.active_object
-        if not light or light.type != 'LIGHT':
+        lights = get_selected_lights(context)
+        if not lights:
             self.report({'ERROR'}, "Please select a light object")
             return {'CANCELLED'}
         
         props = context.scene.bls_props
-        texture_type = props.texture_type
+        group = self.get_gobo_group(context.scene, props)
+        if group is None:
+            return {'CANCELLED'}
+        
+        # Linked duplicates share their light data, and so their node tree
+        done = set()
+        for light in lights:
+            if light.data.name_full not in done:
+                done.add(light.data.name_full)
+                self.setup_light_nodes(light, group)
+            # Apply Camera Visibility
+            light.visible_camera = props.gobo_camera_visible
+        
+        # The rebuilt trees may have dropped the last user of the previous network or texture
+        gobo_cache.remove_unused_groups()
+        image_manager.release_unused()
+        
+        self.report({'INFO'}, f"Applied '{group.name}' to {len(lights)} light(s)")
+        return {'FINISHED'}
+
+    def get_gobo_group(self, scene, props):
+        """Shared network for the current texture settings, reused when one already exists"""
+        if props.texture_type == 'IMAGE':
+            img = self.load_image_texture(scene, props.active_gobo_texture)
+        elif props.procedural_bake:
+            # One image lookup instead of evaluating the network on every light sample
+            img = gobo_cache.load_baked_gobo(scene, props.procedural_type)
+        else:
+            group = gobo_cache.find_group(props.procedural_type)
+            if group:
+                # Every light using the group follows the current scale and seed
+                for node in group.nodes:
+                    if node.type == 'MAPPING' and gobo_cache.PROCEDURAL_MAPPING_PROP in node:
+                        gobo_cache.update_procedural_mapping(node, props)
+                return group
+            
+            group, vector, color = new_gobo_group(f"BLS_Gobo_{props.procedural_type.title()}",
+                                                  props.procedural_type)
+            if props.procedural_type == 'GRADIENT':
+                self.setup_gradient_texture(group.nodes, group.links, vector, color, props)
+            else:
+                self.setup_noise_texture(group.nodes, group.links, vector, color, props)
+            return group
+        
+        if img is None:
+            return None
+        group = gobo_cache.find_group('IMAGE', img)
+        if group is None:
+            group, vector, color = new_gobo_group(f"BLS_Gobo_{img.name}", 'IMAGE')
+            self.setup_image_nodes(group.nodes, group.links, vector, color, img)
+        return group
+
+    def setup_light_nodes(self, light, group):
+        """Point a light at the shared group, keeping its scale and rotation overrides"""
+        overrides = {}
+        group_node = gobo_cache.get_group_node(light)
+        if group_node:
+            overrides = {name: group_node.inputs[name].default_value for name in ("Scale", "Rotation")}
         
         light.data.use_nodes = True
         nodes = light.data.node_tree.nodes
         links = light.data.node_tree.links
         nodes.clear()
         
+        node_coord = nodes.new(type='ShaderNodeTexCoord')
+        node_coord.location = (-400, 0)
+        
+        group_node = nodes.new(type='ShaderNodeGroup')
+        group_node.node_tree = group
+        group_node.name = gobo_cache.GROUP_NODE_NAME
+        group_node.location = (-200, 0)
+        for name, value in overrides.items():
+            group_node.inputs[name].default_value = value
+        
         node_emission = nodes.new(type='ShaderNodeEmission')
         node_emission.location = (0, 0)
         node_output = nodes.new(type='ShaderNodeOutputLight')
         node_output.location = (200, 0)
-        links.new(node_emission.outputs['Emission'], node_output.inputs['Surface'])
         
-        if texture_type == 'IMAGE':
-            self.setup_image_texture(nodes, links, node_emission, props.active_gobo_texture)
-        elif texture_type == 'PROCEDURAL':
-            if props.procedural_type == 'GRADIENT':
-                self.setup_gradient_texture(nodes, links, node_emission)
-            elif props.procedural_type == 'NOISE':
-                self.setup_noise_texture(nodes, links, node_emission)
-        
-        # Apply Camera Visibility
-        light.visible_camera = props.gobo_camera_visible
-        
-        return {'FINISHED'}
+        links.new(node_coord.outputs['UV'], group_node.inputs['Vector'])
+        links.new(group_node.outputs['Color'], node_emission.inputs['Color'])
+        links.new(node_emission.outputs['Emission'], node_output.inputs['Surface'])
 
-    def setup_image_texture(self, nodes, links, node_emission, texture_name):
+    def load_image_texture(self, scene, texture_name):
         if texture_name == "NONE":
-            return
+            self.report({'ERROR'}, "No texture selected")
+            return None
         
-        addon_dir = get_addon_dir()
-        tex_dir = os.path.join(addon_dir, "textures", "gobos")
-        
-        # Find texture file
-        filepath = None
-        for ext in ['.png', '.jpg', '.jpeg', '.webp', '.exr']:
-            test_path = os.path.join(tex_dir, f"{texture_name}{ext}")
-            if os.path.exists(test_path):
-                filepath = test_path
-                break
-        
-        if not filepath:
-            self.report({'WARNING'}, f"Texture '{texture_name}' not found")
-            return
+        # Resolved from the library scan; no filesystem probing here
+        asset = get_gobo_asset(texture_name)
+        if not asset:
+            self.report({'WARNING'}, f"Texture '{texture_name}' not found, try reloading the library")
+            return None
         
         try:
-            img = bpy.data.images.load(filepath, check_existing=True)
-            
-            node_tex = nodes.new(type='ShaderNodeTexImage')
-            node_tex.image = img
-            node_tex.location = (-300, 0)
-            
-            node_mapping = nodes.new(type='ShaderNodeMapping')
-            node_mapping.location = (-500, 0)
-            node_mapping.inputs['Scale'].default_value = (1, 1, 1)
-            
-            node_coord = nodes.new(type='ShaderNodeTexCoord')
-            node_coord.location = (-700, 0)
-            
-            links.new(node_coord.outputs['UV'], node_mapping.inputs['Vector'])
-            links.new(node_mapping.outputs['Vector'], node_tex.inputs['Vector'])
-            links.new(node_tex.outputs['Color'], node_emission.inputs['Color'])
-            
+            return gobo_cache.load_gobo(scene, asset.path)
         except Exception as e:
             self.report({'ERROR'}, f"Failed to load texture: {e}")
+            return None
+
+    def setup_image_nodes(self, nodes, links, vector, color, img):
+        node_tex = nodes.new(type='ShaderNodeTexImage')
+        node_tex.image = img
+        node_tex.location = (-300, 0)
+        
+        links.new(vector, node_tex.inputs['Vector'])
+        links.new(node_tex.outputs['Color'], color)
 
-    def setup_gradient_texture(self, nodes, links, node_emission):
+    def setup_gradient_texture(self, nodes, links, vector, color, props):
         node_ramp = nodes.new(type='ShaderNodeValToRGB')
         node_ramp.location = (-300, 0)
         
         # Set B-Spline interpolation
         node_ramp.color_ramp.interpolation = 'B_SPLINE'
         
-        # Clear existing elements and add 3 positions
+        # Outer keys reuse the two default elements, inner keys are added
         ramp = node_ramp.color_ramp
-        # Set first element position
-        ramp.elements[0].position = 0.3
-        ramp.elements[0].color = (0.0, 0.0, 0.0, 1.0)
-        # Set second element position
-        ramp.elements[1].position = 0.7
-        ramp.elements[1].color = (1.0, 1.0, 1.0, 1.0)
-        # Add middle element
-        middle = ramp.elements.new(0.5)
-        middle.color = (0.5, 0.5, 0.5, 1.0)
+        keys = procedural.GRADIENT_RAMP
+        for element, (position, value) in zip((ramp.elements[0], ramp.elements[1]), (keys[0], keys[-1])):
+            element.position = position
+            element.color = (value, value, value, 1.0)
+        for position, value in keys[1:-1]:
+            ramp.elements.new(position).color = (value, value, value, 1.0)
         
         node_grad = nodes.new(type='ShaderNodeTexGradient')
         node_grad.location = (-500, 0)
         node_grad.gradient_type = 'LINEAR'
         
-        node_mapping = nodes.new(type='ShaderNodeMapping')
-        node_mapping.location = (-700, 0)
-        node_mapping.inputs['Scale'].default_value = (2, 2, 2)
+        node_mapping = self.setup_procedural_mapping(nodes, procedural.GRADIENT_MAPPING_SCALE, props)
         
-        node_coord = nodes.new(type='ShaderNodeTexCoord')
-        node_coord.location = (-900, 0)
-        
-        links.new(node_coord.outputs['UV'], node_mapping.inputs['Vector'])
+        links.new(vector, node_mapping.inputs['Vector'])
         links.new(node_mapping.outputs['Vector'], node_grad.inputs['Vector'])
         links.new(node_grad.outputs['Color'], node_ramp.inputs['Fac'])
-        links.new(node_ramp.outputs['Color'], node_emission.inputs['Color'])
+        links.new(node_ramp.outputs['Color'], color)
 
-    def setup_noise_texture(self, nodes, links, node_emission):
+    def setup_noise_texture(self, nodes, links, vector, color, props):
         node_ramp = nodes.new(type='ShaderNodeValToRGB')
         node_ramp.location = (-300, 0)
         
@@ -454,52 +865,163 @@ class BLS_OT_apply_gobo(bpy.types.Operator):
         
         node_noise = nodes.new(type='ShaderNodeTexNoise')
         node_noise.location = (-500, 0)
-        node_noise.inputs['Scale'].default_value = 10.0
-        node_noise.inputs['Detail'].default_value = 5.0
+        node_noise.inputs['Scale'].default_value = procedural.NOISE_SCALE
+        node_noise.inputs['Detail'].default_value = procedural.NOISE_DETAIL
         
-        node_mapping = nodes.new(type='ShaderNodeMapping')
-        node_mapping.location = (-700, 0)
-        node_mapping.inputs['Scale'].default_value = (5, 5, 5)
+        node_mapping = self.setup_procedural_mapping(nodes, procedural.NOISE_MAPPING_SCALE, props, seeded=True)
         
-        node_coord = nodes.new(type='ShaderNodeTexCoord')
-        node_coord.location = (-900, 0)
-        
-        links.new(node_coord.outputs['UV'], node_mapping.inputs['Vector'])
+        links.new(vector, node_mapping.inputs['Vector'])
         links.new(node_mapping.outputs['Vector'], node_noise.inputs['Vector'])
         links.new(node_noise.outputs['Fac'], node_ramp.inputs['Fac'])
-        links.new(node_ramp.outputs['Color'], node_emission.inputs['Color'])
+        links.new(node_ramp.outputs['Color'], color)
+
+    def setup_procedural_mapping(self, nodes, base_scale, props, seeded=False):
+        """Mapping node carrying the editable scale (and seed offset) of a live network"""
+        node_mapping = nodes.new(type='ShaderNodeMapping')
+        node_mapping.location = (-700, 0)
+        node_mapping[gobo_cache.PROCEDURAL_MAPPING_PROP] = base_scale
+        node_mapping[gobo_cache.PROCEDURAL_SEEDED_PROP] = seeded
+        gobo_cache.update_procedural_mapping(node_mapping, props)
+        return node_mapping
 
 
 class BLS_OT_reload_icons(bpy.types.Operator):
     bl_idname = "bls.reload_icons"
     bl_label = "Reload All Icons"
     
+    full: bpy.props.BoolProperty(
+        name="Full Reload",
+        description="Discard all previews and reload every file instead of only changed ones",
+        default=False
+    )
+    
     def execute(self, context):
         from . import preview_collections
         
+        for key in ("main", "hdri"):
+            if key in preview_collections:
+                cancel_preview_jobs(key)
+                if self.full:
+                    preview_collections[key].clear()
+                    preview_collections[key].manifest = {}
+        
         if "main" in preview_collections:
             load_gobo_icons(preview_collections["main"])
         
         if "hdri" in preview_collections:
             load_hdri_icons(preview_collections["hdri"])
         
+        num_gobos = catalog.count_assets('GOBO')
+        
         # Force UI redraw
         for area in context.screen.areas:
             area.tag_redraw()
         
-        self.report({'INFO'}, "All icons reloaded")
+        self.report({'INFO'}, f"All icons reloaded ({num_gobos} gobos indexed)")
+        return {'FINISHED'}
+
+class BLS_OT_change_library_page(bpy.types.Operator):
+    bl_idname = "bls.change_library_page"
+    bl_label = "Change Page"
+    bl_description = "Show the previous or next page of previews"
+    
+    library: bpy.props.EnumProperty(
+        items=[
+            ('GOBO', "Gobos", ""),
+            ('HDRI', "HDRIs", ""),
+        ],
+        default='GOBO'
+    )
+    delta: bpy.props.IntProperty(default=1)
+    
+    def execute(self, context):
+        from . import preview_collections
+        
+        props = context.scene.bls_props
+        key, attr = ("main", "gobo_page") if self.library == 'GOBO' else ("hdri", "hdri_page")
+        
+        page_count = getattr(preview_collections.get(key), "page_count", 1)
+        page = max(0, min(getattr(props, attr) + self.delta, page_count - 1))
+        if page != getattr(props, attr):
+            setattr(props, attr, page)
+        return {'FINISHED'}
+
+class BLS_OT_find_similar_gobos(bpy.types.Operator):
+    bl_idname = "bls.find_similar_gobos"
+    bl_label = "Find Similar Gobos"
+    bl_description = "Show gobos that look like the selected one"
+    
+    def execute(self, context):
+        props = context.scene.bls_props
+        asset = get_gobo_asset(props.active_gobo_texture)
+        if not asset:
+            self.report({'WARNING'}, "Select a gobo first")
+            return {'CANCELLED'}
+        
+        for _ in similarity.iter_update_hashes('GOBO'):
+            pass
+        
+        matches = similarity.find_similar(asset.id)
+        props.gobo_search = f"similar:{asset.id}"
+        
+        self.report({'INFO'}, f"{max(0, len(matches) - 1)} gobos similar to '{asset.name}'")
+        return {'FINISHED'}
+
+class BLS_OT_find_duplicate_gobos(bpy.types.Operator):
+    bl_idname = "bls.find_duplicate_gobos"
+    bl_label = "Find Duplicate Gobos"
+    bl_description = "Report groups of near-identical gobos and show them in the browser"
+    
+    def execute(self, context):
+        for _ in similarity.iter_update_hashes('GOBO'):
+            pass
+        
+        clusters = similarity.find_duplicate_clusters()
+        if not clusters:
+            self.report({'INFO'}, "No duplicate gobos found")
+            return {'FINISHED'}
+        
+        # Keep the largest file of each group, the rest could be removed
+        reclaimable = 0
+        print("BLS: Duplicate gobos:")
+        for i, cluster in enumerate(clusters):
+            assets = sorted((catalog.get_asset(asset_id) for asset_id in cluster),
+                            key=lambda a: ((a.width or 0) * (a.height or 0), a.size), reverse=True)
+            reclaimable += sum(asset.size for asset in assets[1:])
+            print(f"  Group {i + 1}:")
+            for asset in assets:
+                print(f"    {asset.path}")
+        
+        context.scene.bls_props.gobo_search = "duplicates"
+        
+        num_files = sum(len(cluster) for cluster in clusters)
+        self.report({'INFO'}, f"{len(clusters)} duplicate groups ({num_files} files, "
+                              f"{reclaimable / (1024 * 1024):.1f} MB reclaimable), see console")
         return {'FINISHED'}
 
 class BLS_OT_generate_defaults(bpy.types.Operator):
     bl_idname = "bls.generate_defaults"
     bl_label = "Generate Default Textures"
     
+    resolution: bpy.props.EnumProperty(
+        name="Resolution",
+        description="Resolution of the generated gobo textures",
+        items=[
+            ('512', "512", "512 x 512"),
+            ('1024', "1K", "1024 x 1024"),
+            ('2048', "2K", "2048 x 2048"),
+            ('4096', "4K", "4096 x 4096"),
+        ],
+        default='1024'
+    )
+    
     def execute(self, context):
-        num_created = create_default_textures()
+        num_created = create_default_textures(resolution=int(self.resolution))
         
         # Reload icons
         from . import preview_collections
         if "main" in preview_collections:
+            cancel_preview_jobs("main")
             load_gobo_icons(preview_collections["main"])
         
         self.report({'INFO'}, f"Created {num_created} default textures")
@@ -530,6 +1052,12 @@ class BLS_OT_debug_info(bpy.types.Operator):
             for f in files[:5]:
                 info += f"  {f}\n"
         
+        for kind in catalog.KINDS:
+            roots = get_library_roots(kind)
+            info += f"Catalog {kind}: {catalog.count_assets(kind)} assets in {len(roots)} folder(s)\n"
+        
+        info += "\n".join(image_manager.memory_report()) + "\n"
+        
         self.report({'INFO'}, info)
         print(f"BLS DEBUG:\n{info}")
         return {'FINISHED'}
@@ -540,101 +1068,188 @@ class BLS_OT_apply_hdri_from_lib(bpy.types.Operator):
     
     def execute(self, context):
         props = context.scene.bls_props
-        filename = props.active_hdri_texture
         
-        if filename == "NONE":
+        if props.active_hdri_texture == "NONE":
             self.report({'ERROR'}, "No HDRI selected")
             return {'CANCELLED'}
         
-        addon_dir = get_addon_dir()
-        hdri_dir = os.path.join(addon_dir, "textures", "hdri")
-        filepath = os.path.join(hdri_dir, filename)
+        asset = get_library_asset(props.active_hdri_texture, 'HDRI')
+        filepath = asset.path if asset else None
+        filename = os.path.basename(filepath) if filepath else props.active_hdri_texture
         
-        if not os.path.exists(filepath):
+        if not filepath or not os.path.exists(filepath):
             self.report({'ERROR'}, f"HDRI not found: {filename}")
             return {'CANCELLED'}
         
-        # Setup world
-        world = context.scene.world
-        if not world:
-            world = bpy.data.worlds.new("World")
-            context.scene.world = world
+        # Move dominant hot spots into real lights and use the clamped map as the world
+        lights = []
+        world_path = filepath
+        if props.hdri_extract_lights:
+            try:
+                world_path, lights = hdri_analysis.prepare_hdri(filepath)
+            except Exception as e:
+                print(f"BLS: HDRI analysis failed for '{filename}': {e}")
         
-        world.use_nodes = True
-        nodes = world.node_tree.nodes
-        links = world.node_tree.links
-        nodes.clear()
+        try:
+            world, img, freed = world_setup.setup_world_hdri(context.scene, world_path, filepath)
+        except Exception as e:
+            self.report({'ERROR'}, f"Failed to load HDRI: {e}")
+            return {'CANCELLED'}
         
-        node_output = nodes.new('ShaderNodeOutputWorld')
-        node_bg = nodes.new('ShaderNodeBackground')
-        node_env = nodes.new('ShaderNodeTexEnvironment')
-        node_mapping = nodes.new('ShaderNodeMapping')
-        node_coord = nodes.new('ShaderNodeTexCoord')
+        if lights:
+            hdri_analysis.create_hdri_lights(context, lights)
+        else:
+            hdri_analysis.clear_hdri_lights(context.scene)
+        hdri_analysis.configure_world_sampling(world, (asset.width if asset else None) or img.size[0], bool(lights))
         
-        try:
-            img = bpy.data.images.load(filepath)
-            node_env.image = img
-        except:
-            self.report({'ERROR'}, "Failed to load HDRI")
+        message = f"Applied HDRI: {filename}"
+        if lights:
+            message += f", {len(lights)} light(s) extracted"
+        if freed:
+            message += f", freed {image_manager.format_size(freed)}"
+        self.report({'INFO'}, message)
+        return {'FINISHED'}
+
+class BLS_OT_preview_hdri_lighting(bpy.types.Operator):
+    bl_idname = "bls.preview_hdri_lighting"
+    bl_label = "Preview Lighting"
+    bl_description = ("Light the scene with the selected HDRI's low-frequency (SH) approximation, "
+                      "which updates instantly without loading the full map")
+    
+    def execute(self, context):
+        props = context.scene.bls_props
+        asset = get_library_asset(props.active_hdri_texture, 'HDRI')
+        if not asset:
+            self.report({'ERROR'}, "No HDRI selected")
             return {'CANCELLED'}
         
-        links.new(node_coord.outputs['Generated'], node_mapping.inputs['Vector'])
-        links.new(node_mapping.outputs['Vector'], node_env.inputs['Vector'])
-        links.new(node_env.outputs['Color'], node_bg.inputs['Color'])
-        links.new(node_bg.outputs['Background'], node_output.inputs['Surface'])
+        try:
+            data = irradiance.get_sidecar(asset.path)
+            _lighting_previews.pop(props.active_hdri_texture, None)
+            world_setup.setup_world_hdri(context.scene, data["environment"], asset.path)
+        except Exception as e:
+            self.report({'ERROR'}, f"Lighting preview failed: {e}")
+            return {'CANCELLED'}
         
-        # Name nodes for real-time update callbacks
-        node_bg.name = "BLS_Background"
-        node_mapping.name = "BLS_Mapping"
+        hdri_analysis.clear_hdri_lights(context.scene)
+        hdri_analysis.configure_world_sampling(context.scene.world, irradiance.ENVIRONMENT_WIDTH, False)
         
-        # Set values from props
+        self.report({'INFO'}, f"Previewing lighting of {asset.name} (apply the HDRI for the full map)")
+        return {'FINISHED'}
+
+class BLS_OT_load_hdri_slot(bpy.types.Operator):
+    bl_idname = "bls.load_hdri_slot"
+    bl_label = "Load HDRI Slot"
+    bl_description = ("Preload the selected HDRI into a world slot; slots crossfade by a single "
+                      "blend value that can be keyframed")
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    slot: bpy.props.IntProperty(name="Slot", min=0, max=world_setup.SLOT_COUNT - 1)
+    
+    def execute(self, context):
         props = context.scene.bls_props
-        node_bg.inputs['Strength'].default_value = props.hdri_intensity
-        node_mapping.inputs['Rotation'].default_value[2] = props.hdri_rotation * (3.14159 / 180.0)
-        
-        # Arrange nodes
-        node_output.location = (400, 0)
-        node_bg.location = (200, 0)
-        node_env.location = (0, 0)
-        node_mapping.location = (-200, 0)
-        node_coord.location = (-400, 0)
+        asset = get_library_asset(props.active_hdri_texture, 'HDRI')
+        if not asset or not os.path.exists(asset.path):
+            self.report({'ERROR'}, "No HDRI selected")
+            return {'CANCELLED'}
+        
+        try:
+            world, img, freed = world_setup.set_slot_hdri(context.scene, self.slot, asset.path)
+        except Exception as e:
+            self.report({'ERROR'}, f"Failed to load HDRI: {e}")
+            return {'CANCELLED'}
+        
+        # Extracted lights belong to a single HDRI and cannot follow the crossfade
+        hdri_analysis.clear_hdri_lights(context.scene)
+        sizes = [catalog.read_image_size(path) for path in world_setup.get_slot_paths(world) if path]
+        width = max((size[0] for size in sizes if size), default=img.size[0])
+        hdri_analysis.configure_world_sampling(world, width, False)
         
-        self.report({'INFO'}, f"Applied HDRI: {filename}")
+        message = f"Loaded {asset.name} into slot {self.slot + 1}"
+        if freed:
+            message += f", freed {image_manager.format_size(freed)}"
+        self.report({'INFO'}, message)
         return {'FINISHED'}
 
-# Property Group
-def update_hdri_env(self, context):
-    world = context.scene.world
-    if not world or not world.use_nodes:
-        return
+class BLS_OT_show_hdri_slot(bpy.types.Operator):
+    bl_idname = "bls.show_hdri_slot"
+    bl_label = "Show HDRI Slot"
+    bl_description = "Switch the world to this slot (keyed when auto keying is on)"
+    bl_options = {'REGISTER', 'UNDO'}
     
-    nodes = world.node_tree.nodes
+    slot: bpy.props.IntProperty(name="Slot", min=0, max=world_setup.SLOT_COUNT - 1)
+    
+    def execute(self, context):
+        world = context.scene.world
+        if world_setup.get_blend_node(world) is None:
+            self.report({'ERROR'}, "No HDRI slots in this world")
+            return {'CANCELLED'}
+        
+        world_setup.show_slot(world, self.slot, context.scene.tool_settings.use_keyframe_insert_auto)
+        return {'FINISHED'}
+
+class BLS_OT_clear_hdri_slots(bpy.types.Operator):
+    bl_idname = "bls.clear_hdri_slots"
+    bl_label = "Clear HDRI Slots"
+    bl_description = "Go back to a single HDRI (slot 1) and free the other slots"
+    bl_options = {'REGISTER', 'UNDO'}
+    
+    def execute(self, context):
+        world = context.scene.world
+        if world_setup.get_blend_node(world) is None:
+            return {'CANCELLED'}
+        
+        world_setup.remove_slot_nodes(world)
+        world_setup.update_lighting_split(context.scene)
+        apply_hdri_env(context.scene)
+        _count, freed = image_manager.release_unused()
+        self.report({'INFO'}, f"Cleared HDRI slots, freed {image_manager.format_size(freed)}")
+        return {'FINISHED'}
+
+# Property Group
+def apply_hdri_env(scene, view_layer=None):
+    """Push intensity, rotation and exposure to the world and the extracted lights"""
+    node_bg, node_mapping = world_setup.get_live_nodes(scene.world)
     
     # Update Intensity (Background node)
-    node_bg = nodes.get("BLS_Background")
     if node_bg:
-        node_bg.inputs['Strength'].default_value = context.scene.bls_props.hdri_intensity
+        node_bg.inputs['Strength'].default_value = world_setup.get_hdri_strength(scene)
         
     # Update Rotation (Mapping node)
-    node_mapping = nodes.get("BLS_Mapping")
     if node_mapping:
         # Index 2 is Z rotation
-        node_mapping.inputs['Rotation'].default_value[2] = context.scene.bls_props.hdri_rotation * (3.14159 / 180.0)
+        node_mapping.inputs['Rotation'].default_value[2] = math.radians(scene.bls_props.hdri_rotation)
+    
+    world_setup.update_slot_gains(scene)
+    hdri_analysis.update_hdri_lights(scene)
 
-def update_camera_visibility(self, context):
-    """Live update for camera visibility"""
+def update_hdri_env(self, context):
+    live_update.schedule(context, apply_hdri_env)
+
+def apply_camera_visibility(scene, view_layer):
+    """Show the active light (or the first selected one) to the camera"""
+    if view_layer is None:
+        return
+    visible = scene.bls_props.gobo_camera_visible
+    
     # Try to find the active light
-    light_obj = context.active_object
+    light_obj = view_layer.objects.active
     if light_obj and light_obj.type == 'LIGHT':
         # Correctly access Object-level property
-        light_obj.visible_camera = self.gobo_camera_visible
+        if light_obj.visible_camera != visible:
+            light_obj.visible_camera = visible
     else:
         # Fallback: try to find selected light if active is not light
-        for obj in context.selected_objects:
+        for obj in view_layer.objects.selected:
             if obj.type == 'LIGHT':
-                obj.visible_camera = self.gobo_camera_visible
+                if obj.visible_camera != visible:
+                    obj.visible_camera = visible
                 break
 
+def update_camera_visibility(self, context):
+    """Live update for camera visibility"""
+    live_update.schedule(context, apply_camera_visibility)
+
 class BLS_Properties(bpy.types.PropertyGroup):
     # HDRI Properties
     hdri_intensity: bpy.props.FloatProperty(
@@ -674,12 +1289,55 @@ class BLS_Properties(bpy.types.PropertyGroup):
         default='GRADIENT'
     )
     
+    procedural_bake: bpy.props.BoolProperty(
+        name="Bake to Image",
+        description="Evaluate the procedural texture once into a cached image, so lights do a single "
+                    "texture lookup instead of running the node network on every sample",
+        default=False
+    )
+    
+    procedural_scale: bpy.props.FloatProperty(
+        name="Scale",
+        description="Scale of the procedural light texture (re-bakes baked textures); applies to every light sharing it",
+        default=1.0,
+        min=0.05,
+        soft_max=10.0,
+        update=gobo_cache.update_procedural_settings
+    )
+    
+    procedural_seed: bpy.props.IntProperty(
+        name="Seed",
+        description="Variation of the noise texture (re-bakes baked textures); applies to every light sharing it",
+        default=0,
+        min=0,
+        update=gobo_cache.update_procedural_settings
+    )
+    
     active_gobo_texture: bpy.props.EnumProperty(
         name="Gobo Texture",
         description="Select a gobo texture",
         items=get_gobo_previews
     )
 
+    gobo_max_resolution: bpy.props.EnumProperty(
+        name="Gobo Resolution",
+        description="Largest side of the gobo textures lights use; gobos are cached as power-of-two, "
+                    "single-channel copies when gray",
+        items=gobo_cache.GOBO_RESOLUTIONS,
+        default='1024',
+        update=gobo_cache.update_gobo_resolution
+    )
+
+    gobo_softness: bpy.props.FloatProperty(
+        name="Softness",
+        description="Out-of-focus gobo edges of the selected lights, from pre-blurred textures at no extra render cost",
+        default=0.0,
+        min=0.0,
+        max=1.0,
+        subtype='FACTOR',
+        update=gobo_cache.update_gobo_softness
+    )
+
     gobo_camera_visible: bpy.props.BoolProperty(
         name="Camera Visibility",
         description="Make the light texture visible to camera (Primary Visibility)",
@@ -687,6 +1345,75 @@ class BLS_Properties(bpy.types.PropertyGroup):
         update=update_camera_visibility
     )
     
+    hdri_auto_exposure: bpy.props.BoolProperty(
+        name="Normalize Exposure",
+        description="Scale each HDRI so its average brightness matches, making Intensity "
+                    "a consistent exposure across the library",
+        default=True,
+        update=update_hdri_env
+    )
+    
+    hdri_viewport_resolution: bpy.props.EnumProperty(
+        name="Viewport Resolution",
+        description="HDRI proxy used in the viewport; renders always switch to full resolution",
+        items=hdri_proxy.VIEWPORT_RESOLUTIONS,
+        default='1024',
+        update=hdri_proxy.update_viewport_resolution
+    )
+    
+    hdri_blurred_lighting: bpy.props.BoolProperty(
+        name="Blurred Lighting",
+        description="Light the scene from a small pre-blurred copy of the HDRI while camera rays "
+                    "see the full-resolution map; converges in far fewer samples",
+        default=False,
+        update=world_setup.update_blurred_lighting
+    )
+    
+    hdri_extract_lights: bpy.props.BoolProperty(
+        name="Extract Sun",
+        description="Replace the HDRI's brightest spots with matching Sun lights and a clamped "
+                    "world map, for clean renders at far fewer samples",
+        default=False
+    )
+    
+    gobo_search: bpy.props.StringProperty(
+        name="Search Gobos",
+        description="Filter gobos by name or tag (use tag:name for an exact tag, "
+                    "similar:<id> or duplicates for look-alikes)",
+        default="",
+        update=update_gobo_search
+    )
+    
+    hdri_search: bpy.props.StringProperty(
+        name="Search HDRIs",
+        description="Filter HDRIs by name or tag (use tag:name for an exact tag)",
+        default="",
+        update=update_hdri_search
+    )
+    
+    gobo_page: bpy.props.IntProperty(
+        name="Gobo Page",
+        description="Page of the gobo browser",
+        default=0,
+        min=0,
+        update=update_gobo_page
+    )
+    
+    hdri_page: bpy.props.IntProperty(
+        name="HDRI Page",
+        description="Page of the HDRI browser",
+        default=0,
+        min=0,
+        update=update_hdri_page
+    )
+    
+    watch_library: bpy.props.BoolProperty(
+        name="Watch Library Folders",
+        description="Poll the library folders and pick up added or removed files automatically",
+        default=False,
+        update=update_watch_library
+    )
+    
     active_hdri_texture: bpy.props.EnumProperty(
         name="HDRI",
         description="Select an HDRI",
@@ -733,9 +1460,16 @@ classes = (
     BLS_Properties,
     BLS_OT_apply_gobo,
     BLS_OT_reload_icons,
+    BLS_OT_change_library_page,
+    BLS_OT_find_similar_gobos,
+    BLS_OT_find_duplicate_gobos,
     BLS_OT_generate_defaults,
     BLS_OT_debug_info,
     BLS_OT_apply_hdri_from_lib,
+    BLS_OT_preview_hdri_lighting,
+    BLS_OT_load_hdri_slot,
+    BLS_OT_show_hdri_slot,
+    BLS_OT_clear_hdri_slots,
 )
 
 def register():
@@ -748,8 +1482,24 @@ def register():
     # Register property group
     if not hasattr(bpy.types.Scene, 'bls_props'):
         bpy.types.Scene.bls_props = bpy.props.PointerProperty(type=BLS_Properties)
+    
+    if _load_post not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(_load_post)
+    # bpy.data is restricted while add-ons register, so check the open file on the first tick
+    bpy.app.timers.register(start_library_watch, first_interval=0.0)
 
 def unregister():
+    if _load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_load_post)
+    if bpy.app.timers.is_registered(start_library_watch):
+        bpy.app.timers.unregister(start_library_watch)
+    cancel_preview_jobs()
+    if bpy.app.timers.is_registered(_watch_library_folders):
+        bpy.app.timers.unregister(_watch_library_folders)
+    catalog.close()
+    # Icon ids die with the preview collections
+    _lighting_previews.clear()
+    
     if hasattr(bpy.types.Scene, 'bls_props'):
         del bpy.types.Scene.bls_props
     
@@ -0,0 +1,429 @@
+import os
+import re
+import abc
+import mmap
+import zlib
+import struct
+import numpy as np
+
+# Rows decoded per chunk when streaming
+CHUNK_ROWS = 64
+
+# Scanlines whose RLE run headers are located together; every NumPy step of
+# the scan advances all of them, so wider bands need fewer steps per line
+SCAN_ROWS = 512
+
+# Bytes consumed and values produced by each RLE run header byte
+RLE_ADVANCE = np.where(np.arange(256) > 128, 2, 1 + np.arange(256))
+RLE_RUN_LENGTHS = np.where(np.arange(256) > 128, np.arange(256) - 128, np.arange(256))
+
+class UnsupportedFormat(ValueError):
+    """The file is not a Radiance HDR or scanline EXR this reader can decode"""
+
+# Float scale of each RGBE exponent byte; exponent 0 encodes black
+RGBE_SCALES = np.ldexp(np.float32(1.0), np.arange(256) - 136).astype(np.float32)
+RGBE_SCALES[0] = 0.0
+
+def rgbe_to_float(rgbe):
+    """Convert (..., 4) uint8 RGBE to (..., 4) float32 RGBA, as Blender decodes it"""
+    rgba = rgbe.astype(np.float32)
+    rgba += np.float32(0.5)
+    rgba *= RGBE_SCALES[rgbe[..., 3]][..., None]
+    rgba[..., 3] = 1.0
+    return rgba
+
+def float_to_rgbe(rgb):
+    """Convert (..., 3) float RGB to (..., 4) uint8 RGBE"""
+    rgb = np.maximum(rgb, 0.0)
+    peak = rgb.max(axis=-1)
+    mantissa, exponent = np.frexp(peak)
+    scale = np.where(peak > 1e-32, mantissa * 256.0 / np.maximum(peak, 1e-32), 0.0)
+    rgbe = np.zeros(rgb.shape[:-1] + (4,), dtype=np.uint8)
+    rgbe[..., :3] = np.clip(rgb * scale[..., None], 0, 255).astype(np.uint8)
+    rgbe[..., 3] = np.where(peak > 1e-32, exponent + 128, 0).astype(np.uint8)
+    return rgbe
+
+class _MappedImage(abc.ABC):
+    """Common row access for memory-mapped images
+
+    Rows are indexed bottom-up like Blender's pixel buffers. Subclasses decode
+    file scanlines (top-down) with _read_file_rows(first, count).
+    """
+
+    width = height = 0
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._file = open(filepath, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise UnsupportedFormat(f"Empty file '{filepath}'")
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            # NumPy views still held (e.g. by a traceback) keep the map alive until collected
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read_rows(self, start, stop):
+        """(stop - start, width, 4) float32 rows, counted from the bottom"""
+        start, stop = max(0, start), min(self.height, stop)
+        rows = self._read_file_rows(self.height - stop, stop - start)
+        return rows[::-1]
+
+    def iter_rows(self):
+        """read_rows(0, height) as a generator that yields after each chunk
+        and returns the image (use with 'yield from')"""
+        out = np.empty((self.height, self.width, 4), dtype=np.float32)
+        for start, rows in self.iter_chunks():
+            out[start:start + len(rows)] = rows
+            yield
+        return out
+
+    def iter_chunks(self, chunk_rows=CHUNK_ROWS):
+        """Yield (first_row, rows) chunks in file order, rows counted from the bottom"""
+        for first in range(0, self.height, chunk_rows):
+            count = min(chunk_rows, self.height - first)
+            yield self.height - first - count, self._read_file_rows(first, count)[::-1]
+
+    def read_downsampled(self, max_size):
+        """Box-filtered copy whose longest side fits max_size, streamed so only
+        one band of source rows is decoded at a time"""
+        steps = self.iter_downsampled(max_size)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as result:
+                return result.value
+
+    def iter_downsampled(self, max_size):
+        """read_downsampled as a generator that yields after each band of rows
+        and returns the image (use with 'yield from')"""
+        factor = max(1, -(-max(self.width, self.height) // max_size))
+        if factor == 1:
+            return (yield from self.iter_rows())
+
+        out_height, out_width = self.height // factor, self.width // factor
+        out = np.empty((out_height, out_width, 4), dtype=np.float32)
+        band = factor * max(1, CHUNK_ROWS // factor)
+        for first in range(0, out_height * factor, band):
+            count = min(band, out_height * factor - first)
+            rows = self._read_file_rows(first, count)[:, :out_width * factor]
+            blocks = rows.reshape(count // factor, factor, out_width, factor, 4).mean(axis=(1, 3))
+            # File rows run top-down, output rows bottom-up
+            top = out_height - first // factor
+            out[top - count // factor:top] = blocks[::-1]
+            yield
+        return out
+
+    @abc.abstractmethod
+    def _read_file_rows(self, first, count):
+        """(count, width, 4) float32 file scanlines from first, in file order"""
+
+class RGBEImage(_MappedImage):
+    """Radiance .hdr (RGBE) image, decoded scanline by scanline from a memory map"""
+
+    def __init__(self, filepath):
+        super().__init__(filepath)
+        try:
+            self._parse_header()
+        except Exception:
+            self.close()
+            raise
+
+        # File offsets of scanlines found so far, for random row access, and
+        # the run headers of the last indexed band (first, count, rle, headers)
+        self._offsets = [self._data_start]
+        self._scanned = (0, 0, None, None)
+
+    def _parse_header(self):
+        data = self._map
+        if not (data[:2] == b"#?"):
+            raise UnsupportedFormat("Not a Radiance HDR file")
+
+        end = data.find(b"\n\n")
+        if end < 0:
+            raise UnsupportedFormat("Truncated HDR header")
+        header = data[:end].decode("latin-1")
+        if "FORMAT=" in header and "32-bit_rle_rgbe" not in header:
+            raise UnsupportedFormat("Only RGBE HDR files are supported")
+
+        line_end = data.find(b"\n", end + 2)
+        match = re.match(rb"([-+])Y (\d+) \+X (\d+)", data[end + 2:line_end])
+        if not match:
+            raise UnsupportedFormat("Unsupported HDR orientation")
+
+        self.top_down = match.group(1) == b"-"
+        self.height, self.width = int(match.group(2)), int(match.group(3))
+        self._data_start = line_end + 1
+
+    def _is_rle(self, pos):
+        data = self._map
+        return (8 <= self.width < 32768 and data[pos] == 2 and data[pos + 1] == 2
+                and (data[pos + 2] << 8 | data[pos + 3]) == self.width)
+
+    def _scan_rows(self, first, count):
+        """Index count scanlines from stored row first, caching their RLE run headers
+
+        Scanline starts are not known before the previous line is parsed, so
+        every (2, 2, width) marker in the byte window is followed at once: all
+        candidate lines advance one run header per NumPy step, and the true
+        lines are then picked by walking the line ends. Needs the offset of
+        row first; extends self._offsets and replaces self._scanned.
+        """
+        width = self.width
+        data = np.frombuffer(self._map, dtype=np.uint8)
+        base = self._offsets[first]
+        # RLE lines take at most two bytes per value (literal runs of one)
+        window = data[base:min(len(data), base + count * (4 + 8 * width))]
+
+        candidates = np.empty(0, dtype=np.int64)
+        if 8 <= width < 32768 and len(window) >= 4:
+            marker = ((window[:-3] == 2) & (window[1:-2] == 2)
+                      & (window[2:-1] == width >> 8) & (window[3:] == (width & 0xFF)))
+            candidates = np.flatnonzero(marker)
+
+        steps, index = [], {}
+        if len(candidates):
+            heads = candidates + 4
+            filled = np.zeros(len(heads), dtype=np.int64)
+            active = np.ones(len(heads), dtype=bool)
+            last = len(window) - 1
+            while active.any():
+                for _ in range(16):
+                    codes = window[np.minimum(heads, last)]
+                    steps.append(np.where(active, heads, -1).astype(np.int32))
+                    filled += RLE_RUN_LENGTHS[codes] * active
+                    heads += RLE_ADVANCE[codes] * active
+                    # A zero-length literal is corrupt: its oversized count fails the line
+                    filled[codes == 0] = 4 * width + 1
+                    active &= (filled < 4 * width) & (heads <= last)
+            complete = filled == 4 * width
+            index = {int(c): i for i, c in enumerate(candidates)}
+
+        offsets = self._offsets[:first + 1]
+        pos = base
+        rle, lines = np.zeros(count, dtype=bool), []
+        for row in range(count):
+            if self._is_rle(pos):
+                i = index.get(pos - base)
+                if i is None or not complete[i]:
+                    raise ValueError("Corrupt RLE scanline")
+                rle[row] = True
+                lines.append(i)
+                pos = base + int(heads[i])
+            else:
+                pos += width * 4
+            offsets.append(pos)
+        self._offsets = offsets
+
+        headers = np.empty(0, dtype=np.int64)
+        if lines:
+            headers = np.stack(steps, axis=1)[lines].ravel()
+            headers = headers[headers >= 0].astype(np.int64) + base
+        self._scanned = (first, count, rle, headers)
+
+    def _stored_rows(self, first, count):
+        """Decode scanlines in stored order to (count, width, 4) uint8 RGBE"""
+        scanned_first, scanned_count, rle, headers = self._scanned
+        if first < scanned_first or first + count > scanned_first + scanned_count:
+            # Index a wide band around the request, so each NumPy step serves many lines
+            band = max(count, SCAN_ROWS)
+            start = first if first >= scanned_first else max(0, first + count - band)
+            while len(self._offsets) <= start:
+                known = len(self._offsets) - 1
+                self._scan_rows(known, min(band, start - known))
+            self._scan_rows(start, min(band, self.height - start))
+            scanned_first, scanned_count, rle, headers = self._scanned
+
+        data = np.frombuffer(self._map, dtype=np.uint8)
+        offsets = self._offsets[first:first + count + 1]
+        rle = rle[first - scanned_first:first - scanned_first + count]
+        rle_rows = np.flatnonzero(rle)
+
+        rgbe = np.empty((count, self.width, 4), dtype=np.uint8)
+        for row in np.flatnonzero(~rle):
+            rgbe[row] = data[offsets[row]:offsets[row + 1]].reshape(self.width, 4)
+
+        if len(rle_rows):
+            headers = headers[np.searchsorted(headers, offsets[0]):np.searchsorted(headers, offsets[-1])]
+
+            # Literal run bytes are copied in file order with one mask over the
+            # byte window, repeat runs are expanded with one np.repeat
+            codes = data[headers]
+            literal = codes <= 128
+            lengths = np.where(literal, codes, codes - 128).astype(np.int64)
+
+            base = offsets[0]
+            bounds = np.zeros(offsets[-1] - base + 1, dtype=np.int8)
+            bounds[headers[literal] + 1 - base] = 1
+            bounds[headers[literal] + 1 + lengths[literal] - base] = -1
+            literal_bytes = data[base:offsets[-1]][np.cumsum(bounds[:-1], dtype=np.int8) > 0]
+
+            planes = np.empty(len(rle_rows) * 4 * self.width, dtype=np.uint8)
+            from_literal = np.repeat(literal, lengths)
+            planes[from_literal] = literal_bytes
+            planes[~from_literal] = np.repeat(data[headers[~literal] + 1], lengths[~literal])
+            rgbe[rle_rows] = planes.reshape(len(rle_rows), 4, self.width).transpose(0, 2, 1)
+        return rgbe
+
+    def _read_file_rows(self, first, count):
+        if self.top_down:
+            return rgbe_to_float(self._stored_rows(first, count))
+        # Bottom-up files store the last displayed row first
+        return rgbe_to_float(self._stored_rows(self.height - first - count, count))[::-1]
+
+# EXR pixel types and their NumPy dtypes
+EXR_PIXEL_TYPES = {0: np.dtype("<u4"), 1: np.dtype("<f2"), 2: np.dtype("<f4")}
+
+# Scanlines per chunk for the supported compressions: none, RLE is not supported, ZIPS, ZIP
+EXR_LINES_PER_BLOCK = {0: 1, 2: 1, 3: 16}
+
+class EXRImage(_MappedImage):
+    """Single-part scanline OpenEXR image (uncompressed, ZIPS or ZIP)"""
+
+    def __init__(self, filepath):
+        super().__init__(filepath)
+        try:
+            self._parse_header()
+        except (struct.error, IndexError, KeyError) as e:
+            self.close()
+            raise UnsupportedFormat(f"Unreadable EXR header: {e}")
+        except Exception:
+            self.close()
+            raise
+
+    def _parse_header(self):
+        data = self._map
+        magic, version = struct.unpack_from("<ii", data, 0)
+        if magic != 20000630:
+            raise UnsupportedFormat("Not an OpenEXR file")
+        if version & 0x1200:
+            raise UnsupportedFormat("Tiled and multi-part EXR files are not supported")
+
+        pos = 8
+        attrs = {}
+        while data[pos] != 0:
+            name_end = data.find(b"\x00", pos)
+            type_end = data.find(b"\x00", name_end + 1)
+            name = data[pos:name_end].decode("latin-1")
+            (size,) = struct.unpack_from("<i", data, type_end + 1)
+            attrs[name] = data[type_end + 5:type_end + 5 + size]
+            pos = type_end + 5 + size
+        pos += 1
+
+        self.compression = attrs["compression"][0]
+        if self.compression not in EXR_LINES_PER_BLOCK:
+            raise UnsupportedFormat(f"EXR compression {self.compression} is not supported")
+        xmin, ymin, xmax, ymax = struct.unpack("<iiii", attrs["dataWindow"])
+        self.width, self.height = xmax - xmin + 1, ymax - ymin + 1
+        self._ymin = ymin
+
+        # Channels are stored alphabetically: name, pixel type, pLinear, reserved, x/y sampling
+        self.channels = []
+        chlist = attrs["channels"]
+        cpos = 0
+        while chlist[cpos] != 0:
+            name_end = chlist.find(b"\x00", cpos)
+            name = chlist[cpos:name_end].decode("latin-1")
+            pixel_type, _linear, xs, ys = struct.unpack_from("<iB3xii", chlist, name_end + 1)
+            if xs != 1 or ys != 1:
+                raise UnsupportedFormat("Subsampled EXR channels are not supported")
+            self.channels.append((name, EXR_PIXEL_TYPES[pixel_type]))
+            cpos = name_end + 17
+
+        self.lines_per_block = EXR_LINES_PER_BLOCK[self.compression]
+        num_blocks = -(-self.height // self.lines_per_block)
+        self._block_offsets = np.frombuffer(data, dtype="<u8", count=num_blocks, offset=pos).copy()
+
+    def _read_block(self, index):
+        """Decode one chunk of scanlines to (lines, width, 4) float32 RGBA"""
+        data = self._map
+        offset = int(self._block_offsets[index])
+        y, size = struct.unpack_from("<ii", data, offset)
+        raw = data[offset + 8:offset + 8 + size]
+        lines = min(self.lines_per_block, self._ymin + self.height - y)
+
+        expected = lines * self.width * sum(dtype.itemsize for _name, dtype in self.channels)
+        if self.compression != 0 and size < expected:
+            packed = np.frombuffer(zlib.decompress(raw), dtype=np.uint8)
+            # Undo the byte-delta predictor, then re-interleave the split halves
+            restored = np.cumsum(np.concatenate(([packed[0]], packed[1:].astype(np.int64) - 128))) % 256
+            restored = restored.astype(np.uint8)
+            half = (len(restored) + 1) // 2
+            raw = np.empty(len(restored), dtype=np.uint8)
+            raw[0::2] = restored[:half]
+            raw[1::2] = restored[half:]
+        else:
+            raw = np.frombuffer(raw, dtype=np.uint8)
+
+        rgba = np.zeros((lines, self.width, 4), dtype=np.float32)
+        rgba[..., 3] = 1.0
+        slots = {"R": 0, "G": 1, "B": 2, "A": 3}
+        pos = 0
+        for line in range(lines):
+            for name, dtype in self.channels:
+                nbytes = self.width * dtype.itemsize
+                values = raw[pos:pos + nbytes].view(dtype)
+                pos += nbytes
+                slot = slots.get(name.rsplit(".", 1)[-1])
+                if name == "Y":
+                    rgba[line, :, :3] = values[:, None]
+                elif slot is not None:
+                    rgba[line, :, slot] = values
+        return rgba
+
+    def _read_file_rows(self, first, count):
+        # The offset table is ordered by y (top row first) whatever the line order
+        first_block = first // self.lines_per_block
+        last_block = (first + count - 1) // self.lines_per_block
+        rows = np.concatenate([self._read_block(i) for i in range(first_block, last_block + 1)])
+        skip = first - first_block * self.lines_per_block
+        return rows[skip:skip + count]
+
+def open_image(filepath):
+    """Open an .hdr or .exr file for memory-mapped reading
+
+    Raises UnsupportedFormat for anything else, so callers can fall back to bpy.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext == ".hdr":
+        return RGBEImage(filepath)
+    if ext == ".exr":
+        return EXRImage(filepath)
+    raise UnsupportedFormat(f"No memory-mapped reader for '{ext}' files")
+
+def write_rgbe(filepath, pixels):
+    """Write (height, width, >=3) float rows (bottom-up) as an uncompressed Radiance HDR"""
+    return write_rgbe_chunks(filepath, [(0, pixels, pixels.shape[0])])
+
+def write_rgbe_chunks(filepath, chunks):
+    """Write (first_row, rows, height) chunks (rows bottom-up) as an uncompressed Radiance HDR
+
+    Chunks may arrive in any order; each is encoded and written at its own
+    scanline offset, so only one chunk is held in memory.
+    """
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, "wb") as f:
+        header_size = None
+        for start, rows, height in chunks:
+            width = rows.shape[1]
+            if header_size is None:
+                header = f"#?RADIANCE\nFORMAT=32-bit_rle_rgbe\n\n-Y {height} +X {width}\n".encode("latin-1")
+                f.write(header)
+                header_size = len(header)
+            # File scanlines run top-down
+            f.seek(header_size + (height - start - rows.shape[0]) * width * 4)
+            f.write(np.ascontiguousarray(float_to_rgbe(rows[::-1, :, :3])).tobytes())
+    os.replace(tmp_path, filepath)
+    return filepath
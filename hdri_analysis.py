@@ -0,0 +1,255 @@
+import bpy
+import os
+import math
+import numpy as np
+
+from . import cache
+from . import exposure
+from . import hdr_reader
+from . import world_setup
+
+# Pixels brighter than this multiple of the map's average radiance count as hot spots
+HOT_SPOT_RATIO = 20.0
+
+# Most lights extracted from one HDRI, and the smallest share of the map's energy worth a light
+MAX_LIGHTS = 2
+MIN_ENERGY_FRACTION = 0.05
+
+# Hot pixels within this angle of a peak belong to the same light
+REGION_RADIUS = math.radians(20.0)
+
+# Narrowest sun disc created (the real sun is about 0.53 degrees)
+MIN_LIGHT_ANGLE = math.radians(0.5)
+
+HDRI_LIGHTS_COLLECTION = "HDRI Lights"
+
+LUMINANCE = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+def get_analysis_dir():
+    """Get the clamped-HDRI cache directory"""
+    return cache.get_cache_dir("hdri_lights")
+
+def _index_path():
+    return os.path.join(get_analysis_dir(), "index.json")
+
+def pixel_directions(rows, cols, width, height):
+    """Unit world directions and equirect (azimuth, elevation) of pixel indices
+
+    Matches Cycles' equirectangular mapping with bottom-up rows:
+    u = 0.5 - azimuth / 2pi, v = 0.5 + elevation / pi.
+    """
+    azimuth = (0.5 - (cols + 0.5) / width) * 2.0 * np.pi
+    elevation = ((rows + 0.5) / height - 0.5) * np.pi
+    cos_el = np.cos(elevation)
+    dirs = np.stack([cos_el * np.cos(azimuth), cos_el * np.sin(azimuth), np.sin(elevation)], axis=-1)
+    return dirs, azimuth, elevation
+
+def pixel_solid_angles(height, width):
+    """(height, 1) solid angle of each pixel row of an equirect map"""
+    elevation = ((np.arange(height, dtype=np.float32) + 0.5) / height - 0.5) * np.pi
+    return (np.cos(elevation) * (2.0 * np.pi / width) * (np.pi / height))[:, None]
+
+def _chunk_source(filepath):
+    """Callable returning a fresh (first_row, rows, height) chunk iterator per pass
+
+    .hdr/.exr maps are re-streamed from their memory map on every pass; other
+    formats are decoded once by bpy and sliced.
+    """
+    try:
+        hdr_reader.open_image(filepath).close()
+    except hdr_reader.UnsupportedFormat:
+        pixels, _is_float = cache.read_image(filepath)
+        height = pixels.shape[0]
+        return lambda: ((start, pixels[start:start + hdr_reader.CHUNK_ROWS], height)
+                        for start in range(0, height, hdr_reader.CHUNK_ROWS))
+    return lambda: exposure.iter_row_chunks(filepath)
+
+def find_light_regions(read_chunks, hot_spot_ratio=HOT_SPOT_RATIO, max_lights=MAX_LIGHTS,
+                       min_fraction=MIN_ENERGY_FRACTION):
+    """Find the dominant light sources of an equirect map
+
+    read_chunks returns a fresh row chunk iterator (see _chunk_source); one pass
+    sums the map's radiance and a second keeps only the hot pixels, so memory
+    does not grow with the map size.
+
+    Returns (lights, regions, threshold): per light a dict with the map-space
+    direction, color, strength (irradiance, i.e. Sun strength) and angular size,
+    and per light the flat pixel indices whose excess over the threshold it
+    replaces.
+    """
+    total = 0.0
+    for start, rows, height in read_chunks():
+        solid_angles = pixel_solid_angles(height, rows.shape[1])[start:start + rows.shape[0]]
+        total += float(((rows[..., :3] @ LUMINANCE) * solid_angles).sum())
+    if total <= 0.0:
+        return [], [], 0.0
+    threshold = hot_spot_ratio * total / (4.0 * np.pi)
+
+    # Only the (few) hot pixels are kept from here on
+    hot, rgb = [], []
+    for start, rows, height in read_chunks():
+        width = rows.shape[1]
+        chunk_hot = np.flatnonzero(rows[..., :3] @ LUMINANCE > threshold)
+        hot.append(chunk_hot + start * width)
+        rgb.append(rows.reshape(-1, 4)[chunk_hot, :3])
+    hot, rgb = np.concatenate(hot), np.concatenate(rgb)
+    if not len(hot):
+        return [], [], threshold
+
+    rows, cols = np.divmod(hot, width)
+    hot_lum = rgb @ LUMINANCE
+    omega = pixel_solid_angles(height, width)[rows, 0]
+    dirs, azimuth, elevation = pixel_directions(rows, cols, width, height)
+
+    # Radiance above the threshold, removed hue-preserving from the map
+    excess = rgb * (1.0 - threshold / hot_lum)[:, None]
+    weight = (hot_lum - threshold) * omega
+
+    lights, regions = [], []
+    remaining = np.ones(len(hot), dtype=bool)
+    while len(lights) < max_lights and remaining.any():
+        peak = np.argmax(np.where(remaining, hot_lum, -1.0))
+        member = remaining & (dirs @ dirs[peak] > math.cos(REGION_RADIUS))
+        remaining &= ~member
+
+        if weight[member].sum() < min_fraction * total:
+            break
+
+        irradiance = (excess[member] * omega[member, None]).sum(axis=0)
+        strength = float(irradiance.max())
+        direction = (dirs[member] * weight[member, None]).sum(axis=0)
+        direction /= np.linalg.norm(direction)
+
+        # Cone angle with the same solid angle as the region
+        region_omega = float(omega[member].sum())
+        angle = 2.0 * math.acos(max(-1.0, 1.0 - region_omega / (2.0 * np.pi)))
+
+        lights.append({
+            "azimuth": math.atan2(direction[1], direction[0]),
+            "elevation": math.asin(max(-1.0, min(1.0, direction[2]))),
+            "color": [float(c) for c in irradiance / strength],
+            "strength": strength,
+            "angle": max(angle, MIN_LIGHT_ANGLE),
+        })
+        regions.append(hot[member])
+
+    return lights, regions, threshold
+
+def iter_clamped_chunks(chunks, regions, threshold):
+    """Yield row chunks with the extracted regions scaled down to the threshold"""
+    extracted = np.sort(np.concatenate(regions)) if regions else np.empty(0, dtype=np.int64)
+    for start, rows, height in chunks:
+        width = rows.shape[1]
+        first, last = np.searchsorted(extracted, [start * width, (start + rows.shape[0]) * width])
+        if last > first:
+            rows = np.ascontiguousarray(rows)
+            flat = rows.reshape(-1, 4)
+            local = extracted[first:last] - start * width
+            lum = flat[local, :3] @ LUMINANCE
+            flat[local, :3] *= (threshold / lum)[:, None]
+        yield start, rows, height
+
+def prepare_hdri(filepath):
+    """Analyse an HDRI once and cache its clamped copy and extracted lights
+
+    Returns (world_image_path, lights); the original path is returned when the
+    map has no dominant light worth extracting. The map is streamed in row
+    chunks, so a 16K HDRI is never decoded whole.
+    """
+    abspath, file_size, mtime = cache.file_signature(filepath)
+    key = cache.cache_key(abspath, file_size, mtime, HOT_SPOT_RATIO, MAX_LIGHTS, MIN_ENERGY_FRACTION)
+
+    index_path = _index_path()
+    index = cache.load_index(index_path)
+    entry = index.get(abspath)
+    if entry and entry.get("key") == key:
+        clamped = entry.get("clamped")
+        if not clamped or os.path.exists(clamped):
+            return clamped or abspath, entry["lights"]
+
+    if entry and entry.get("clamped") and os.path.exists(entry["clamped"]):
+        try:
+            os.remove(entry["clamped"])
+        except OSError:
+            pass
+
+    read_chunks = _chunk_source(abspath)
+    lights, regions, threshold = find_light_regions(read_chunks)
+
+    clamped = None
+    if lights:
+        stem = os.path.splitext(os.path.basename(abspath))[0]
+        clamped = hdr_reader.write_rgbe_chunks(os.path.join(get_analysis_dir(), f"{stem}_{key}.hdr"),
+                                               iter_clamped_chunks(read_chunks(), regions, threshold))
+        print(f"BLS: Extracted {len(lights)} light(s) from '{os.path.basename(abspath)}'")
+
+    index[abspath] = {"key": key, "clamped": clamped, "lights": lights}
+    cache.save_index(index_path, index)
+    return clamped or abspath, lights
+
+def clear_hdri_lights(scene):
+    """Remove lights previously extracted from an HDRI in the scene"""
+    for obj in [obj for obj in scene.objects if "bls_hdri_strength" in obj]:
+        light = obj.data
+        bpy.data.objects.remove(obj, do_unlink=True)
+        if light and light.users == 0:
+            bpy.data.lights.remove(light)
+
+def _get_lights_collection(context):
+    col = bpy.data.collections.get(HDRI_LIGHTS_COLLECTION)
+    if col is None:
+        col = bpy.data.collections.new(HDRI_LIGHTS_COLLECTION)
+    if col.name not in context.scene.collection.children:
+        context.scene.collection.children.link(col)
+    return col
+
+def create_hdri_lights(context, lights):
+    """Create Sun lights for extracted HDRI hot spots
+
+    An HDRI is infinitely far away, so a Sun with a matching disc angle stands
+    in for both a real sun and a large softbox.
+    """
+    clear_hdri_lights(context.scene)
+    col = _get_lights_collection(context)
+
+    objects = []
+    for i, light in enumerate(lights):
+        data = bpy.data.lights.new(f"BLS_HDRI_Sun_{i + 1}", 'SUN')
+        data.color = light["color"]
+        data.angle = light["angle"]
+
+        obj = bpy.data.objects.new(data.name, data)
+        obj["bls_hdri_azimuth"] = light["azimuth"]
+        obj["bls_hdri_strength"] = light["strength"]
+        # Point the light's -Z from the hot spot towards the origin
+        obj.rotation_euler = (0.0, math.pi / 2.0 - light["elevation"], 0.0)
+        col.objects.link(obj)
+        objects.append(obj)
+
+    update_hdri_lights(context.scene)
+    return objects
+
+def update_hdri_lights(scene):
+    """Follow the world's rotation and intensity with the extracted lights"""
+    rotation = math.radians(scene.bls_props.hdri_rotation)
+    strength = world_setup.get_hdri_strength(scene)
+    for obj in scene.objects:
+        if "bls_hdri_strength" in obj:
+            # The mapping node rotates lookups by +rotation, so the map appears rotated by -rotation
+            obj.rotation_euler[2] = obj["bls_hdri_azimuth"] - rotation
+            obj.data.energy = obj["bls_hdri_strength"] * strength
+
+def configure_world_sampling(world, width, extracted):
+    """Set up world importance sampling (MIS) for the applied map"""
+    cycles = getattr(world, "cycles", None)
+    if cycles is None or not hasattr(cycles, "sampling_method"):
+        return
+
+    if extracted:
+        # With the hot spots moved into lights the map is smooth, so a modest
+        # importance map resolves it without the memory of a full-size one
+        resolution = 1 << max(8, min(11, int(width // 4).bit_length() - 1))
+        cycles.sampling_method = 'MANUAL'
+        cycles.sample_map_resolution = resolution
+    else:
+        cycles.sampling_method = 'AUTOMATIC'
@@ -0,0 +1,308 @@
+import bpy
+import os
+import numpy as np
+from bpy.app.handlers import persistent
+
+from . import cache
+from . import catalog
+from . import hdr_reader
+from . import image_manager
+
+# Widths of the cached viewport proxies; 'FULL' always uses the source file
+PROXY_SIZES = (512, 1024, 2048)
+
+VIEWPORT_RESOLUTIONS = [
+    ('512', "512", "512 pixel wide proxy in the viewport"),
+    ('1024', "1K", "1K proxy in the viewport"),
+    ('2048', "2K", "2K proxy in the viewport"),
+    ('FULL', "Full", "Always use the full-resolution HDRI"),
+]
+
+# Pre-blurred lighting map: width, blur radius in pixels at the horizon and box passes
+LIGHTING_WIDTH = 256
+LIGHTING_BLUR_RADIUS = 2
+LIGHTING_BLUR_PASSES = 3
+
+# World environment node and the node property holding its full-resolution path
+ENV_NODE_NAME = "BLS_Environment"
+FULL_PATH_PROP = "bls_hdri_full"
+
+def get_proxy_dir():
+    """Get the HDRI proxy cache directory"""
+    return cache.get_cache_dir("hdri_proxies")
+
+def _index_path():
+    return os.path.join(get_proxy_dir(), "index.json")
+
+def _lighting_index_path():
+    return os.path.join(get_proxy_dir(), "lighting.json")
+
+def downsample(pixels):
+    """Halve an image with a 2x2 box filter (odd trailing rows/columns are dropped)"""
+    height, width = pixels.shape[0] // 2, pixels.shape[1] // 2
+    blocks = pixels[:height * 2, :width * 2].reshape(height, 2, width, 2, -1)
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+def _blur_rows(pixels, radius):
+    """Horizontal box blur, wrapping around and widened towards the poles
+
+    Rows near the poles cover less angle per pixel, so the radius grows with
+    1/cos(elevation) to keep the blur roughly constant in angle.
+    """
+    height, width = pixels.shape[:2]
+    elevation = ((np.arange(height) + 0.5) / height - 0.5) * np.pi
+    radii = np.minimum(np.round(radius / np.cos(elevation)), width // 2 - 1).astype(np.int64)
+    pad = int(radii.max())
+
+    summed = np.cumsum(np.pad(pixels, ((0, 0), (pad + 1, pad), (0, 0)), mode='wrap'), axis=1, dtype=np.float64)
+    cols = np.arange(width)[None, :]
+    rows = np.arange(height)[:, None]
+    window = summed[rows, cols + pad + 1 + radii[:, None]] - summed[rows, cols + pad - radii[:, None]]
+    return (window / (2 * radii + 1)[:, None, None]).astype(np.float32)
+
+def _blur_columns(pixels, radius):
+    """Vertical box blur, clamping at the poles"""
+    height = pixels.shape[0]
+    summed = np.cumsum(np.pad(pixels, ((radius + 1, radius), (0, 0), (0, 0)), mode='edge'), axis=0, dtype=np.float64)
+    size = 2 * radius + 1
+    return ((summed[size:size + height] - summed[:height]) / size).astype(np.float32)
+
+def blur(pixels, radius=LIGHTING_BLUR_RADIUS, passes=LIGHTING_BLUR_PASSES):
+    """Approximate Gaussian blur of an equirect map from repeated box blurs"""
+    for _ in range(passes):
+        pixels = _blur_columns(_blur_rows(pixels, radius), radius)
+    return pixels
+
+def build_proxies(filepath, key):
+    """Decode an HDRI once and write its resolution pyramid, returning {size: path}"""
+    # The largest proxy never needs more than twice its width of source detail
+    pixels, _is_float = cache.read_image(filepath, max_size=2 * max(PROXY_SIZES))
+    source_size = catalog.read_image_size(filepath)
+    source_width = source_size[0] if source_size else pixels.shape[1]
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+
+    proxies = {}
+    for size in sorted(PROXY_SIZES, reverse=True):
+        while pixels.shape[1] > size and pixels.shape[1] >= 2:
+            pixels = downsample(pixels)
+        # Sources already this small are used as they are
+        if pixels.shape[1] <= size and pixels.shape[1] < source_width:
+            path = hdr_reader.write_rgbe(os.path.join(get_proxy_dir(), f"{stem}_{key}_{size}.hdr"), pixels)
+            proxies[str(size)] = path
+    return proxies
+
+def get_proxy_path(filepath, resolution):
+    """Path of the cached proxy for a viewport resolution, building the pyramid if needed"""
+    if resolution == 'FULL':
+        return filepath
+
+    abspath, file_size, mtime = cache.file_signature(filepath)
+    key = cache.cache_key(abspath, file_size, mtime, *PROXY_SIZES)
+
+    index_path = _index_path()
+    index = cache.load_index(index_path)
+    entry = index.get(abspath)
+    proxies = entry.get("proxies", {}) if entry and entry.get("key") == key else None
+
+    if proxies is None or not all(os.path.exists(p) for p in proxies.values()):
+        # Stale or missing: drop the old pyramid and rebuild
+        for path in (entry or {}).get("proxies", {}).values():
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        proxies = build_proxies(abspath, key)
+        index[abspath] = {"key": key, "proxies": proxies}
+        cache.save_index(index_path, index)
+        print(f"BLS: Built {len(proxies)} HDRI proxies for '{os.path.basename(abspath)}'")
+
+    return proxies.get(resolution, abspath)
+
+def get_lighting_path(filepath):
+    """Path of the small pre-blurred lighting map of an HDRI, building it if needed"""
+    abspath, file_size, mtime = cache.file_signature(filepath)
+    key = cache.cache_key(abspath, file_size, mtime, LIGHTING_WIDTH, LIGHTING_BLUR_RADIUS, LIGHTING_BLUR_PASSES)
+
+    index_path = _lighting_index_path()
+    index = cache.load_index(index_path)
+    entry = index.get(abspath)
+    if entry and entry.get("key") == key and os.path.exists(entry["path"]):
+        return entry["path"]
+
+    if entry and os.path.exists(entry["path"]):
+        try:
+            os.remove(entry["path"])
+        except OSError:
+            pass
+
+    pixels, _is_float = cache.read_image(abspath, max_size=2 * LIGHTING_WIDTH)
+    while pixels.shape[1] > LIGHTING_WIDTH:
+        pixels = downsample(pixels)
+    stem = os.path.splitext(os.path.basename(abspath))[0]
+    path = hdr_reader.write_rgbe(os.path.join(get_proxy_dir(), f"{stem}_{key}_lighting.hdr"), blur(pixels))
+
+    index = cache.load_index(index_path)
+    index[abspath] = {"key": key, "path": path}
+    cache.save_index(index_path, index)
+    print(f"BLS: Built blurred lighting map for '{os.path.basename(abspath)}'")
+    return path
+
+def _set_env_image(node_env, path):
+    """Point the environment node at a file, freeing the image it replaces if unused"""
+    old = node_env.image
+    if old and os.path.normpath(bpy.path.abspath(old.filepath)) == os.path.normpath(path):
+        return old
+
+    node_env.image = image_manager.load_image(path)
+    image_manager.release(old)
+    return node_env.image
+
+def set_world_hdri(scene, node_env, filepath):
+    """Load an HDRI into a world environment node at the scene's viewport resolution
+
+    The full-resolution path is remembered on the node so renders can switch
+    to it.
+    """
+    filepath = os.path.abspath(filepath)
+    node_env[FULL_PATH_PROP] = filepath
+
+    try:
+        path = get_proxy_path(filepath, scene.bls_props.hdri_viewport_resolution)
+    except Exception as e:
+        print(f"BLS: HDRI proxy failed for '{os.path.basename(filepath)}': {e}")
+        path = filepath
+    return _set_env_image(node_env, path)
+
+def set_lighting_hdri(node_lighting, filepath):
+    """Load an HDRI's pre-blurred lighting map into a world environment node"""
+    return _set_env_image(node_lighting, get_lighting_path(filepath))
+
+def iter_env_nodes(world):
+    """Environment nodes of a world (one per HDRI slot) that show a library HDRI"""
+    if world and world.use_nodes and world.node_tree:
+        for node in world.node_tree.nodes:
+            if node.type == 'TEX_ENVIRONMENT' and FULL_PATH_PROP in node:
+                yield node
+
+def can_swap_for_render(scene):
+    """Whether render handlers may replace images: only while the UI cannot touch them"""
+    return bpy.app.background or scene.render.use_lock_interface
+
+def uses_proxy(world):
+    """Whether any environment node of a world shows a reduced copy of its HDRI"""
+    return any(os.path.normpath(bpy.path.abspath(node.image.filepath)) != os.path.normpath(node[FULL_PATH_PROP])
+               for node in iter_env_nodes(world) if node.image)
+
+def use_full_resolution(world):
+    for node_env in iter_env_nodes(world):
+        _set_env_image(node_env, node_env[FULL_PATH_PROP])
+
+def use_viewport_resolution(scene):
+    for node_env in iter_env_nodes(scene.world):
+        try:
+            path = get_proxy_path(node_env[FULL_PATH_PROP], scene.bls_props.hdri_viewport_resolution)
+        except Exception as e:
+            print(f"BLS: HDRI proxy failed: {e}")
+            continue
+        _set_env_image(node_env, path)
+
+def update_viewport_resolution(self, context):
+    use_viewport_resolution(context.scene)
+
+# Whether the current render job was already warned about rendering the proxy
+_proxy_warning = {"shown": False}
+
+def _show_proxy_warning():
+    """Timer callback: tell the user a render started on the viewport proxy"""
+    wm = bpy.context.window_manager
+    message = "Render uses the viewport HDRI proxy: render with F12 or enable Lock Interface"
+    print(f"BLS: {message}")
+    if wm and wm.windows:
+        def draw(self, context):
+            self.layout.label(text=message)
+        try:
+            if hasattr(bpy.context, "temp_override"):
+                with bpy.context.temp_override(window=wm.windows[0]):
+                    wm.popup_menu(draw, title="LightForge", icon='ERROR')
+            else:
+                wm.popup_menu(draw, title="LightForge", icon='ERROR')
+        except Exception as e:
+            print(f"BLS: Could not show the proxy warning: {e}")
+    return None
+
+class BLS_OT_render_full_hdri(bpy.types.Operator):
+    bl_idname = "bls.render_full_hdri"
+    bl_label = "Render"
+    bl_description = ("Render with the full-resolution world HDRI: the viewport proxy is swapped "
+                      "out before the render job starts and restored when it ends")
+    
+    animation: bpy.props.BoolProperty(name="Animation", default=False)
+    
+    def invoke(self, context, event):
+        # Swapped here, on the main thread, so no Lock Interface is needed
+        swapped = uses_proxy(context.scene.world)
+        if swapped:
+            use_full_resolution(context.scene.world)
+        result = bpy.ops.render.render('INVOKE_DEFAULT', animation=self.animation, use_viewport=True)
+        if swapped and 'CANCELLED' in result:
+            use_viewport_resolution(context.scene)
+        return result
+
+    def execute(self, context):
+        return self.invoke(context, None)
+
+@persistent
+def _render_pre(scene, *args):
+    # Also fires for command-line and scripted batch renders. With an unlocked
+    # interface the UI may draw the images being replaced, so the proxy is kept
+    # and the user is warned; F12 goes through BLS_OT_render_full_hdri instead
+    if can_swap_for_render(scene):
+        use_full_resolution(scene.world)
+    elif uses_proxy(scene.world) and not _proxy_warning["shown"]:
+        # Once per job (render_pre fires for every frame), shown from the main thread
+        _proxy_warning["shown"] = True
+        bpy.app.timers.register(_show_proxy_warning, first_interval=0.0)
+
+@persistent
+def _render_done(scene, *args):
+    _proxy_warning["shown"] = False
+    for render_scene in bpy.data.scenes:
+        use_viewport_resolution(render_scene)
+
+# render_post fires after every frame of an animation, so the proxy is restored
+# once the whole job completes (or is cancelled) instead
+HANDLERS = (
+    (bpy.app.handlers.render_pre, _render_pre),
+    (bpy.app.handlers.render_complete, _render_done),
+    (bpy.app.handlers.render_cancel, _render_done),
+)
+
+# F12 / Ctrl+F12 bindings of the full-resolution render operator
+_keymap_items = []
+
+def register():
+    bpy.utils.register_class(BLS_OT_render_full_hdri)
+    for handlers, func in HANDLERS:
+        if func not in handlers:
+            handlers.append(func)
+    
+    keyconfig = bpy.context.window_manager.keyconfigs.addon
+    if keyconfig:
+        keymap = keyconfig.keymaps.new(name="Screen", space_type='EMPTY')
+        for ctrl in (False, True):
+            item = keymap.keymap_items.new(BLS_OT_render_full_hdri.bl_idname, 'F12', 'PRESS', ctrl=ctrl)
+            item.properties.animation = ctrl
+            _keymap_items.append((keymap, item))
+
+def unregister():
+    for keymap, item in _keymap_items:
+        keymap.keymap_items.remove(item)
+    _keymap_items.clear()
+    
+    for handlers, func in HANDLERS:
+        if func in handlers:
+            handlers.remove(func)
+    if bpy.app.timers.is_registered(_show_proxy_warning):
+        bpy.app.timers.unregister(_show_proxy_warning)
+    bpy.utils.unregister_class(BLS_OT_render_full_hdri)
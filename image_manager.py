@@ -0,0 +1,116 @@
+import bpy
+import os
+
+from . import catalog
+
+# Custom properties marking images LightForge loaded (and may free) and their content hash
+MANAGED_PROP = "bls_managed"
+HASH_PROP = "bls_content_hash"
+
+def _normpath(path):
+    return os.path.normcase(os.path.normpath(bpy.path.abspath(path)))
+
+def _content_hash(filepath):
+    try:
+        return catalog.file_hash(filepath, os.path.getsize(filepath))
+    except OSError:
+        return None
+
+def find_image(filepath, content_hash=None):
+    """Existing image datablock for a file: same path first, then same content"""
+    target = _normpath(filepath)
+    for img in bpy.data.images:
+        if img.source == 'FILE' and img.filepath and _normpath(img.filepath) == target:
+            return img
+
+    if content_hash:
+        for img in bpy.data.images:
+            if img.get(HASH_PROP) == content_hash:
+                return img
+    return None
+
+def load_image(filepath):
+    """Load an image once per file, reusing any datablock with the same path or content"""
+    img = find_image(filepath)
+    if img is not None:
+        return img
+
+    # Copies of the same file under another name share one datablock
+    content_hash = _content_hash(filepath)
+    img = find_image(filepath, content_hash)
+    if img is not None:
+        return img
+
+    img = bpy.data.images.load(filepath, check_existing=True)
+    img[MANAGED_PROP] = True
+    if content_hash:
+        img[HASH_PROP] = content_hash
+    return img
+
+def _iter_node_trees():
+    """(owner label, node tree) for every world, light, material and node group"""
+    for collection, label in ((bpy.data.worlds, "World"), (bpy.data.lights, "Light"),
+                              (bpy.data.materials, "Material")):
+        for owner in collection:
+            if owner.node_tree:
+                yield f"{label} '{owner.name}'", owner.node_tree
+    for group in bpy.data.node_groups:
+        yield f"Node Group '{group.name}'", group
+
+def get_image_users():
+    """Map image name -> sorted owners (worlds, lights, ...) whose nodes use it"""
+    users = {}
+    for label, tree in _iter_node_trees():
+        for node in tree.nodes:
+            img = getattr(node, "image", None)
+            if img is not None:
+                users.setdefault(img.name, set()).add(label)
+    return {name: sorted(owners) for name, owners in users.items()}
+
+def image_memory(img):
+    """Approximate bytes an image's pixel buffer occupies (0 if not loaded)"""
+    if not img.has_data:
+        return 0
+    width, height = img.size
+    return width * height * img.channels * (4 if img.is_float else 1)
+
+def format_size(num_bytes):
+    return f"{num_bytes / (1024 * 1024):.1f} MB"
+
+def release(img):
+    """Free one LightForge image if nothing uses it any more, returning the bytes freed"""
+    if img is None or not img.get(MANAGED_PROP) or img.use_fake_user or img.users > 0:
+        return 0
+    freed = image_memory(img)
+    bpy.data.images.remove(img)
+    return freed
+
+def release_unused():
+    """Free every LightForge image no longer used, returning (count, bytes freed)
+
+    Images the user loaded themselves are never touched.
+    """
+    users = get_image_users()
+    count, freed = 0, 0
+    for img in list(bpy.data.images):
+        if img.get(MANAGED_PROP) and img.name not in users and img.users == 0 and not img.use_fake_user:
+            freed += release(img)
+            count += 1
+
+    if count:
+        print(f"BLS: Freed {count} unused images ({format_size(freed)})")
+    return count, freed
+
+def memory_report():
+    """Lines describing every LightForge image, its size and users"""
+    users = get_image_users()
+    lines, total = [], 0
+    for img in bpy.data.images:
+        if not img.get(MANAGED_PROP):
+            continue
+        size = image_memory(img)
+        total += size
+        owners = ", ".join(users.get(img.name, [])) or "unused"
+        lines.append(f"  {img.name}: {img.size[0]}x{img.size[1]}, {format_size(size)} ({owners})")
+    lines.insert(0, f"LightForge images: {len(lines)}, {format_size(total)} in memory")
+    return lines
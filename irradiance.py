@@ -0,0 +1,143 @@
+import os
+import math
+import numpy as np
+
+from . import cache
+from . import hdr_reader
+from . import thumbnails
+
+# Width the HDRI is reduced to before projection; nine coefficients need very little detail
+SH_SAMPLE_WIDTH = 512
+
+# Lighting ball preview and low-frequency environment sizes
+BALL_SIZE = 128
+ENVIRONMENT_WIDTH = 64
+
+# Convolution of each SH band with the clamped cosine lobe (Ramamoorthi & Hanrahan)
+BAND_FACTORS = np.array([np.pi] + [2.0 * np.pi / 3.0] * 3 + [np.pi / 4.0] * 5, dtype=np.float32)
+
+LUMINANCE = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+# Parsed sidecars by path, so panels can redraw without touching the disk
+_sidecars = {}
+
+def sh_basis(dirs):
+    """Real SH basis up to band 2 for unit directions (..., 3), returning (..., 9)"""
+    x, y, z = dirs[..., 0], dirs[..., 1], dirs[..., 2]
+    return np.stack([
+        np.full_like(x, 0.282095),
+        0.488603 * y,
+        0.488603 * z,
+        0.488603 * x,
+        1.092548 * x * y,
+        1.092548 * y * z,
+        0.315392 * (3.0 * z * z - 1.0),
+        1.092548 * x * z,
+        0.546274 * (x * x - y * y),
+    ], axis=-1)
+
+def equirect_directions(width, height):
+    """(height, width, 3) directions of equirect pixel centres (rows bottom-up)"""
+    azimuth = (0.5 - (np.arange(width, dtype=np.float32) + 0.5) / width) * 2.0 * np.pi
+    elevation = ((np.arange(height, dtype=np.float32) + 0.5) / height - 0.5) * np.pi
+    cos_el = np.cos(elevation)[:, None]
+    return np.stack([cos_el * np.cos(azimuth)[None, :],
+                     cos_el * np.sin(azimuth)[None, :],
+                     np.broadcast_to(np.sin(elevation)[:, None], (height, width))], axis=-1)
+
+def project_radiance(pixels):
+    """Project an equirect map onto 9 RGB SH radiance coefficients, shape (9, 3)"""
+    height, width = pixels.shape[:2]
+    dirs = equirect_directions(width, height)
+    elevation = ((np.arange(height, dtype=np.float32) + 0.5) / height - 0.5) * np.pi
+    solid_angles = np.cos(elevation) * (2.0 * np.pi / width) * (np.pi / height)
+    return np.einsum("hwc,hwk,h->kc", pixels[..., :3], sh_basis(dirs), solid_angles, optimize=True)
+
+def evaluate(coeffs, dirs):
+    """Evaluate SH coefficients (9, 3) in directions (..., 3), returning (..., 3)"""
+    return sh_basis(dirs) @ coeffs
+
+def irradiance_coefficients(radiance):
+    """Turn radiance coefficients into irradiance coefficients"""
+    return radiance * BAND_FACTORS[:, None]
+
+def dominant_direction(radiance):
+    """(azimuth, elevation) in map space of the luminance-weighted band-1 vector"""
+    lum = radiance @ LUMINANCE
+    direction = np.array([lum[3], lum[1], lum[2]])
+    length = np.linalg.norm(direction)
+    if length == 0.0:
+        return 0.0, math.pi / 2.0
+    direction /= length
+    return math.atan2(direction[1], direction[0]), math.asin(max(-1.0, min(1.0, direction[2])))
+
+def render_lighting_ball(radiance, size=BALL_SIZE):
+    """RGBA preview of a white diffuse ball lit by the SH irradiance, seen from the front"""
+    coords = (np.arange(size, dtype=np.float32) + 0.5) / size * 2.0 - 1.0
+    sx, sy = coords[None, :], coords[:, None]
+    r2 = sx * sx + sy * sy
+    inside = r2 < 1.0
+
+    # Front view: screen x is +X, screen up is +Z, the viewer is towards -Y
+    normals = np.stack(np.broadcast_arrays(sx, -np.sqrt(np.maximum(0.0, 1.0 - r2)), sy), axis=-1)
+    color = np.maximum(evaluate(irradiance_coefficients(radiance), normals) / np.pi, 0.0)
+
+    pixels = np.zeros((size, size, 4), dtype=np.float32)
+    pixels[inside, :3] = thumbnails.tonemap(color[inside])
+    pixels[inside, 3] = 1.0
+    return np.clip(pixels, 0.0, 1.0)
+
+def render_environment(radiance, width=ENVIRONMENT_WIDTH):
+    """Small equirect map of the SH radiance, for an instantly updated world"""
+    height = width // 2
+    pixels = np.ones((height, width, 4), dtype=np.float32)
+    pixels[..., :3] = np.maximum(evaluate(radiance, equirect_directions(width, height)), 0.0)
+    return pixels
+
+def _sidecar_base(filepath):
+    """Sidecar path stem in the thumbnail folder, tied to the file's current state"""
+    abspath, file_size, mtime = cache.file_signature(filepath)
+    key = cache.cache_key(abspath, file_size, mtime, "sh9")
+    stem = os.path.splitext(os.path.basename(abspath))[0]
+    return os.path.join(thumbnails.get_thumbnail_dir(), f"{stem}_{key}")
+
+def iter_compute_sidecar(filepath, base):
+    """Project an HDRI and write its coefficients, lighting ball and SH environment
+
+    Yields while the map is decoded and returns the sidecar data (use with 'yield from').
+    """
+    pixels, _is_float = yield from cache.iter_read_image(filepath, max_size=SH_SAMPLE_WIDTH)
+    radiance = project_radiance(pixels)
+    azimuth, elevation = dominant_direction(radiance)
+
+    data = {
+        "radiance": radiance.tolist(),
+        "direction": [azimuth, elevation],
+        "ball": cache.write_image(base + "_ball.png", render_lighting_ball(radiance), 'PNG'),
+        "environment": hdr_reader.write_rgbe(base + "_sh.hdr", render_environment(radiance)),
+    }
+    cache.save_index(base + ".sh.json", data)
+    return data
+
+def get_sidecar(filepath, compute=True):
+    """SH data for an HDRI ({radiance, direction, ball, environment}), or None if not computed"""
+    return cache.run_steps(iter_get_sidecar(filepath, compute))
+
+def iter_get_sidecar(filepath, compute=True):
+    """get_sidecar as a generator that yields while the HDRI is decoded"""
+    try:
+        base = _sidecar_base(filepath)
+    except OSError:
+        return None
+
+    path = base + ".sh.json"
+    if path in _sidecars:
+        return _sidecars[path]
+
+    data = cache.load_index(path) if os.path.exists(path) else None
+    if not data and compute:
+        data = yield from iter_compute_sidecar(filepath, base)
+        print(f"BLS: Computed SH irradiance for '{os.path.basename(filepath)}'")
+    if data:
+        _sidecars[path] = data
+    return data
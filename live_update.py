@@ -0,0 +1,93 @@
+import bpy
+import time
+from bpy.app.handlers import persistent
+
+# Pending property changes are applied at most this often (about 30 per second)
+UPDATE_INTERVAL = 1.0 / 30.0
+
+# Settling changes wait until the property has been still this long, i.e. the drag was released
+SETTLE_DELAY = 0.4
+
+# (scene name, view layer name) -> {apply function: due time}, in the order first marked
+_pending = {}
+
+# (scene name, view layer name) -> {apply function: None} that have run, re-run after undo/redo
+_applied = {}
+
+def schedule(context, apply, settle=False):
+    """Mark state dirty; apply(scene, view_layer) runs once on the next timer tick
+
+    Property callbacks fire for every step of a slider drag. Marking the same
+    function again before the tick is free, and the tick reads the latest
+    property values, so a drag costs one update per interval instead of one
+    per step. With settle, each change pushes the update back by SETTLE_DELAY,
+    so expensive work (re-baking) runs once when the drag ends.
+    """
+    key = (context.scene.name, context.view_layer.name)
+    _pending.setdefault(key, {})[apply] = time.perf_counter() + SETTLE_DELAY if settle else 0.0
+
+    if not bpy.app.timers.is_registered(_apply_pending):
+        bpy.app.timers.register(_apply_pending, first_interval=UPDATE_INTERVAL)
+
+def flush(now=None):
+    """Apply pending changes due by now (every pending change if now is None)"""
+    due = []
+    for key, applies in list(_pending.items()):
+        ready = [apply for apply, when in applies.items() if now is None or when <= now]
+        for apply in ready:
+            del applies[apply]
+        if not applies:
+            del _pending[key]
+        if ready:
+            due.append((key, ready))
+
+    for (scene_name, view_layer_name), applies in due:
+        scene = bpy.data.scenes.get(scene_name)
+        if scene is None:
+            continue
+        view_layer = scene.view_layers.get(view_layer_name)
+        for apply in applies:
+            _applied.setdefault((scene_name, view_layer_name), {})[apply] = None
+            try:
+                apply(scene, view_layer)
+            except Exception as e:
+                print(f"BLS: Live update '{apply.__name__}' failed: {e}")
+
+def _apply_pending():
+    """Timer callback: apply the latest values, then wait for settling or new changes"""
+    flush(time.perf_counter())
+    return UPDATE_INTERVAL if _pending else None
+
+@persistent
+def _render_pre(scene, *args):
+    # Scripts may change a property and render straight away
+    flush()
+
+@persistent
+def _undo_redo_post(scene, *args):
+    # The timer applies after the UI's undo push, so an undo step can hold the
+    # new property value with the old node values; re-apply from the restored
+    # properties so both agree again
+    for key, applies in _applied.items():
+        _pending.setdefault(key, {}).update(dict.fromkeys(applies, 0.0))
+    flush()
+
+HANDLERS = (
+    (bpy.app.handlers.render_pre, _render_pre),
+    (bpy.app.handlers.undo_post, _undo_redo_post),
+    (bpy.app.handlers.redo_post, _undo_redo_post),
+)
+
+def register():
+    for handlers, func in HANDLERS:
+        if func not in handlers:
+            handlers.append(func)
+
+def unregister():
+    for handlers, func in HANDLERS:
+        if func in handlers:
+            handlers.remove(func)
+    if bpy.app.timers.is_registered(_apply_pending):
+        bpy.app.timers.unregister(_apply_pending)
+    _pending.clear()
+    _applied.clear()
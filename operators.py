@@ -1,14 +1,17 @@
 import bpy
 import os
 
+from . import gobo_cache
+from . import gobos
+from . import hdri_analysis
+from . import image_manager
+from . import rig_builder
+from . import world_setup
+
 def ensure_collection_linked(context, obj, collection_name):
     """Ensure object is linked to a specific collection, unlinking from others if needed"""
     # Create or get collection
-    if collection_name in bpy.data.collections:
-        col = bpy.data.collections[collection_name]
-    else:
-        col = bpy.data.collections.new(collection_name)
-        context.scene.collection.children.link(col)
+    col = rig_builder.get_collection(context.scene, collection_name)
         
     # Link object if not already linked
     if obj.name not in col.objects:
@@ -23,8 +26,16 @@ class BLS_OT_setup_product_lighting(bpy.types.Operator):
     bl_label = "3 Point Lighting"
     bl_options = {'REGISTER', 'UNDO'}
 
-    def ensure_collection(self, context, collection_name):
-        return ensure_collection_linked(context, collection_name)
+    batch: bpy.props.BoolProperty(
+        name="All Selected",
+        description="Build a rig around every selected object, sized from its bounding box",
+        default=False
+    )
+    preset: bpy.props.StringProperty(
+        name="Preset",
+        description="Rig preset file in the add-on's presets folder",
+        default=rig_builder.DEFAULT_PRESET
+    )
 
     def execute(self, context):
         context.scene.render.engine = 'CYCLES'
@@ -35,33 +46,25 @@ class BLS_OT_setup_product_lighting(bpy.types.Operator):
             self.report({'ERROR'}, "Please select an object to target")
             return {'CANCELLED'}
         
-        target = selected[0]
-        target_loc = target.location
-        
-        # Create lights relative to target location
-        # Pos: (X, Y, Z) - Y+ is Back, Y- is Front
-        lights_data = [
-            ("Key_Light", (0 + target_loc.x, -3 + target_loc.y, 1 + target_loc.z), 75, 3),   # Front
-            ("Fill_Light", (2 + target_loc.x, -1 + target_loc.y, 2 + target_loc.z), 150, 3),  # Left/Right
-            ("Rim_Light", (0 + target_loc.x, 3 + target_loc.y, 1 + target_loc.z), 300, 3),   # Back
-        ]
-        
-        for name, loc, energy, size in lights_data:
-            bpy.ops.object.light_add(type='AREA', location=loc)
-            light = context.active_object
-            light.name = name
-            light.data.energy = energy
-            light.data.size = size
-            
-            # Ensure proper collection
-            ensure_collection_linked(context, light, "Lights")
-            
-            # Add track-to constraint
-            constraint = light.constraints.new(type='TRACK_TO')
-            constraint.target = target
-            constraint.track_axis = 'TRACK_NEGATIVE_Z'
-            constraint.up_axis = 'UP_Y'
+        if self.batch:
+            targets = [obj for obj in selected if obj.type not in {'LIGHT', 'CAMERA'}]
+            if not targets:
+                self.report({'ERROR'}, "Please select objects to target")
+                return {'CANCELLED'}
+        else:
+            targets = [selected[0]]
         
+        try:
+            preset = rig_builder.load_preset(self.preset)
+        except (OSError, ValueError) as e:
+            self.report({'ERROR'}, f"Failed to load rig preset '{self.preset}': {e}")
+            return {'CANCELLED'}
+        
+        # Re-applying updates the target's existing rig instead of adding another
+        _lights, created, changes, removed = rig_builder.apply_preset(
+            context.scene, preset, targets, fit=self.batch, view_layer=context.view_layer)
+        self.report({'INFO'}, f"{preset['name']} on {len(targets)} object(s): "
+                              f"{created} lights added, {changes} properties updated, {removed} removed")
         return {'FINISHED'}
 
 class BLS_OT_setup_hdri(bpy.types.Operator):
@@ -75,49 +78,14 @@ class BLS_OT_setup_hdri(bpy.types.Operator):
         if not self.filepath:
             return {'CANCELLED'}
             
-        world = context.scene.world
-        if not world:
-            world = bpy.data.worlds.new("World")
-            context.scene.world = world
-        
-        world.use_nodes = True
-        nodes = world.node_tree.nodes
-        links = world.node_tree.links
-        nodes.clear()
-        
-        node_output = nodes.new(type='ShaderNodeOutputWorld')
-        node_bg = nodes.new(type='ShaderNodeBackground')
-        node_env = nodes.new(type='ShaderNodeTexEnvironment')
-        node_mapping = nodes.new(type='ShaderNodeMapping')
-        node_coord = nodes.new(type='ShaderNodeTexCoord')
-        
         try:
-            img = bpy.data.images.load(self.filepath)
-            node_env.image = img
+            world_setup.setup_world_hdri(context.scene, self.filepath)
         except:
             self.report({'ERROR'}, "Could not load image")
             return {'CANCELLED'}
-            
-        links.new(node_coord.outputs['Generated'], node_mapping.inputs['Vector'])
-        links.new(node_mapping.outputs['Vector'], node_env.inputs['Vector'])
-        links.new(node_env.outputs['Color'], node_bg.inputs['Color'])
-        links.new(node_bg.outputs['Background'], node_output.inputs['Surface'])
         
-        # Name nodes for real-time update callbacks
-        node_bg.name = "BLS_Background"
-        node_mapping.name = "BLS_Mapping"
-        
-        # Set default values from props
-        props = context.scene.bls_props
-        node_bg.inputs['Strength'].default_value = props.hdri_intensity
-        node_mapping.inputs['Rotation'].default_value[2] = props.hdri_rotation * (3.14159 / 180.0)
-        
-        # Arrange nodes
-        node_output.location = (400, 0)
-        node_bg.location = (200, 0)
-        node_env.location = (0, 0)
-        node_mapping.location = (-200, 0)
-        node_coord.location = (-400, 0)
+        # Lights extracted from the previous HDRI no longer match
+        hdri_analysis.clear_hdri_lights(context.scene)
         
         return {'FINISHED'}
 
@@ -415,23 +383,8 @@ class BLS_OT_create_tracked_light(bpy.types.Operator):
         
         # Create light at Z=1 above the target
         light_loc = (target.location.x, target.location.y, target.location.z + 1)
-        bpy.ops.object.light_add(type='AREA', location=light_loc)
-        light = context.active_object
-        light.name = f"Tracked_Light_{target.name}"
-        light.data.energy = 500
-        light.data.size = 1
-        
-        # Ensure proper collection
-        ensure_collection_linked(context, light, "Lights")
-        
-        # Ensure proper collection
-        ensure_collection_linked(context, light, "Lights")
-        
-        # Add track-to constraint
-        constraint = light.constraints.new(type='TRACK_TO')
-        constraint.target = target
-        constraint.track_axis = 'TRACK_NEGATIVE_Z'
-        constraint.up_axis = 'UP_Y'
+        spec = rig_builder.LightSpec(f"Tracked_Light_{target.name}", 'AREA', light_loc, 500, 1, target)
+        rig_builder.build_rig(context.scene, [spec], view_layer=context.view_layer)
         
         self.report({'INFO'}, f"Created light tracking {target.name}")
         return {'FINISHED'}
@@ -688,6 +641,28 @@ class BLS_OT_apply_reflector_material(bpy.types.Operator):
         self.report({'INFO'}, f"Applied {material_type} to selection")
         return {'FINISHED'}
 
+class BLS_OT_purge_images(bpy.types.Operator):
+    bl_idname = "bls.purge_images"
+    bl_label = "Free Unused Images"
+    bl_description = "Remove HDRIs and gobo textures LightForge loaded that nothing uses any more"
+    
+    def execute(self, context):
+        count, freed = image_manager.release_unused()
+        print("BLS: " + "\n".join(image_manager.memory_report()))
+        self.report({'INFO'}, f"Freed {count} images ({image_manager.format_size(freed)})")
+        return {'FINISHED'}
+
+class BLS_OT_benchmark_rig_builder(bpy.types.Operator):
+    bl_idname = "bls.benchmark_rig_builder"
+    bl_label = "Benchmark Light Creation"
+    bl_description = "Time creating thousands of lights in a scratch scene (printed to the console)"
+    
+    def execute(self, context):
+        lines = rig_builder.benchmark(context)
+        print("BLS: Rig builder benchmark\n" + "\n".join(lines))
+        self.report({'INFO'}, lines[-1])
+        return {'FINISHED'}
+
 class BLS_OT_import_custom_hdri(bpy.types.Operator):
     bl_idname = "bls.import_custom_hdri"
     bl_label = "Import Custom HDRI"
@@ -699,51 +674,21 @@ class BLS_OT_import_custom_hdri(bpy.types.Operator):
         if not self.filepath:
             return {'CANCELLED'}
         
-        # Load image
-        try:
-            img = bpy.data.images.load(self.filepath, check_existing=True)
-        except:
+        if not os.path.exists(self.filepath):
             self.report({'ERROR'}, "Could not load image")
             return {'CANCELLED'}
             
         # Setup world (Using same logic as standard setup)
-        world = context.scene.world
-        if not world:
-            world = bpy.data.worlds.new("World")
-            context.scene.world = world
-        
-        world.use_nodes = True
-        nodes = world.node_tree.nodes
-        links = world.node_tree.links
-        nodes.clear()
-        
-        node_output = nodes.new(type='ShaderNodeOutputWorld')
-        node_bg = nodes.new(type='ShaderNodeBackground')
-        node_env = nodes.new(type='ShaderNodeTexEnvironment')
-        node_mapping = nodes.new(type='ShaderNodeMapping')
-        node_coord = nodes.new(type='ShaderNodeTexCoord')
-        
-        node_env.image = img
-        
-        links.new(node_coord.outputs['Generated'], node_mapping.inputs['Vector'])
-        links.new(node_mapping.outputs['Vector'], node_env.inputs['Vector'])
-        links.new(node_env.outputs['Color'], node_bg.inputs['Color'])
-        links.new(node_bg.outputs['Background'], node_output.inputs['Surface'])
-        
-        node_bg.name = "BLS_Background"
-        node_mapping.name = "BLS_Mapping"
-        
-        props = context.scene.bls_props
-        node_bg.inputs['Strength'].default_value = props.hdri_intensity
-        node_mapping.inputs['Rotation'].default_value[2] = props.hdri_rotation * (3.14159 / 180.0)
+        try:
+            world_setup.setup_world_hdri(context.scene, self.filepath)
+        except:
+            self.report({'ERROR'}, "Could not load image")
+            return {'CANCELLED'}
         
-        node_output.location = (400, 0)
-        node_bg.location = (200, 0)
-        node_env.location = (0, 0)
-        node_mapping.location = (-200, 0)
-        node_coord.location = (-400, 0)
+        # Lights extracted from the previous HDRI no longer match
+        hdri_analysis.clear_hdri_lights(context.scene)
         
-        self.report({'INFO'}, f"Imported HDRI: {img.name}")
+        self.report({'INFO'}, f"Imported HDRI: {os.path.basename(self.filepath)}")
         return {'FINISHED'}
         
     def invoke(self, context, event):
@@ -767,10 +712,13 @@ class BLS_OT_import_custom_gobo(bpy.types.Operator):
             return {'CANCELLED'}
             
         try:
-            img = bpy.data.images.load(self.filepath, check_existing=True)
+            img = gobo_cache.load_gobo(context.scene, self.filepath)
         except:
             self.report({'ERROR'}, "Could not load image")
             return {'CANCELLED'}
+        
+        # Make the import resolvable by ID like library gobos
+        gobos.register_gobo_asset(self.filepath)
             
         light.data.use_nodes = True
         nodes = light.data.node_tree.nodes
@@ -798,6 +746,8 @@ class BLS_OT_import_custom_gobo(bpy.types.Operator):
         # Ensure collection (Just in case)
         ensure_collection_linked(context, light, "Lights")
         
+        image_manager.release_unused()
+        
         self.report({'INFO'}, f"Applied Custom Texture: {img.name}")
         return {'FINISHED'}
 
@@ -817,7 +767,7 @@ class BLS_OT_import_custom_reflector(bpy.types.Operator):
             return {'CANCELLED'}
             
         try:
-            img = bpy.data.images.load(self.filepath, check_existing=True)
+            img = image_manager.load_image(self.filepath)
         except:
             self.report({'ERROR'}, "Could not load image")
             return {'CANCELLED'}
@@ -880,6 +830,8 @@ classes = (
     BLS_OT_set_resolution,
     BLS_OT_create_cyclorama,
     BLS_OT_create_shadow_catcher,
+    BLS_OT_purge_images,
+    BLS_OT_benchmark_rig_builder,
     BLS_OT_import_custom_hdri,
     BLS_OT_import_custom_gobo,
     BLS_OT_import_custom_reflector,
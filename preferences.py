@@ -0,0 +1,119 @@
+import bpy
+
+# Previews per page in the gobo and HDRI browsers
+DEFAULT_PAGE_SIZE = 48
+
+LIBRARY_KINDS = [
+    ('GOBO', "Gobos", "Light textures"),
+    ('HDRI', "HDRIs", "Environment maps"),
+    ('REFLECTOR', "Reflectors", "Reflector card images"),
+]
+
+class BLS_LibraryRoot(bpy.types.PropertyGroup):
+    path: bpy.props.StringProperty(
+        name="Folder",
+        description="Folder indexed (recursively) into the asset catalog",
+        subtype='DIR_PATH'
+    )
+
+    kind: bpy.props.EnumProperty(
+        name="Kind",
+        items=LIBRARY_KINDS,
+        default='HDRI'
+    )
+
+    enabled: bpy.props.BoolProperty(
+        name="Enabled",
+        default=True
+    )
+
+class BLS_OT_add_library_root(bpy.types.Operator):
+    bl_idname = "bls.add_library_root"
+    bl_label = "Add Library Folder"
+
+    kind: bpy.props.EnumProperty(items=LIBRARY_KINDS, default='HDRI')
+    directory: bpy.props.StringProperty(subtype='DIR_PATH')
+
+    def execute(self, context):
+        if not self.directory:
+            return {'CANCELLED'}
+
+        prefs = get_preferences(context)
+        root = prefs.library_roots.add()
+        root.kind = self.kind
+        root.path = self.directory
+
+        self.report({'INFO'}, f"Added library folder: {self.directory} (reload to index)")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+class BLS_OT_remove_library_root(bpy.types.Operator):
+    bl_idname = "bls.remove_library_root"
+    bl_label = "Remove Library Folder"
+
+    index: bpy.props.IntProperty()
+
+    def execute(self, context):
+        prefs = get_preferences(context)
+        if 0 <= self.index < len(prefs.library_roots):
+            prefs.library_roots.remove(self.index)
+        return {'FINISHED'}
+
+class BLS_AddonPreferences(bpy.types.AddonPreferences):
+    bl_idname = __package__
+
+    library_roots: bpy.props.CollectionProperty(type=BLS_LibraryRoot)
+
+    page_size: bpy.props.IntProperty(
+        name="Previews per Page",
+        description="Number of thumbnails loaded at a time in the gobo and HDRI browsers",
+        default=DEFAULT_PAGE_SIZE,
+        min=8,
+        max=1000
+    )
+
+    def draw(self, context):
+        layout = self.layout
+
+        box = layout.box()
+        box.label(text="Asset Library Folders", icon='FILE_FOLDER')
+        box.label(text="The built-in textures folders are always included", icon='INFO')
+
+        col = box.column(align=True)
+        for i, root in enumerate(self.library_roots):
+            row = col.row(align=True)
+            row.prop(root, "enabled", text="")
+            row.prop(root, "kind", text="")
+            row.prop(root, "path", text="")
+            row.operator("bls.remove_library_root", text="", icon='X').index = i
+
+        row = box.row(align=True)
+        for kind, label, _description in LIBRARY_KINDS:
+            row.operator("bls.add_library_root", text=f"Add {label}", icon='ADD').kind = kind
+
+        box.prop(self, "page_size")
+        box.operator("bls.reload_icons", text="Re-index Libraries", icon='FILE_REFRESH')
+
+def get_preferences(context=None):
+    """LightForge add-on preferences, or None if unavailable"""
+    context = context or bpy.context
+    addon = context.preferences.addons.get(__package__)
+    return addon.preferences if addon else None
+
+classes = (
+    BLS_LibraryRoot,
+    BLS_OT_add_library_root,
+    BLS_OT_remove_library_root,
+    BLS_AddonPreferences,
+)
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+def unregister():
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
@@ -0,0 +1,333 @@
+import bpy
+import numpy as np
+
+# Registered gobo patterns: name -> {"func", "color", "params"}
+GOBO_PATTERNS = {}
+
+def gobo_pattern(name, color=(1.0, 1.0, 1.0, 1.0), **params):
+    """Register a pattern function under a name with its default color and parameters
+
+    Pattern functions take broadcastable coordinate arrays u (1, width) and
+    v (height, 1) in 0..1 plus keyword parameters, and return a (height, width)
+    intensity factor that multiplies the pattern color.
+    """
+    def decorator(func):
+        GOBO_PATTERNS[name] = {"func": func, "color": color, "params": params}
+        return func
+    return decorator
+
+def _smoothstep(edge0, edge1, x):
+    t = np.clip((x - edge0) / (edge1 - edge0), 0.0, 1.0)
+    return t * t * (3.0 - 2.0 * t)
+
+@gobo_pattern("softbox", color=(1.0, 1.0, 1.0, 1.0))
+def pattern_softbox(u, v):
+    dx = u * 2.0 - 1.0
+    dy = v * 2.0 - 1.0
+    return np.maximum(0.0, 1.0 - np.sqrt(dx * dx + dy * dy))
+
+@gobo_pattern("grid", color=(0.7, 0.7, 0.7, 1.0), cells=8, line=0.125, dim=0.3)
+def pattern_grid(u, v, cells, line, dim):
+    mask = ((u * cells) % 1.0 < line) | ((v * cells) % 1.0 < line)
+    return np.where(mask, 1.0, dim).astype(np.float32)
+
+@gobo_pattern("circle", color=(0.9, 0.8, 0.6, 1.0), radius=0.4, dim=0.4)
+def pattern_circle(u, v, radius, dim):
+    dx = u * 2.0 - 1.0
+    dy = v * 2.0 - 1.0
+    return np.where(dx * dx + dy * dy < radius * radius, 1.0, dim).astype(np.float32)
+
+@gobo_pattern("dots", color=(0.8, 0.9, 1.0, 1.0), cells=4, size=0.25, dim=0.5)
+def pattern_dots(u, v, cells, size, dim):
+    mask = ((u * cells) % 1.0 < size) & ((v * cells) % 1.0 < size)
+    return np.where(mask, 1.0, dim).astype(np.float32)
+
+@gobo_pattern("stripes", color=(1.0, 0.9, 0.8, 1.0), count=8, dim=0.6)
+def pattern_stripes(u, v, count, dim):
+    mask = np.floor(u * count) % 2 == 0
+    return np.broadcast_to(np.where(mask, 1.0, dim).astype(np.float32), np.broadcast(u, v).shape)
+
+@gobo_pattern("blinds", slats=12, gap=0.45, softness=0.08, dim=0.03)
+def pattern_blinds(u, v, slats, gap, softness, dim):
+    # Distance from the centre of each gap between slats, in slat units
+    phase = np.abs((v * slats) % 1.0 - 0.5) * 2.0
+    light = 1.0 - _smoothstep(gap - softness, gap + softness, phase)
+    return np.broadcast_to(dim + (1.0 - dim) * light, np.broadcast(u, v).shape)
+
+@gobo_pattern("window", panes_x=2, panes_y=3, border=0.08, mullion=0.03, dim=0.03)
+def pattern_window(u, v, panes_x, panes_y, border, mullion, dim):
+    inside_u = (u > border) & (u < 1.0 - border)
+    inside_v = (v > border) & (v < 1.0 - border)
+
+    # Position within the glazed area, then distance to the nearest mullion
+    gu = (u - border) / (1.0 - 2.0 * border) * panes_x
+    gv = (v - border) / (1.0 - 2.0 * border) * panes_y
+    bar_u = np.abs(gu - np.round(gu)) < mullion * panes_x / 2.0
+    bar_v = np.abs(gv - np.round(gv)) < mullion * panes_y / 2.0
+
+    glass = inside_u & inside_v & ~bar_u & ~bar_v
+    return np.where(glass, 1.0, dim).astype(np.float32)
+
+def _interp_weights(size, frequency):
+    """Dense (size, frequency + 1) smoothstep interpolation weights onto a lattice"""
+    t = np.arange(size, dtype=np.float32) * (frequency / size)
+    i0 = np.minimum(t.astype(np.int32), frequency - 1)
+    f = t - i0
+    f = f * f * (3.0 - 2.0 * f)
+
+    weights = np.zeros((size, frequency + 1), dtype=np.float32)
+    rows = np.arange(size)
+    weights[rows, i0] = 1.0 - f
+    weights[rows, i0 + 1] = f
+    return weights
+
+def fractal_noise(width, height, frequency, octaves, rng):
+    """Normalised fBm value noise in 0..1
+
+    Each octave is a random lattice interpolated separably, so the whole stack
+    reduces to Wy @ blockdiag(lattices) @ Wx.T -- one matrix product per image
+    instead of per-pixel gathers.
+    """
+    sizes = [frequency * 2 ** octave + 1 for octave in range(octaves)]
+    total = sum(sizes)
+
+    lattice = np.zeros((total, total), dtype=np.float32)
+    wy, wx = [], []
+    offset, amplitude, norm = 0, 1.0, 0.0
+    for size in sizes:
+        block = slice(offset, offset + size)
+        lattice[block, block] = rng.random((size, size), dtype=np.float32) * amplitude
+        wy.append(_interp_weights(height, size - 1))
+        wx.append(_interp_weights(width, size - 1))
+        offset += size
+        norm += amplitude
+        amplitude *= 0.5
+
+    noise = (np.hstack(wy) @ lattice) @ np.hstack(wx).T
+    noise /= norm
+    return noise
+
+@gobo_pattern("foliage", scale=6, octaves=4, coverage=0.5, softness=0.12, dim=0.05, seed=7)
+def pattern_foliage(u, v, scale, octaves, coverage, softness, dim, seed):
+    width, height = u.shape[1], v.shape[0]
+    noise = fractal_noise(width, height, scale, octaves, np.random.default_rng(seed))
+
+    # Gaps in the leaves let light through
+    light = _smoothstep(coverage - softness, coverage + softness, noise)
+    return dim + (1.0 - dim) * light
+
+# Light texture node networks built by the Procedural texture mode, shared by the live
+# node setup and the baked images: (position, gray value) ramp keys and mapping scales
+GRADIENT_RAMP = ((0.3, 0.0), (0.5, 0.5), (0.7, 1.0))
+GRADIENT_MAPPING_SCALE = 2.0
+NOISE_RAMP = ((0.0, 0.0), (1.0, 1.0))
+NOISE_MAPPING_SCALE = 5.0
+NOISE_SCALE = 10.0
+NOISE_DETAIL = 5.0
+NOISE_ROUGHNESS = 0.5
+NOISE_LACUNARITY = 2.0
+
+# Noise seeds shift the sampled slice of 3D noise by this much along Z
+SEED_OFFSET = 7.31
+
+# Pixels of a bake evaluated at a time
+BAKE_CHUNK_PIXELS = 1 << 16
+
+def _rot(x, k):
+    return (x << np.uint32(k)) | (x >> np.uint32(32 - k))
+
+def hash_uint3(x, y, z):
+    """Bob Jenkins' lookup3 hash of three uint32 arrays, as used by Blender's noise"""
+    x, y, z = np.broadcast_arrays(x, y, z)
+    init = np.uint32(0xdeadbeef + (3 << 2) + 13)
+    a = x + init
+    b = y + init
+    c = z + init
+    c ^= b; c -= _rot(b, 14)
+    a ^= c; a -= _rot(c, 11)
+    b ^= a; b -= _rot(a, 25)
+    c ^= b; c -= _rot(b, 16)
+    a ^= c; a -= _rot(c, 4)
+    b ^= a; b -= _rot(a, 14)
+    c ^= b; c -= _rot(b, 24)
+    return c
+
+def _to_uint32(values):
+    """Wrap signed lattice coordinates like the C casts in Blender's noise"""
+    return (np.asarray(values, dtype=np.int64) & 0xFFFFFFFF).astype(np.uint32)
+
+def _gradient_table():
+    """(16, 3) coefficients of x, y, z in Perlin's grad3 for each hash & 15"""
+    table = np.zeros((16, 3), dtype=np.float32)
+    for h in range(16):
+        u = 0 if h < 8 else 1
+        v = 1 if h < 4 else (0 if h in (12, 14) else 2)
+        table[h, u] += -1.0 if h & 1 else 1.0
+        table[h, v] += -1.0 if h & 2 else 1.0
+    return table
+
+_GRADIENTS = _gradient_table()
+
+def _fade(t):
+    return t * t * t * (t * (t * 6.0 - 15.0) + 10.0)
+
+def _folded_gradients(ix, iy, z0, fz, w):
+    """(..., 3) lattice gradients at (ix, iy) with both Z layers folded in
+
+    Z is constant over the plane, so the two layers' gradients blend into one
+    x and y coefficient and a constant z term per lattice point.
+    """
+    folded = 0.0
+    for dz, wz in ((0, 1.0 - w), (1, w)):
+        h = hash_uint3(ix, iy, _to_uint32(np.array([z0 + dz]))) & np.uint32(15)
+        folded = folded + _GRADIENTS[h] * (np.array([wz, wz, wz * (fz - dz)], dtype=np.float32))
+    return folded
+
+def perlin_plane(x, y, z):
+    """Blender's signed 3D Perlin noise on a plane: x (1, w), y (h, 1), scalar z -> (h, w)
+
+    The four corner gradients are gathered per sample, so memory follows the
+    number of samples. When the lattice under the samples has fewer points
+    than there are samples, it is hashed once and indexed; otherwise each
+    corner is hashed per sample.
+    """
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    z0 = np.floor(z)
+    fx = (x - x0).astype(np.float32)
+    fy = (y - y0).astype(np.float32)
+    fz = float(z - z0)
+    u = _fade(fx)
+    v = _fade(fy)
+    w = float(_fade(fz))
+
+    x_start, y_start = int(x0.min()), int(y0.min())
+    columns = int(x0.max()) - x_start + 2
+    rows = int(y0.max()) - y_start + 2
+    if columns * rows <= x0.size * y0.size:
+        lattice = _folded_gradients(_to_uint32(np.arange(x_start, x_start + columns))[None, :],
+                                    _to_uint32(np.arange(y_start, y_start + rows))[:, None], int(z0), fz, w)
+        lattice = lattice.reshape(-1, 3)
+        index = (y0 - y_start).astype(np.intp) * columns + (x0 - x_start).astype(np.intp)
+        corner = lambda dx, dy: np.take(lattice, index + (dy * columns + dx), axis=0)
+    else:
+        ix = (_to_uint32(x0), _to_uint32(x0 + 1))
+        iy = (_to_uint32(y0), _to_uint32(y0 + 1))
+        corner = lambda dx, dy: _folded_gradients(ix[dx], iy[dy], int(z0), fz, w)
+
+    result = 0.0
+    for dy, wy in ((0, 1.0 - v), (1, v)):
+        g0 = corner(0, dy)
+        g1 = corner(1, dy)
+        row = ((1.0 - u) * (g0[..., 0] * fx + g0[..., 1] * (fy - dy) + g0[..., 2])
+               + u * (g1[..., 0] * (fx - 1.0) + g1[..., 1] * (fy - dy) + g1[..., 2]))
+        result = result + wy * row
+    return 0.9820 * result
+
+def fbm_noise(x, y, z, detail=NOISE_DETAIL, roughness=NOISE_ROUGHNESS, lacunarity=NOISE_LACUNARITY,
+              sample_spacing=0.0):
+    """Normalized fBm of Blender's Noise Texture (Fac output, 0..1) on a plane
+
+    With a sample_spacing (input distance between neighbouring pixels),
+    octaves above the first with more than one lattice cell per two pixels
+    are skipped: above Nyquist they only alias, and their pixel average is
+    zero. They still count towards the normalization.
+    """
+    def octave(scale):
+        if scale > 1.0 and sample_spacing * scale > 0.5:
+            return 0.0
+        return perlin_plane(x * scale, y * scale, z * scale)
+
+    octaves = int(detail)
+    scale, amplitude, total, norm = 1.0, 1.0, 0.0, 0.0
+    for _ in range(octaves + 1):
+        total = total + octave(scale) * amplitude
+        norm += amplitude
+        amplitude *= roughness
+        scale *= lacunarity
+
+    value = 0.5 * total / norm + 0.5
+    remainder = detail - octaves
+    if remainder:
+        finer = total + octave(scale) * amplitude
+        value = (1.0 - remainder) * value + remainder * (0.5 * finer / (norm + amplitude) + 0.5)
+    return value
+
+def bspline_ramp(fac, keys):
+    """Evaluate a B-Spline color ramp of (position, value) keys like Blender's ColorBand"""
+    positions = np.array([k[0] for k in keys], dtype=np.float32)
+    values = np.array([k[1] for k in keys], dtype=np.float32)
+    count = len(keys)
+
+    # Keys padded with the virtual end keys Blender adds at 0 and 1
+    pad_pos = np.concatenate([[0.0], positions, [1.0]])
+    pad_val = np.concatenate([values[:1], values, values[-1:]])
+
+    # a: number of keys at or before fac; the segment runs from key a - 1 (left) to a (right)
+    a = np.searchsorted(positions, fac, side='right')
+    left, right = a, a + 1  # indices into the padded arrays
+    outer_right = np.where(a >= count - 1, right, right + 1)
+    outer_left = np.where(a < 2, left, left - 1)
+
+    span = pad_pos[left] - pad_pos[right]
+    t = np.where(span != 0.0, (fac - pad_pos[right]) / np.where(span != 0.0, span, 1.0),
+                 np.where(a != count, 0.0, 1.0))
+    t = np.clip(t, 0.0, 1.0)
+    t2, t3 = t * t, t * t * t
+    w0 = -t3 / 6.0 + 0.5 * t2 - 0.5 * t + 1.0 / 6.0
+    w1 = 0.5 * t3 - t2 + 2.0 / 3.0
+    w2 = -0.5 * t3 + 0.5 * t2 + 0.5 * t + 1.0 / 6.0
+    w3 = t3 / 6.0
+    return (w3 * pad_val[outer_left] + w2 * pad_val[left] + w1 * pad_val[right]
+            + w0 * pad_val[outer_right]).astype(np.float32)
+
+def bake_network(kind, size, scale=1.0, seed=0):
+    """Evaluate the GRADIENT or NOISE light texture network to a (size, size) gray array"""
+    u = (np.arange(size, dtype=np.float32)[None, :] + 0.5) / size
+    v = (np.arange(size, dtype=np.float32)[:, None] + 0.5) / size
+
+    # Evaluated in row chunks, bounding the per-pixel temporaries of the noise and ramp
+    baked = np.empty((size, size), dtype=np.float32)
+    rows = max(1, BAKE_CHUNK_PIXELS // size)
+    frequency = NOISE_MAPPING_SCALE * scale * NOISE_SCALE
+    z = seed * SEED_OFFSET * NOISE_SCALE
+    for start in range(0, size, rows):
+        chunk_v = v[start:start + rows]
+        if kind == 'GRADIENT':
+            fac = np.clip(np.broadcast_to(u * GRADIENT_MAPPING_SCALE * scale, (chunk_v.shape[0], size)), 0.0, 1.0)
+            baked[start:start + rows] = bspline_ramp(fac, GRADIENT_RAMP)
+        else:
+            fac = fbm_noise(u * frequency, chunk_v * frequency, z, sample_spacing=frequency / size)
+            baked[start:start + rows] = bspline_ramp(fac, NOISE_RAMP)
+    return baked
+
+def generate_pattern(name, width, height=None, color=None, **params):
+    """Generate a gobo pattern as a (height, width, 4) float32 RGBA array"""
+    if name not in GOBO_PATTERNS:
+        raise KeyError(f"Unknown gobo pattern '{name}'")
+
+    pattern = GOBO_PATTERNS[name]
+    height = height or width
+    color = color or pattern["color"]
+    params = dict(pattern["params"], **params)
+
+    # Pixel-centre coordinates, kept 1D so patterns broadcast instead of allocating grids
+    u = (np.arange(width, dtype=np.float32)[None, :] + 0.5) / width
+    v = (np.arange(height, dtype=np.float32)[:, None] + 0.5) / height
+
+    factor = pattern["func"](u, v, **params)
+
+    rgba = np.empty((height, width, 4), dtype=np.float32)
+    for channel in range(3):
+        np.multiply(factor, color[channel], out=rgba[..., channel])
+    rgba[..., 3] = 1.0
+    return rgba
+
+def create_pattern_image(name, width, height=None, image_name=None, **params):
+    """Create a bpy image filled with a generated pattern"""
+    height = height or width
+    pixels = generate_pattern(name, width, height, **params)
+
+    img = bpy.data.images.new(image_name or name, width=width, height=height)
+    img.pixels.foreach_set(pixels.ravel())
+    return img
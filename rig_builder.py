@@ -0,0 +1,381 @@
+import os
+import json
+import time
+from collections import namedtuple
+
+import bpy
+import numpy as np
+
+LIGHTS_COLLECTION = "Lights"
+
+# One light of a rig; size is the area size, or the soft shadow radius of other types.
+# A spec with data reuses that light data-block (its type, energy and size apply) and
+# scale is the object scale, which also scales an area light's size
+LightSpec = namedtuple("LightSpec", "name type location energy size target data scale",
+                       defaults=(None, None, 1.0))
+
+# Rig presets: {"name", "lights": [{"role", "type", "offset", "energy", "size", "track"}]}
+PRESETS_DIR = os.path.join(os.path.dirname(__file__), "presets")
+DEFAULT_PRESET = "three_point"
+
+# Light object properties tying a light to the rig role and target object it was made for
+RIG_ROLE_PROP = "bls_rig_role"
+RIG_TARGET_PROP = "bls_rig_target"
+
+# Float properties closer than this to the preset count as unchanged
+TOLERANCE = 1e-5
+
+# Bounding radius the rig offsets are laid out for (the default 2 m cube); batch rigs scale
+# by each object's radius over this, never below MIN_RADIUS
+REFERENCE_RADIUS = 3.0 ** 0.5
+MIN_RADIUS = 0.05
+
+# Fitted rig scales are rounded to this many steps per doubling, so rigs of similar size
+# share light data; energy follows scale squared to keep the subject's exposure
+SCALE_STEPS_PER_OCTAVE = 4
+
+# Parsed presets by name, as (file mtime, preset)
+_presets = {}
+
+# Light counts timed by the benchmark, and the largest count also timed through bpy.ops
+BENCHMARK_COUNTS = (10, 100, 1000, 5000)
+OPS_BENCHMARK_LIMIT = 1000
+
+def get_collection(scene, name):
+    """Collection by name, created under the scene collection if missing"""
+    col = bpy.data.collections.get(name)
+    if col is None:
+        col = bpy.data.collections.new(name)
+        scene.collection.children.link(col)
+    return col
+
+def new_light_data(name, light_type, energy, size):
+    """Light data-block, which several rig lights may share"""
+    data = bpy.data.lights.new(name, light_type)
+    data.energy = energy
+    if light_type == 'AREA':
+        data.size = size
+    else:
+        data.shadow_soft_size = size
+    return data
+
+def new_light(spec):
+    """Light object for a spec, not yet linked to any collection"""
+    data = spec.data or new_light_data(spec.name, spec.type, spec.energy, spec.size)
+    obj = bpy.data.objects.new(spec.name, data)
+    obj.location = spec.location
+    if spec.scale != 1.0:
+        obj.scale = (spec.scale, spec.scale, spec.scale)
+    if spec.target:
+        add_track(obj, spec.target)
+    return obj
+
+def add_track(obj, target):
+    constraint = obj.constraints.new(type='TRACK_TO')
+    constraint.target = target
+    constraint.track_axis = 'TRACK_NEGATIVE_Z'
+    constraint.up_axis = 'UP_Y'
+    return constraint
+
+def build_rig(scene, specs, collection_name=LIGHTS_COLLECTION, view_layer=None):
+    """Create the lights of a rig in one pass, returning the new objects
+
+    Lights are made with the data API and linked straight into their
+    collection, so no operator runs per light and the view layer syncs once.
+    With a view layer the new lights become the selection (the last one
+    active) and the depsgraph is evaluated once for the whole rig.
+    """
+    col = get_collection(scene, collection_name)
+    objects = []
+    for spec in specs:
+        obj = new_light(spec)
+        col.objects.link(obj)
+        objects.append(obj)
+
+    if view_layer is not None:
+        select_objects(view_layer, objects)
+        view_layer.update()
+    return objects
+
+def world_bounds(objects):
+    """World-space bounding box centres (n, 3) and half-diagonals (n,) of objects"""
+    corners = np.array([[corner[:] for corner in obj.bound_box] for obj in objects], dtype=np.float64)
+    matrices = np.array([obj.matrix_world for obj in objects], dtype=np.float64)
+    world = np.einsum("nij,nkj->nki", matrices[:, :3, :3], corners) + matrices[:, None, :3, 3]
+    low, high = world.min(axis=1), world.max(axis=1)
+    return (low + high) * 0.5, np.linalg.norm(high - low, axis=1) * 0.5
+
+def _validate_preset(preset):
+    """Raise ValueError unless the parsed preset has the fields apply_preset reads"""
+    if not isinstance(preset, dict) or not isinstance(preset.get("name"), str):
+        raise ValueError("preset needs a \"name\" string")
+    lights = preset.get("lights")
+    if not isinstance(lights, list) or not lights:
+        raise ValueError("preset needs a non-empty \"lights\" list")
+    for i, light in enumerate(lights):
+        if not isinstance(light, dict):
+            raise ValueError(f"light {i} is not an object")
+        if not isinstance(light.get("role"), str) or not isinstance(light.get("type"), str):
+            raise ValueError(f"light {i} needs \"role\" and \"type\" strings")
+        offset = light.get("offset")
+        if (not isinstance(offset, list) or len(offset) != 3
+                or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in offset)):
+            raise ValueError(f"light {i} needs an \"offset\" of three numbers")
+        for key in ("energy", "size"):
+            if not isinstance(light.get(key), (int, float)) or isinstance(light.get(key), bool):
+                raise ValueError(f"light {i} needs a numeric \"{key}\"")
+        if not isinstance(light.get("track", True), bool):
+            raise ValueError(f"light {i} has a non-boolean \"track\"")
+
+def load_preset(name):
+    """Parsed and validated rig preset from the presets folder
+
+    Raises OSError or ValueError; the parse is reused until the file changes.
+    """
+    path = os.path.join(PRESETS_DIR, name + ".json")
+    mtime = os.path.getmtime(path)
+    cached = _presets.get(name)
+    if cached is None or cached[0] != mtime:
+        with open(path, "r", encoding="utf-8") as f:
+            preset = json.load(f)
+        _validate_preset(preset)
+        _presets[name] = cached = (mtime, preset)
+    return cached[1]
+
+def quantize_scales(scales):
+    """Round scales to SCALE_STEPS_PER_OCTAVE steps per doubling"""
+    return 2.0 ** (np.round(np.log2(scales) * SCALE_STEPS_PER_OCTAVE) / SCALE_STEPS_PER_OCTAVE)
+
+def preset_specs(preset, targets, fit=True):
+    """(target, role, spec) for every light of a preset around each target
+
+    Fitted rigs are placed around each target's bounding box centre, their
+    offsets and sizes scaled with its (quantized) radius and their energy
+    with its square; otherwise offsets are taken from the target's origin
+    as they are.
+    """
+    lights = preset["lights"]
+    offsets = np.array([light["offset"] for light in lights], dtype=np.float64)
+    if fit:
+        centers, radii = world_bounds(targets)
+        scales = quantize_scales(np.maximum(radii, MIN_RADIUS) / REFERENCE_RADIUS)
+    else:
+        centers = np.array([target.location[:] for target in targets], dtype=np.float64)
+        scales = np.ones(len(targets))
+    locations = centers[:, None, :] + offsets[None, :, :] * scales[:, None, None]
+
+    for target, scale, rig_locations in zip(targets, scales.tolist(), locations.tolist()):
+        for light, location in zip(lights, rig_locations):
+            role = light["role"]
+            # Distances grow with the scale while area light power does not, so
+            # irradiance on the subject would fall with its square
+            yield target, role, LightSpec(f"{target.name}_{role}" if fit else role, light["type"], location,
+                                          light["energy"] * scale * scale, light["size"],
+                                          target if light.get("track", True) else None, None, scale)
+
+def _rig_membership(obj, roles):
+    """(target, role) of a rig light, or (None, None)
+
+    Lights made before rigs were tagged are recognised by their tracking
+    constraint and a role name, optionally prefixed with the target's name.
+    """
+    if RIG_ROLE_PROP in obj:
+        return obj.get(RIG_TARGET_PROP), obj[RIG_ROLE_PROP]
+    for constraint in obj.constraints:
+        if constraint.type != 'TRACK_TO' or constraint.target is None:
+            continue
+        base, _dot, suffix = obj.name.rpartition(".")
+        name = base if suffix.isdigit() else obj.name
+        prefix = constraint.target.name + "_"
+        role = name[len(prefix):] if name.startswith(prefix) else name
+        if role in roles:
+            return constraint.target, role
+    return None, None
+
+def find_rig_lights(scene, targets, roles):
+    """Existing rig lights of the targets by (target pointer, role), and duplicates"""
+    pointers = {target.as_pointer() for target in targets}
+    found = {}
+    duplicates = []
+    for obj in scene.objects:
+        if obj.type != 'LIGHT':
+            continue
+        target, role = _rig_membership(obj, roles)
+        if target is None or target.as_pointer() not in pointers:
+            continue
+        key = (target.as_pointer(), role)
+        if key in found:
+            duplicates.append(obj)
+        else:
+            found[key] = obj
+    return found, duplicates
+
+def _differs(current, value):
+    if isinstance(value, (int, float)):
+        return abs(current - value) > TOLERANCE
+    return any(abs(a - b) > TOLERANCE for a, b in zip(current, value))
+
+def _data_matches(data, spec):
+    size_attr = "size" if spec.type == 'AREA' else "shadow_soft_size"
+    return (data.type == spec.type and not _differs(data.energy, spec.energy)
+            and not _differs(getattr(data, size_attr), spec.size))
+
+def update_light(obj, spec):
+    """Bring a light in line with a spec, setting only what differs; returns the change count"""
+    changes = 0
+    data = obj.data
+    if data.type != spec.type:
+        data.type = spec.type
+        changes += 1
+
+    size_attr = "size" if spec.type == 'AREA' else "shadow_soft_size"
+    for owner, attr, value in ((data, "energy", spec.energy), (data, size_attr, spec.size),
+                               (obj, "location", spec.location),
+                               (obj, "scale", (spec.scale, spec.scale, spec.scale))):
+        if _differs(getattr(owner, attr), value):
+            setattr(owner, attr, value)
+            changes += 1
+
+    # Exactly one tracking constraint when the preset tracks, none otherwise
+    tracks = [constraint for constraint in obj.constraints if constraint.type == 'TRACK_TO']
+    keep = tracks[0] if spec.target and tracks else None
+    for constraint in tracks:
+        if constraint != keep:
+            obj.constraints.remove(constraint)
+            changes += 1
+    if spec.target and keep is None:
+        add_track(obj, spec.target)
+        changes += 1
+    elif keep is not None:
+        for attr, value in (("target", spec.target), ("track_axis", 'TRACK_NEGATIVE_Z'), ("up_axis", 'UP_Y')):
+            if getattr(keep, attr) != value:
+                setattr(keep, attr, value)
+                changes += 1
+    return changes
+
+def remove_lights(objects):
+    """Delete light objects, and their light data once nothing else uses it"""
+    datas = {obj.data for obj in objects}
+    if objects:
+        bpy.data.batch_remove(objects)
+    orphans = [data for data in datas if data.users == 0]
+    if orphans:
+        bpy.data.batch_remove(orphans)
+
+def apply_preset(scene, preset, targets, fit=True, view_layer=None):
+    """Give each target the preset's rig, reusing any rig it already has
+
+    Existing rig lights are updated in place (only differing properties are
+    set), missing ones are created and lights the preset no longer has, or
+    duplicates of a role, are removed, so applying the same preset twice
+    changes nothing. Each role shares one light data-block across targets
+    of the same rig scale. Returns (rig lights, created, property changes,
+    removed).
+    """
+    roles = {light["role"] for light in preset["lights"]}
+    found, duplicates = find_rig_lights(scene, targets, roles)
+
+    # Lights of a role at the same scale share one light data-block, however many rigs there are
+    shared = {}
+    replaced = set()
+
+    col = get_collection(scene, LIGHTS_COLLECTION)
+    lights = []
+    created = changes = 0
+    for target, role, spec in preset_specs(preset, targets, fit):
+        key = (role, spec.type, round(spec.energy, 3), round(spec.size, 3))
+        obj = found.pop((target.as_pointer(), role), None)
+        if obj is None:
+            if key not in shared:
+                shared[key] = new_light_data(role, spec.type, spec.energy, spec.size)
+            obj = new_light(spec._replace(data=shared[key]))
+            col.objects.link(obj)
+            created += 1
+        else:
+            data = shared.get(key)
+            if data is None:
+                # Keep the light's data if it already fits, or if nothing else uses it and it
+                # can be updated in place; otherwise it would change other rigs too
+                claimed = list(shared.values())
+                if _data_matches(obj.data, spec) or (obj.data.users == 1 and obj.data not in claimed):
+                    data = obj.data
+                else:
+                    data = new_light_data(role, spec.type, spec.energy, spec.size)
+                shared[key] = data
+            if obj.data != data:
+                replaced.add(obj.data)
+                obj.data = data
+                changes += 1
+            changes += update_light(obj, spec)
+
+        if obj.get(RIG_ROLE_PROP) != role:
+            obj[RIG_ROLE_PROP] = role
+        if obj.get(RIG_TARGET_PROP) != target:
+            obj[RIG_TARGET_PROP] = target
+        lights.append(obj)
+
+    # Whatever is left over is a role the preset no longer has
+    removed = list(found.values()) + duplicates
+    remove_lights(removed)
+    orphans = [data for data in replaced if data.users == 0]
+    if orphans:
+        bpy.data.batch_remove(orphans)
+
+    if view_layer is not None:
+        select_objects(view_layer, lights)
+        view_layer.update()
+    return lights, created, changes, len(removed)
+
+def select_objects(view_layer, objects):
+    """Make objects the selection, the last one active, as an add operator would"""
+    for obj in view_layer.objects.selected:
+        obj.select_set(False, view_layer=view_layer)
+    # Objects in excluded collections have no base in the view layer
+    visible = [obj for obj in objects if view_layer.objects.get(obj.name) is not None]
+    for obj in visible:
+        obj.select_set(True, view_layer=view_layer)
+    if visible:
+        view_layer.objects.active = visible[-1]
+
+def grid_specs(count, spacing=1.0):
+    """Specs for count lights on a square grid, for the benchmark"""
+    side = max(1, int(round(count ** 0.5)))
+    return [LightSpec(f"BLS_Bench_{i:05d}", 'AREA', ((i % side) * spacing, (i // side) * spacing, 3.0), 10.0, 0.5)
+            for i in range(count)]
+
+def _time_ops(context, scene, specs):
+    """Seconds to add the lights one operator call at a time"""
+    view_layer = scene.view_layers[0]
+    start = time.perf_counter()
+    with context.temp_override(scene=scene, view_layer=view_layer):
+        for spec in specs:
+            bpy.ops.object.light_add(type=spec.type, location=spec.location)
+            light = view_layer.objects.active
+            light.name = spec.name
+            light.data.energy = spec.energy
+    return time.perf_counter() - start
+
+def benchmark(context, counts=BENCHMARK_COUNTS):
+    """Time build_rig (and bpy.ops for small counts) in a scratch scene, returning report lines"""
+    lines = []
+    for count in counts:
+        scene = bpy.data.scenes.new("BLS_Rig_Benchmark")
+        specs = grid_specs(count)
+        try:
+            start = time.perf_counter()
+            build_rig(scene, specs, collection_name="BLS_Rig_Benchmark", view_layer=scene.view_layers[0])
+            data_time = time.perf_counter() - start
+            line = f"{count} lights: data API {data_time * 1000:.1f} ms ({data_time / count * 1e6:.0f} us/light)"
+
+            # Operators need a context override (Blender 3.2+) and slow down quadratically, so stay small
+            if count <= OPS_BENCHMARK_LIMIT and hasattr(context, "temp_override"):
+                ops_time = _time_ops(context, scene, grid_specs(count))
+                line += f", bpy.ops {ops_time * 1000:.1f} ms ({ops_time / max(data_time, 1e-9):.0f}x)"
+            lines.append(line)
+        finally:
+            objects = list(scene.objects)
+            lights = [obj.data for obj in objects if obj.type == 'LIGHT']
+            collections = [col for col in bpy.data.collections if col.name.startswith("BLS_Rig_Benchmark")]
+            bpy.data.batch_remove(objects + lights + collections)
+            bpy.data.scenes.remove(scene)
+    return lines
@@ -0,0 +1,128 @@
+import numpy as np
+
+from . import cache
+from . import catalog
+
+# Side of the grayscale image the DCT hash is computed from, and of the kept low-frequency block
+HASH_IMAGE_SIZE = 32
+HASH_BLOCK_SIZE = 8
+
+# Hamming distances (out of 64 bits) for "similar" and "duplicate"
+SIMILAR_DISTANCE = 12
+DUPLICATE_DISTANCE = 4
+
+# Cached (ids, hashes) arrays per kind, rebuilt after hashes change
+_hash_arrays = {}
+
+def _dct_matrix(size):
+    """Orthonormal DCT-II basis as a (size, size) matrix"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    basis = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+_DCT = _dct_matrix(HASH_IMAGE_SIZE)
+
+def perceptual_hash(pixels):
+    """64-bit DCT perceptual hash of a (height, width, 4) image array"""
+    gray = pixels[..., :3] @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    height, width = gray.shape
+    small = cache.area_matrix(height, HASH_IMAGE_SIZE) @ gray @ cache.area_matrix(width, HASH_IMAGE_SIZE).T
+
+    coeffs = (_DCT @ small @ _DCT.T)[:HASH_BLOCK_SIZE, :HASH_BLOCK_SIZE].ravel()
+    # Compare against the median of the AC terms so overall brightness does not matter
+    bits = coeffs > np.median(coeffs[1:])
+    return int(np.packbits(bits.astype(np.uint8)).view(">u8")[0])
+
+def _to_signed(value):
+    """Store unsigned 64-bit hashes in SQLite's signed INTEGER"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def iter_update_hashes(kind='GOBO'):
+    """Hash catalog assets whose hash is missing (new or changed files)
+
+    Reads the small thumbnails the browser already uses. Yields (done, total).
+    """
+    conn = catalog.get_connection()
+    rows = conn.execute("SELECT id, thumbnail, path FROM assets WHERE kind = ? AND phash IS NULL",
+                        (kind,)).fetchall()
+
+    for i, (asset_id, thumbnail, path) in enumerate(rows):
+        try:
+            pixels, _is_float = cache.read_image(thumbnail or path, max_size=HASH_IMAGE_SIZE * 2)
+            conn.execute("UPDATE assets SET phash = ? WHERE id = ?",
+                         (_to_signed(perceptual_hash(pixels)), asset_id))
+        except Exception as e:
+            print(f"BLS: Could not hash '{thumbnail or path}': {e}")
+        if i % 50 == 49:
+            conn.commit()
+        yield i + 1, len(rows)
+
+    if rows:
+        conn.commit()
+        _hash_arrays.pop(kind, None)
+        print(f"BLS: Computed {len(rows)} perceptual hashes")
+
+def get_hash_arrays(kind='GOBO'):
+    """(ids, hashes) NumPy arrays of every hashed asset of a kind"""
+    if kind not in _hash_arrays:
+        rows = catalog.get_connection().execute(
+            "SELECT id, phash FROM assets WHERE kind = ? AND phash IS NOT NULL ORDER BY id", (kind,)).fetchall()
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        hashes = np.array([row[1] for row in rows], dtype=np.int64).view(np.uint64)
+        _hash_arrays[kind] = (ids, hashes)
+    return _hash_arrays[kind]
+
+def invalidate():
+    """Drop cached hash arrays (after re-indexing)"""
+    _hash_arrays.clear()
+
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def hamming_distances(hashes, value):
+    """Bit distance from one hash (or a column of hashes) to every hash"""
+    xor = np.bitwise_xor(hashes, value)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor).astype(np.int32)
+    return _POPCOUNT_TABLE[xor.view(np.uint8).reshape(xor.shape + (8,))].sum(axis=-1, dtype=np.int32)
+
+def find_similar(asset_id, max_distance=SIMILAR_DISTANCE, kind='GOBO'):
+    """IDs of assets whose hash is within max_distance, closest first (including itself)"""
+    ids, hashes = get_hash_arrays(kind)
+    match = np.nonzero(ids == asset_id)[0]
+    if not len(match):
+        return []
+
+    distances = hamming_distances(hashes, hashes[match[0]])
+    close = np.nonzero(distances <= max_distance)[0]
+    order = close[np.argsort(distances[close], kind="stable")]
+    return ids[order].tolist()
+
+def find_duplicate_clusters(max_distance=DUPLICATE_DISTANCE, kind='GOBO', block_size=512):
+    """Groups of asset IDs whose hashes are within max_distance of each other"""
+    ids, hashes = get_hash_arrays(kind)
+    parent = list(range(len(ids)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Compare blocks of rows against everything after them to bound memory
+    for start in range(0, len(ids), block_size):
+        block = hashes[start:start + block_size, None]
+        distances = hamming_distances(hashes[None, start:], block)
+        rows, cols = np.nonzero(distances <= max_distance)
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            i, j = start + row, start + col
+            if i < j:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[root_j] = root_i
+
+    clusters = {}
+    for i in range(len(ids)):
+        clusters.setdefault(find(i), []).append(int(ids[i]))
+    return [members for members in clusters.values() if len(members) > 1]
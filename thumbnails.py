@@ -0,0 +1,118 @@
+import os
+import numpy as np
+
+from . import cache
+
+# Longest side of generated preview thumbnails
+THUMBNAIL_SIZE = 256
+
+# Tonemapping key value (photographic middle gray)
+TONEMAP_KEY = 0.18
+
+def get_thumbnail_dir():
+    """Get the HDRI thumbnail cache directory"""
+    return cache.get_cache_dir("thumbnails")
+
+def _index_path():
+    return os.path.join(get_thumbnail_dir(), "index.json")
+
+def tonemap(rgb):
+    """Map scene-linear HDR values to display-referred sRGB in 0..1"""
+    rgb = np.maximum(rgb, 0.0)
+    lum = rgb @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+    # Reinhard global operator keyed on the log-average luminance
+    log_avg = np.exp(np.mean(np.log(lum + 1e-6)))
+    scaled = rgb * (TONEMAP_KEY / max(log_avg, 1e-6))
+    mapped = scaled / (1.0 + scaled)
+
+    # sRGB transfer function
+    return np.where(mapped <= 0.0031308,
+                    mapped * 12.92,
+                    1.055 * np.power(mapped, 1.0 / 2.4) - 0.055)
+
+def generate_thumbnail(filepath, thumb_path, size=THUMBNAIL_SIZE):
+    """Decode an image once and write a small tonemapped PNG preview"""
+    return cache.run_steps(iter_generate_thumbnail(filepath, thumb_path, size))
+
+def iter_generate_thumbnail(filepath, thumb_path, size=THUMBNAIL_SIZE):
+    """generate_thumbnail as a generator that yields while the source is decoded"""
+    pixels, is_float = yield from cache.iter_read_image(filepath, max_size=size)
+
+    if is_float:
+        pixels[..., :3] = tonemap(pixels[..., :3])
+    pixels[..., 3] = 1.0
+
+    cache.write_image(thumb_path, np.clip(pixels, 0.0, 1.0), 'PNG')
+    return thumb_path
+
+def load_thumbnail_index():
+    """Thumbnail cache index, for batching get_thumbnail calls"""
+    return cache.load_index(_index_path())
+
+def save_thumbnail_index(index):
+    """Write an index loaded by load_thumbnail_index back"""
+    cache.save_index(_index_path(), index)
+
+def get_thumbnail(filepath, size=THUMBNAIL_SIZE, index=None):
+    """Return a cached preview PNG for an image, generating it if missing or stale
+
+    Entries are keyed by absolute path, file size and modification time, so an
+    edited or replaced source file gets a fresh thumbnail automatically. Scans
+    pass the index from load_thumbnail_index and save it themselves; without
+    one the index is read and written for this file alone.
+    """
+    return cache.run_steps(iter_get_thumbnail(filepath, size, index))
+
+def iter_get_thumbnail(filepath, size=THUMBNAIL_SIZE, index=None):
+    """get_thumbnail as a generator that yields while the source is decoded"""
+    abspath, file_size, mtime = cache.file_signature(filepath)
+    key = cache.cache_key(abspath, file_size, mtime, size)
+
+    batch = index is not None
+    if not batch:
+        index = load_thumbnail_index()
+    entry = index.get(abspath)
+
+    if entry and entry.get("key") == key and os.path.exists(entry.get("thumb", "")):
+        return entry["thumb"]
+
+    # Stale or missing: drop the old file and regenerate
+    if entry and entry.get("thumb") and os.path.exists(entry["thumb"]):
+        try:
+            os.remove(entry["thumb"])
+        except OSError:
+            pass
+
+    stem = os.path.splitext(os.path.basename(abspath))[0]
+    thumb_path = os.path.join(get_thumbnail_dir(), f"{stem}_{key}.png")
+    yield from iter_generate_thumbnail(abspath, thumb_path, size)
+
+    index[abspath] = {"key": key, "thumb": thumb_path}
+    if not batch:
+        save_thumbnail_index(index)
+
+    print(f"BLS: Generated thumbnail for '{os.path.basename(abspath)}'")
+    return thumb_path
+
+def prune_thumbnails():
+    """Remove cache entries whose source file no longer exists"""
+    index_path = _index_path()
+    index = cache.load_index(index_path)
+    removed = 0
+
+    for source, entry in list(index.items()):
+        if os.path.exists(source):
+            continue
+        thumb = entry.get("thumb")
+        if thumb and os.path.exists(thumb):
+            try:
+                os.remove(thumb)
+            except OSError:
+                pass
+        del index[source]
+        removed += 1
+
+    if removed:
+        cache.save_index(index_path, index)
+    return removed
@@ -1,4 +1,36 @@
 import bpy
+import os
+import math
+from . import gobo_cache
+from . import gobos
+from . import hdri_proxy
+from . import world_setup
+
+def draw_page_controls(layout, key, library):
+    """Previous/next buttons and page label for a paged preview browser"""
+    status = gobos.get_page_status(key)
+    if not status:
+        return
+    
+    row = layout.row(align=True)
+    op = row.operator("bls.change_library_page", text="", icon='TRIA_LEFT')
+    op.library = library
+    op.delta = -1
+    row.label(text=status)
+    op = row.operator("bls.change_library_page", text="", icon='TRIA_RIGHT')
+    op.library = library
+    op.delta = 1
+
+def draw_gobo_overrides(layout, obj):
+    """Per-light scale and rotation of the active light's shared gobo"""
+    group_node = gobo_cache.get_group_node(obj)
+    if not group_node:
+        return
+    
+    col = layout.column(align=True)
+    col.label(text=f"{obj.name}: {group_node.node_tree.name}", icon='LIGHT')
+    col.prop(group_node.inputs['Scale'], "default_value", text="Scale")
+    col.prop(group_node.inputs['Rotation'], "default_value", text="Rotation")
 
 class BLS_PT_SetupPanel(bpy.types.Panel):
     bl_label = "Scene Setup"
@@ -24,7 +56,9 @@ class BLS_PT_SetupPanel(bpy.types.Panel):
         # Light creation buttons
         col = layout.column(align=True)
         col.scale_y = 1.3
-        col.operator("bls.setup_product_lighting", text="3 Point Lighting", icon='LIGHT_AREA')
+        row = col.row(align=True)
+        row.operator("bls.setup_product_lighting", text="3 Point Lighting", icon='LIGHT_AREA')
+        row.operator("bls.setup_product_lighting", text="", icon='LIGHTPROBE_GRID').batch = True
         col.operator("bls.create_tracked_light", text="Create Light", icon='LIGHT_SPOT')
         
         col.separator()
@@ -37,8 +71,13 @@ class BLS_PT_SetupPanel(bpy.types.Panel):
         # HDRI Library
         box = layout.box()
         box.label(text="HDRI Library", icon='WORLD')
+        box.prop(props, "hdri_search", text="", icon='VIEWZOOM')
+        draw_page_controls(box, "hdri", 'HDRI')
         row = box.row()
-        if props.active_hdri_texture == "NONE":
+        hdri_status = gobos.get_loading_status("hdri")
+        if hdri_status:
+            box.label(text=hdri_status, icon='TIME')
+        elif props.active_hdri_texture == "NONE":
             box.label(text="No HDRIs found", icon='ERROR')
             box.label(text="Place HDRIs in textures/hdri folder", icon='INFO')
         else:
@@ -49,14 +88,55 @@ class BLS_PT_SetupPanel(bpy.types.Panel):
         row.operator("bls.apply_hdri_from_lib", text="Apply HDRI", icon='WORLD')
         row.operator("bls.import_custom_hdri", text="", icon='FILE_FOLDER')
         row.operator("bls.reload_icons", text="", icon='FILE_REFRESH')
+        row.prop(props, "watch_library", text="", icon='HIDE_OFF' if props.watch_library else 'HIDE_ON')
         
         if props.active_hdri_texture != "NONE":
+            lighting = gobos.get_lighting_preview(props.active_hdri_texture)
+            if lighting:
+                icon_id, data = lighting
+                azimuth, elevation = data["direction"]
+                row = box.row()
+                row.template_icon(icon_value=icon_id, scale=4.0)
+                col = row.column(align=True)
+                col.label(text="Key Light Direction", icon='LIGHT_SUN')
+                col.label(text=f"Azimuth {math.degrees(azimuth) - props.hdri_rotation:.0f}°")
+                col.label(text=f"Elevation {math.degrees(elevation):.0f}°")
+                col.operator("bls.preview_hdri_lighting", text="Preview", icon='SHADING_RENDERED')
+            elif gobos.get_loading_status("irradiance"):
+                box.label(text=f"Lighting previews: {gobos.get_loading_status('irradiance')}", icon='TIME')
+            
             col = box.column(align=True)
             col.prop(props, "hdri_intensity", text="Intensity")
             col.prop(props, "hdri_rotation", text="Rotation")
+            col.prop(props, "hdri_auto_exposure")
+            col.prop(props, "hdri_viewport_resolution", text="Viewport")
+            if not scene.render.use_lock_interface and hdri_proxy.uses_proxy(scene.world):
+                # F12 always swaps in the full-resolution HDRI; other renders need a locked interface
+                col.prop(scene.render, "use_lock_interface", text="Lock Interface for Full-Res Renders")
+            col.prop(props, "hdri_blurred_lighting")
+            col.prop(props, "hdri_extract_lights")
+            
+            # Preloaded slots: switching or crossfading only changes the blend value
+            col = box.column(align=True)
+            col.label(text="HDRI Slots", icon='NODE_COMPOSITING')
+            node_blend = world_setup.get_blend_node(scene.world)
+            paths = world_setup.get_slot_paths(scene.world) if node_blend else [None] * world_setup.SLOT_COUNT
+            for slot, path in enumerate(paths):
+                row = col.row(align=True)
+                name = os.path.basename(path) if path else "Empty"
+                row.operator("bls.load_hdri_slot", text=f"{slot + 1}: {name}", icon='IMPORT').slot = slot
+                if node_blend:
+                    row.operator("bls.show_hdri_slot", text="", icon='HIDE_OFF').slot = slot
+            if node_blend:
+                row = col.row(align=True)
+                row.prop(node_blend.outputs['Value'], "default_value", text="Blend")
+                row.operator("bls.clear_hdri_slots", text="", icon='X')
         
         layout.separator()
-        layout.operator("bls.debug_info", text="Debug Info", icon='CONSOLE')
+        row = layout.row(align=True)
+        row.operator("bls.debug_info", text="Debug Info", icon='CONSOLE')
+        row.operator("bls.purge_images", text="", icon='TRASH')
+        row.operator("bls.benchmark_rig_builder", text="", icon='SORTTIME')
 
 class BLS_PT_TexturePanel(bpy.types.Panel):
     bl_label = "Light Texturing"
@@ -81,7 +161,15 @@ class BLS_PT_TexturePanel(bpy.types.Panel):
         layout.separator()
         
         if props.texture_type == 'IMAGE':
-            if props.active_gobo_texture == "NONE":
+            row = layout.row(align=True)
+            row.prop(props, "gobo_search", text="", icon='VIEWZOOM')
+            row.operator("bls.find_similar_gobos", text="", icon='SELECT_SUBTRACT')
+            row.operator("bls.find_duplicate_gobos", text="", icon='DUPLICATE')
+            draw_page_controls(layout, "main", 'GOBO')
+            gobo_status = gobos.get_loading_status("main")
+            if gobo_status:
+                layout.label(text=gobo_status, icon='TIME')
+            elif props.active_gobo_texture == "NONE":
                 layout.label(text="No textures found!", icon='ERROR')
                 layout.operator("bls.generate_defaults", text="Generate Defaults", icon='FILE_NEW')
             else:
@@ -92,14 +180,24 @@ class BLS_PT_TexturePanel(bpy.types.Panel):
             row.operator("bls.apply_gobo", text="Apply to Selected", icon='CHECKMARK')
             row.operator("bls.import_custom_gobo", text="", icon='FILE_FOLDER')
             row.operator("bls.reload_icons", text="", icon='FILE_REFRESH')
+            row.prop(props, "watch_library", text="", icon='HIDE_OFF' if props.watch_library else 'HIDE_ON')
             
             # Camera Visibility (Moved here)
             layout.prop(props, "gobo_camera_visible", text="Camera Visibility")
+            layout.prop(props, "gobo_softness", text="Focus Softness", slider=True)
+            layout.prop(props, "gobo_max_resolution", text="Resolution")
+            draw_gobo_overrides(layout, context.active_object)
             
         elif props.texture_type == 'PROCEDURAL':
             row = layout.row()
             row.prop(props, "procedural_type", expand=True)
             
+            col = layout.column(align=True)
+            col.prop(props, "procedural_scale")
+            if props.procedural_type == 'NOISE':
+                col.prop(props, "procedural_seed")
+            col.prop(props, "procedural_bake")
+            
             row = layout.row()
             row.scale_y = 1.3
             if props.procedural_type == 'GRADIENT':
@@ -109,6 +207,7 @@ class BLS_PT_TexturePanel(bpy.types.Panel):
             
             # Camera Visibility for Procedural
             layout.prop(props, "gobo_camera_visible", text="Camera Visibility")
+            draw_gobo_overrides(layout, context.active_object)
 
 class BLS_PT_ReflectorPanel(bpy.types.Panel):
     bl_label = "Reflector Generator"
@@ -0,0 +1,432 @@
+import bpy
+import math
+
+from . import exposure
+from . import hdri_proxy
+from . import image_manager
+
+# Names identifying the LightForge world tree
+BACKGROUND_NODE_NAME = "BLS_Background"
+MAPPING_NODE_NAME = "BLS_Mapping"
+ENV_NODE_NAME = hdri_proxy.ENV_NODE_NAME
+
+# World property holding the exposure normalization of the applied HDRI
+EXPOSURE_SCALE_PROP = "bls_exposure_scale"
+
+# Preloaded HDRI slots, crossfaded by one animatable value node
+SLOT_COUNT = 3
+BLEND_NODE_NAME = "BLS_SlotBlend"
+SLOT_GAIN_NODE_NAME = "BLS_SlotGain_{}"
+SLOT_FACTOR_NODE_NAME = "BLS_SlotFactor_{}"
+SLOT_MIX_NODE_NAME = "BLS_SlotMix_{}"
+SLOT_SPACING = 300
+
+# Camera/lighting split: each environment gets a blurred lighting twin chosen by Is Camera Ray
+LIGHT_PATH_NODE_NAME = "BLS_LightPath"
+LIGHTING_NODE_SUFFIX = "_Lighting"
+CAMERA_MIX_NODE_SUFFIX = "_CameraMix"
+
+def get_world(scene):
+    """The scene's world, created if missing, with nodes enabled"""
+    world = scene.world
+    if not world:
+        world = bpy.data.worlds.new("World")
+        scene.world = world
+    world.use_nodes = True
+    return world
+
+def _find_legacy_env(node_bg, node_mapping):
+    """Unnamed environment node of a world built before it was named BLS_Environment"""
+    candidates = [link.from_node for link in node_bg.inputs['Color'].links]
+    candidates += [link.to_node for link in node_mapping.outputs['Vector'].links]
+    for node in candidates:
+        if node.type == 'TEX_ENVIRONMENT':
+            return node
+    return None
+
+def find_world_nodes(world):
+    """(background, mapping, environment) of an existing LightForge world tree, or None
+
+    Worlds are recognised by their BLS_Background and BLS_Mapping nodes. Older
+    trees did not name the environment node, so the one linked to them is
+    adopted and named.
+    """
+    if not world or not world.use_nodes or not world.node_tree:
+        return None
+    nodes = world.node_tree.nodes
+    node_bg, node_mapping = nodes.get(BACKGROUND_NODE_NAME), nodes.get(MAPPING_NODE_NAME)
+    if not node_bg or not node_mapping:
+        return None
+
+    node_env = nodes.get(ENV_NODE_NAME)
+    if node_env is None:
+        node_env = _find_legacy_env(node_bg, node_mapping)
+        if node_env is None:
+            return None
+        node_env.name = ENV_NODE_NAME
+    return node_bg, node_mapping, node_env
+
+def get_hdri_strength(scene):
+    """Background strength: the user's intensity times the HDRI's exposure normalization"""
+    props = scene.bls_props
+    world = scene.world
+    if props.hdri_auto_exposure and world:
+        return props.hdri_intensity * world.get(EXPOSURE_SCALE_PROP, 1.0)
+    return props.hdri_intensity
+
+def get_live_nodes(world):
+    """(background, mapping) nodes of a world, either may be None
+
+    Looked up by name on every call: node references do not survive undo,
+    redo or file loads, and a name lookup is cheap next to the update itself.
+    """
+    if not world or not world.use_nodes or not world.node_tree:
+        return None, None
+    nodes = world.node_tree.nodes
+    return nodes.get(BACKGROUND_NODE_NAME), nodes.get(MAPPING_NODE_NAME)
+
+def build_world_tree(world, props):
+    """Replace the world's nodes with the LightForge HDRI tree"""
+    nodes = world.node_tree.nodes
+    links = world.node_tree.links
+    nodes.clear()
+
+    node_output = nodes.new(type='ShaderNodeOutputWorld')
+    node_bg = nodes.new(type='ShaderNodeBackground')
+    node_env = nodes.new(type='ShaderNodeTexEnvironment')
+    node_mapping = nodes.new(type='ShaderNodeMapping')
+    node_coord = nodes.new(type='ShaderNodeTexCoord')
+
+    links.new(node_coord.outputs['Generated'], node_mapping.inputs['Vector'])
+    links.new(node_mapping.outputs['Vector'], node_env.inputs['Vector'])
+    links.new(node_env.outputs['Color'], node_bg.inputs['Color'])
+    links.new(node_bg.outputs['Background'], node_output.inputs['Surface'])
+
+    # Name nodes for real-time update callbacks and later image swaps
+    node_bg.name = BACKGROUND_NODE_NAME
+    node_mapping.name = MAPPING_NODE_NAME
+    node_env.name = ENV_NODE_NAME
+
+    node_mapping.inputs['Rotation'].default_value[2] = math.radians(props.hdri_rotation)
+
+    # Arrange nodes
+    node_output.location = (400, 0)
+    node_bg.location = (200, 0)
+    node_env.location = (0, 0)
+    node_mapping.location = (-200, 0)
+    node_coord.location = (-400, 0)
+
+    return node_bg, node_mapping, node_env
+
+def slot_env_name(slot):
+    """Environment node name of a slot; slot 0 is the regular environment node"""
+    return ENV_NODE_NAME if slot == 0 else f"{ENV_NODE_NAME}_{slot}"
+
+def _socket(sockets, identifier):
+    """Socket by identifier (Mix node sockets share names across data types)"""
+    return next(s for s in sockets if s.identifier == identifier)
+
+def _new_color_mix(nodes, name, blend_type='MIX'):
+    """New color mix node (the Mix node on Blender 3.4+, MixRGB before)"""
+    if bpy.app.version >= (3, 4, 0):
+        node = nodes.new(type='ShaderNodeMix')
+        node.data_type = 'RGBA'
+    else:
+        node = nodes.new(type='ShaderNodeMixRGB')
+    node.name = name
+    node.blend_type = blend_type
+    return node
+
+def _mix_sockets(node):
+    """(factor, A, B, result) sockets of a color mix node"""
+    if node.bl_idname == 'ShaderNodeMix':
+        return (_socket(node.inputs, 'Factor_Float'), _socket(node.inputs, 'A_Color'),
+                _socket(node.inputs, 'B_Color'), _socket(node.outputs, 'Result_Color'))
+    return node.inputs['Fac'], node.inputs['Color1'], node.inputs['Color2'], node.outputs['Color']
+
+def get_blend_node(world):
+    """The slot crossfade value node, or None when the world is not in slot mode"""
+    if not world or not world.use_nodes or not world.node_tree:
+        return None
+    return world.node_tree.nodes.get(BLEND_NODE_NAME)
+
+def get_slot_paths(world):
+    """Full-resolution HDRI path of every slot (None for empty slots)"""
+    nodes = world.node_tree.nodes
+    paths = []
+    for slot in range(SLOT_COUNT):
+        node_env = nodes.get(slot_env_name(slot))
+        paths.append(node_env.get(hdri_proxy.FULL_PATH_PROP) if node_env else None)
+    return paths
+
+def remove_lighting_split(world):
+    """Connect every environment directly again, dropping the blurred lighting twins"""
+    if not world or not world.use_nodes or not world.node_tree:
+        return
+    nodes = world.node_tree.nodes
+    links = world.node_tree.links
+
+    for node_env in list(hdri_proxy.iter_env_nodes(world)):
+        node_mix = nodes.get(node_env.name + CAMERA_MIX_NODE_SUFFIX)
+        if node_mix:
+            result = _mix_sockets(node_mix)[3]
+            for to_socket in [link.to_socket for link in links if link.from_socket == result]:
+                links.new(node_env.outputs['Color'], to_socket)
+            nodes.remove(node_mix)
+
+        node_lighting = nodes.get(node_env.name + LIGHTING_NODE_SUFFIX)
+        if node_lighting:
+            image = node_lighting.image
+            nodes.remove(node_lighting)
+            image_manager.release(image)
+
+    node_path = nodes.get(LIGHT_PATH_NODE_NAME)
+    if node_path:
+        nodes.remove(node_path)
+
+def add_lighting_split(world):
+    """Light the scene from a pre-blurred copy of each environment, keeping the sharp map for camera rays
+
+    A small, low-frequency map converges in far fewer samples on indirect
+    paths and takes little texture memory, while the background still shows
+    the full-resolution image.
+    """
+    nodes = world.node_tree.nodes
+    links = world.node_tree.links
+
+    node_path = nodes.get(LIGHT_PATH_NODE_NAME)
+    if node_path is None:
+        node_path = nodes.new(type='ShaderNodeLightPath')
+        node_path.name = LIGHT_PATH_NODE_NAME
+        node_path.location = (-200, 400)
+
+    for node_env in list(hdri_proxy.iter_env_nodes(world)):
+        node_lighting = nodes.get(node_env.name + LIGHTING_NODE_SUFFIX)
+        if node_lighting is None:
+            node_lighting = nodes.new(type='ShaderNodeTexEnvironment')
+            node_lighting.name = node_env.name + LIGHTING_NODE_SUFFIX
+            node_lighting.label = "Lighting (Blurred)"
+            node_lighting.location = (node_env.location[0], node_env.location[1] - 150)
+            for link in node_env.inputs['Vector'].links:
+                links.new(link.from_socket, node_lighting.inputs['Vector'])
+        try:
+            hdri_proxy.set_lighting_hdri(node_lighting, node_env[hdri_proxy.FULL_PATH_PROP])
+        except Exception as e:
+            print(f"BLS: Blurred lighting map failed: {e}")
+            node_lighting.image = node_env.image
+
+        if nodes.get(node_env.name + CAMERA_MIX_NODE_SUFFIX) is None:
+            node_mix = _new_color_mix(nodes, node_env.name + CAMERA_MIX_NODE_SUFFIX)
+            node_mix.location = (node_env.location[0] + 150, node_env.location[1] + 100)
+            mix_factor, mix_a, mix_b, mix_output = _mix_sockets(node_mix)
+
+            # Whatever the environment fed now receives the camera/lighting mix
+            for to_socket in [link.to_socket for link in node_env.outputs['Color'].links]:
+                links.new(mix_output, to_socket)
+            links.new(node_path.outputs['Is Camera Ray'], mix_factor)
+            links.new(node_lighting.outputs['Color'], mix_a)
+            links.new(node_env.outputs['Color'], mix_b)
+
+def update_lighting_split(scene):
+    """Add or remove the camera/lighting split to match the scene setting"""
+    world = scene.world
+    if scene.bls_props.hdri_blurred_lighting and find_world_nodes(world):
+        add_lighting_split(world)
+    else:
+        remove_lighting_split(world)
+
+def update_blurred_lighting(self, context):
+    update_lighting_split(context.scene)
+
+def build_slot_nodes(world):
+    """Put SLOT_COUNT environment textures behind a chain of crossfade mixes
+
+    Each slot passes through a gain (its exposure normalization) and the mix
+    factors are derived from one value node: 0 shows slot 0, 1 slot 1, and
+    fractions blend neighbouring slots. Switching only changes that value, so
+    the shader is not rebuilt and the value can be keyframed.
+    """
+    remove_lighting_split(world)
+    nodes = world.node_tree.nodes
+    links = world.node_tree.links
+    node_bg, node_mapping, _node_env = find_world_nodes(world)
+
+    node_blend = nodes.new(type='ShaderNodeValue')
+    node_blend.name = BLEND_NODE_NAME
+    node_blend.label = "Slot Blend"
+    node_blend.location = (0, SLOT_SPACING)
+
+    result = None
+    for slot in range(SLOT_COUNT):
+        y = -slot * SLOT_SPACING
+        node_env = nodes.get(slot_env_name(slot))
+        if node_env is None:
+            node_env = nodes.new(type='ShaderNodeTexEnvironment')
+            node_env.name = slot_env_name(slot)
+        node_env.location = (0, y)
+        links.new(node_mapping.outputs['Vector'], node_env.inputs['Vector'])
+
+        node_gain = _new_color_mix(nodes, SLOT_GAIN_NODE_NAME.format(slot), 'MULTIPLY')
+        node_gain.location = (300, y)
+        gain_factor, gain_input, gain_color, gain_output = _mix_sockets(node_gain)
+        gain_factor.default_value = 1.0
+        gain_color.default_value = (1.0, 1.0, 1.0, 1.0)
+        links.new(node_env.outputs['Color'], gain_input)
+        if slot == 0:
+            # The HDRI already shown becomes slot 0 and keeps its normalization
+            node_gain[EXPOSURE_SCALE_PROP] = world.get(EXPOSURE_SCALE_PROP, 1.0)
+
+        if result is None:
+            result = gain_output
+            continue
+
+        # Factor of this mix: blend - (slot - 1), clamped to 0..1
+        node_factor = nodes.new(type='ShaderNodeMath')
+        node_factor.name = SLOT_FACTOR_NODE_NAME.format(slot)
+        node_factor.operation = 'SUBTRACT'
+        node_factor.use_clamp = True
+        node_factor.inputs[1].default_value = slot - 1
+        node_factor.location = (300, SLOT_SPACING + slot * 200)
+        links.new(node_blend.outputs['Value'], node_factor.inputs[0])
+
+        node_mix = _new_color_mix(nodes, SLOT_MIX_NODE_NAME.format(slot))
+        node_mix.location = (300 + slot * 200, 0)
+        mix_factor, mix_a, mix_b, mix_output = _mix_sockets(node_mix)
+        links.new(node_factor.outputs['Value'], mix_factor)
+        links.new(result, mix_a)
+        links.new(gain_output, mix_b)
+        result = mix_output
+
+    links.new(result, node_bg.inputs['Color'])
+    node_bg.location = (500 + SLOT_COUNT * 200, 0)
+    for node in nodes:
+        if node.type == 'OUTPUT_WORLD':
+            node.location = (700 + SLOT_COUNT * 200, 0)
+    return node_blend
+
+def _iter_fcurve_collections(action):
+    """FCurve collections of an action: the legacy list, or each channelbag of a layered action"""
+    if hasattr(action, "layers"):
+        for layer in action.layers:
+            for strip in layer.strips:
+                for channelbag in getattr(strip, "channelbags", ()):
+                    yield channelbag.fcurves
+    if hasattr(action, "fcurves"):
+        yield action.fcurves
+
+def remove_node_fcurves(tree, names):
+    """Delete the animation curves of removed nodes, which would point at nothing"""
+    action = tree.animation_data.action if tree.animation_data else None
+    if action is None:
+        return
+    prefixes = tuple(f'nodes["{name}"]' for name in names)
+    for fcurves in _iter_fcurve_collections(action):
+        for fcurve in [fcurve for fcurve in fcurves if fcurve.data_path.startswith(prefixes)]:
+            fcurves.remove(fcurve)
+
+def remove_slot_nodes(world):
+    """Return a slot-mode world to a single environment (slot 0)"""
+    remove_lighting_split(world)
+    nodes = world.node_tree.nodes
+    node_bg, _node_mapping, node_env = find_world_nodes(world)
+
+    node_gain = nodes.get(SLOT_GAIN_NODE_NAME.format(0))
+    world[EXPOSURE_SCALE_PROP] = node_gain.get(EXPOSURE_SCALE_PROP, 1.0) if node_gain else 1.0
+
+    removed = [BLEND_NODE_NAME]
+    for slot in range(SLOT_COUNT):
+        names = [SLOT_GAIN_NODE_NAME.format(slot), SLOT_FACTOR_NODE_NAME.format(slot),
+                 SLOT_MIX_NODE_NAME.format(slot)]
+        if slot > 0:
+            names.append(slot_env_name(slot))
+        removed += names
+        for name in names:
+            node = nodes.get(name)
+            if node:
+                image = getattr(node, "image", None)
+                nodes.remove(node)
+                image_manager.release(image)
+    nodes.remove(nodes[BLEND_NODE_NAME])
+    # The keyframed crossfade would otherwise be left driving a missing node
+    remove_node_fcurves(world.node_tree, removed)
+
+    world.node_tree.links.new(node_env.outputs['Color'], node_bg.inputs['Color'])
+    node_bg.location = (200, 0)
+    for node in nodes:
+        if node.type == 'OUTPUT_WORLD':
+            node.location = (400, 0)
+
+def update_slot_gains(scene):
+    """Apply (or, with auto exposure off, bypass) each slot's exposure normalization"""
+    world = scene.world
+    if get_blend_node(world) is None:
+        return
+    auto_exposure = scene.bls_props.hdri_auto_exposure
+    for slot in range(SLOT_COUNT):
+        node_gain = world.node_tree.nodes.get(SLOT_GAIN_NODE_NAME.format(slot))
+        if node_gain:
+            gain = node_gain.get(EXPOSURE_SCALE_PROP, 1.0) if auto_exposure else 1.0
+            _mix_sockets(node_gain)[2].default_value = (gain, gain, gain, 1.0)
+
+def show_slot(world, slot, keyframe=False):
+    """Switch the crossfade to a slot, optionally keying the change"""
+    socket = get_blend_node(world).outputs['Value']
+    socket.default_value = slot
+    if keyframe:
+        socket.keyframe_insert("default_value")
+
+def _get_normalization(filepath):
+    try:
+        return exposure.get_normalization(filepath)
+    except Exception as e:
+        print(f"BLS: Exposure analysis failed: {e}")
+        return 1.0
+
+def setup_world_hdri(scene, filepath, source=None):
+    """Show an HDRI in the scene's world, reusing the LightForge tree when present
+
+    With an existing tree only the environment image is replaced, so render
+    engines see a texture change instead of a new world shader. source is the
+    library file the image was derived from (for exposure statistics). Returns
+    (world, image, bytes freed from images no longer used).
+    """
+    world = get_world(scene)
+    world_nodes = find_world_nodes(world)
+    if world_nodes is None:
+        world_nodes = build_world_tree(world, scene.bls_props)
+    elif get_blend_node(world):
+        remove_slot_nodes(world)
+
+    img = hdri_proxy.set_world_hdri(scene, world_nodes[2], filepath)
+
+    world[EXPOSURE_SCALE_PROP] = _get_normalization(source or filepath)
+    world_nodes[0].inputs['Strength'].default_value = get_hdri_strength(scene)
+    update_lighting_split(scene)
+
+    _count, freed = image_manager.release_unused()
+    return world, img, freed
+
+def set_slot_hdri(scene, slot, filepath, source=None):
+    """Preload an HDRI into a slot, switching the world to slot mode if needed
+
+    Exposure normalization moves from the background strength to the per-slot
+    gains, so slots with different brightness crossfade evenly. Returns
+    (world, image, bytes freed).
+    """
+    world = get_world(scene)
+    if find_world_nodes(world) is None:
+        build_world_tree(world, scene.bls_props)
+    if get_blend_node(world) is None:
+        build_slot_nodes(world)
+
+    nodes = world.node_tree.nodes
+    img = hdri_proxy.set_world_hdri(scene, nodes[slot_env_name(slot)], filepath)
+    nodes[SLOT_GAIN_NODE_NAME.format(slot)][EXPOSURE_SCALE_PROP] = _get_normalization(source or filepath)
+
+    world[EXPOSURE_SCALE_PROP] = 1.0
+    update_slot_gains(scene)
+    nodes[BACKGROUND_NODE_NAME].inputs['Strength'].default_value = get_hdri_strength(scene)
+    update_lighting_split(scene)
+
+    _count, freed = image_manager.release_unused()
+    return world, img, freed